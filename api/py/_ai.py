@@ -7,19 +7,28 @@ MongoDB caching (30/60/120 min by location importance).
 
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
+import math
 import os
 import re
+import secrets
+import threading
+import time as _time
+import unicodedata
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
 from typing import Optional
 
 import anthropic
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+import orjson
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
-from ._db import get_db, get_api_key
+from ._db import api_key_digest, get_db, get_api_key, same_api_key
 from ._circuit_breaker import anthropic_breaker, CircuitOpenError
+from ._ai_prompts_cache import prompt_cache
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +38,7 @@ router = APIRouter()
 # Tiered TTL (matches TypeScript db.ts)
 # ---------------------------------------------------------------------------
 
-TIER_2_TAGS = {"farming", "mining", "education", "border"}
+TIER_2_TAGS = frozenset({"farming", "mining", "education", "border"})
 
 TTL_TIER_1 = 1800   # 30 min — cities with "city" tag
 TTL_TIER_2 = 3600   # 60 min — locations with industry/education/border tags
@@ -40,7 +49,7 @@ def _get_ttl(slug: str, tags: list[str]) -> int:
     """Data-driven TTL — cities get shortest TTL, industry tags get medium."""
     if "city" in tags:
         return TTL_TIER_1
-    if any(t in TIER_2_TAGS for t in tags):
+    if not TIER_2_TAGS.isdisjoint(tags):
         return TTL_TIER_2
     return TTL_TIER_3
 
@@ -50,7 +59,7 @@ def _get_ttl(slug: str, tags: list[str]) -> int:
 # ---------------------------------------------------------------------------
 
 _client: Optional[anthropic.Anthropic] = None
-_client_key_last: Optional[str] = None
+_client_key_digest: Optional[bytes] = None
 
 # Hardcoded fallback — only used if database prompt is unavailable
 _FALLBACK_SYSTEM_PROMPT = """You are Shamwari Weather, the AI assistant for mukoko weather — an AI-powered weather intelligence platform. You provide actionable, contextual weather advice grounded in local geography, agriculture, industry, and culture.
@@ -75,32 +84,10 @@ Format guidelines:
 - Do not use emoji
 - Do not use headings (no # or ##) — the section already has a heading"""
 
-# Module-level prompt cache (5-min TTL)
-import time as _time
-_prompt_cache: dict[str, dict] = {}
-_prompt_cache_at: float = 0
-_PROMPT_CACHE_TTL = 300  # 5 minutes
-
 
 def _get_prompt(prompt_key: str) -> dict | None:
-    """Fetch a prompt template from MongoDB with module-level caching."""
-    global _prompt_cache, _prompt_cache_at
-
-    now = _time.time()
-    if _prompt_cache and (now - _prompt_cache_at) < _PROMPT_CACHE_TTL:
-        return _prompt_cache.get(prompt_key)
-
-    try:
-        from ._db import ai_prompts_collection
-        docs = list(
-            ai_prompts_collection()
-            .find({"active": True}, {"_id": 0, "updatedAt": 0})
-        )
-        _prompt_cache = {d["promptKey"]: d for d in docs}
-        _prompt_cache_at = now
-        return _prompt_cache.get(prompt_key)
-    except Exception:
-        return _prompt_cache.get(prompt_key)
+    """Fetch a prompt template from the shared prompt cache."""
+    return prompt_cache.get(prompt_key)
 
 
 def _get_system_prompt() -> str:
@@ -120,7 +107,7 @@ def _get_user_prompt_template() -> str | None:
 
 
 def _get_client() -> anthropic.Anthropic:
-    global _client, _client_key_last
+    global _client, _client_key_digest
 
     key = os.environ.get("ANTHROPIC_API_KEY")
     if not key:
@@ -128,9 +115,9 @@ def _get_client() -> anthropic.Anthropic:
     if not key:
         return None  # type: ignore[return-value]
 
-    if _client is None or _client_key_last != key:
+    if _client is None or not same_api_key(_client_key_digest, key):
         _client = anthropic.Anthropic(api_key=key)
-        _client_key_last = key
+        _client_key_digest = api_key_digest(key)
 
     return _client
 
@@ -155,7 +142,7 @@ def _resolve_seasons_with_ai(
     list of season docs on success, or None if AI is unavailable/invalid.
     """
     # Validate ISO 3166-1 alpha-2/alpha-3 format to prevent prompt injection
-    if not _COUNTRY_CODE_RE.match(country_code.upper()):
+    if not _COUNTRY_CODE_RE.fullmatch(country_code.upper()):
         logger.warning("Invalid country code rejected: %r", country_code[:20])
         return None
 
@@ -198,11 +185,11 @@ def _resolve_seasons_with_ai(
         text = response.content[0].text.strip()
         # Extract JSON array from response
         if text.startswith("["):
-            seasons_raw = json.loads(text)
+            seasons_raw = orjson.loads(text)
         else:
             match = re.search(r"\[.*\]", text, re.DOTALL)
             if match:
-                seasons_raw = json.loads(match.group())
+                seasons_raw = orjson.loads(match.group())
             else:
                 return None
 
@@ -284,7 +271,46 @@ def _hemisphere_fallback(lat: float) -> dict:
             return {"name": "Winter", "localName": "Winter", "description": "Coldest season with shorter days."}
 
 
-def _get_season(country: str = "", lat: float = 0.0, lon: float = 0.0) -> dict:
+# Module-level lookup caches — location tags and DB seasons change rarely,
+# so skip the MongoDB round-trip for repeat requests.
+_LOOKUP_CACHE_TTL = 300  # 5 minutes
+# Slugs reach here from clients, so the tag cache only holds real locations
+# and is capped; the oldest entry is evicted first.
+_LOC_TAGS_CACHE_MAX = 2048
+_loc_tags_cache: dict[str, tuple[float, list[str]]] = {}
+_season_cache: dict[tuple[str, int], tuple[float, dict]] = {}
+
+
+def _remember_loc_tags(slug: str, tags: list[str], now: float) -> None:
+    _loc_tags_cache.pop(slug, None)
+    if len(_loc_tags_cache) >= _LOC_TAGS_CACHE_MAX:
+        del _loc_tags_cache[next(iter(_loc_tags_cache))]
+    _loc_tags_cache[slug] = (now, tags)
+
+
+def _get_location_tags(slug: str) -> list[str]:
+    """Fetch a location's tags for tiered TTL (cached 5 min per slug)."""
+    now = _time.time()
+    entry = _loc_tags_cache.get(slug)
+    if entry and (now - entry[0]) < _LOOKUP_CACHE_TTL:
+        return entry[1]
+
+    try:
+        db = get_db()
+        loc_doc = db["locations"].find_one({"slug": slug}, {"tags": 1, "_id": 0})
+    except Exception:
+        return entry[1] if entry else []
+
+    if not loc_doc:
+        return []
+    tags = loc_doc.get("tags", [])
+    _remember_loc_tags(slug, tags, now)
+    return tags
+
+
+def _get_season(
+    country: str = "", lat: float = 0.0, lon: float = 0.0, now: datetime | None = None,
+) -> dict:
     """Look up the current season: DB → hemisphere fallback (+ background AI warm).
 
     Flow:
@@ -295,21 +321,31 @@ def _get_season(country: str = "", lat: float = 0.0, lon: float = 0.0) -> dict:
     AI resolution is never synchronous on the request path — it can add
     5-15s of latency which is unacceptable for the summary endpoint.
     """
-    month = datetime.now(timezone.utc).month
+    month = (now or datetime.now(timezone.utc)).month
 
     try:
         if country:
+            cache_key = (country.upper(), month)
+            entry = _season_cache.get(cache_key)
+            ts = _time.time()
+            if entry and (ts - entry[0]) < _LOOKUP_CACHE_TTL:
+                return entry[1]
+
             db = get_db()
             doc = db["seasons"].find_one(
                 {"countryCode": country.upper(), "months": month},
                 {"_id": 0},
             )
             if doc:
-                return {
+                season = {
                     "name": doc.get("name", ""),
                     "localName": doc.get("localName", doc.get("name", "")),
                     "description": doc.get("description", ""),
                 }
+                # Only DB hits are cached — misses fall through so the next
+                # request picks up background AI enrichment once it lands.
+                _season_cache[cache_key] = (ts, season)
+                return season
 
             # Country not in DB — trigger background AI enrichment for next
             # request, return hemisphere fallback immediately for this one.
@@ -323,7 +359,7 @@ def _get_season(country: str = "", lat: float = 0.0, lon: float = 0.0) -> dict:
 # Countries currently being resolved in background threads — prevents
 # duplicate Claude calls when multiple requests arrive before DB is seeded.
 _resolution_in_progress: set[str] = set()
-_resolution_lock = __import__("threading").Lock()
+_resolution_lock = threading.Lock()
 
 
 def _trigger_background_season_resolution(
@@ -337,8 +373,6 @@ def _trigger_background_season_resolution(
     process may terminate after the response. If it does, the next
     _get_season call for this country will re-trigger enrichment.
     """
-    import threading
-
     key = country_code.upper()
     with _resolution_lock:
         if key in _resolution_in_progress:
@@ -361,38 +395,128 @@ def _trigger_background_season_resolution(
     thread.start()
 
 
+# ---------------------------------------------------------------------------
+# Prompt helpers
+# ---------------------------------------------------------------------------
+
+
+def _round_floats(value):
+    """Round floats to 1 decimal so sensor jitter doesn't change the prompt."""
+    if isinstance(value, float):
+        return round(value, 1)
+    if isinstance(value, dict):
+        return {k: _round_floats(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_round_floats(v) for v in value]
+    return value
+
+
+def _stable_json(value) -> str:
+    """Serialize weather data byte-identically for identical inputs.
+
+    Sorted keys and rounded floats keep the per-location prompt prefix
+    stable across requests so Anthropic's prompt cache can match it.
+    """
+    return orjson.dumps(
+        _round_floats(value),
+        default=str,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    ).decode()
+
+
 # ---------------------------------------------------------------------------
 # Cache operations
 # ---------------------------------------------------------------------------
 
+_indexes_ensured = False
+_indexes_retry_at: float = 0  # monotonic; backoff after a failed attempt
+_INDEX_RETRY_S = 60
+
 
-def _get_cached_summary(slug: str) -> dict | None:
+def _ensure_indexes():
+    """Create the ai_summaries indexes once per warm instance.
+
+    The compound (locationSlug, expiresAt) index serves the unexpired-summary
+    lookup; the TTL index lets MongoDB purge expired summaries in the
+    background. Both match the specs in src/lib/db.ts ensureIndexes(), so
+    create_index is a no-op when the Next.js side has already built them.
+    Runs at startup (warm_caches) and off the event loop on demand; after a
+    failure it waits _INDEX_RETRY_S before trying again, so an unreachable
+    MongoDB doesn't cost every request a server-selection timeout.
+    """
+    global _indexes_ensured, _indexes_retry_at
+    if _indexes_ensured or _time.monotonic() < _indexes_retry_at:
+        return
+    try:
+        coll = get_db()["ai_summaries"]
+        coll.create_index([("locationSlug", 1), ("expiresAt", 1)])
+        coll.create_index("expiresAt", expireAfterSeconds=0)
+        _indexes_ensured = True
+    except Exception:
+        _indexes_retry_at = _time.monotonic() + _INDEX_RETRY_S
+        logger.warning("Failed to ensure ai_summaries indexes")
+
+
+def _get_cached_summary(slug: str, now: datetime | None = None) -> dict | None:
+    """Fetch an unexpired cached summary for a location.
+
+    When the location's tags are not already in _loc_tags_cache, the tags
+    and the summary are fetched together in one $unionWith aggregation so
+    a cold request pays a single MongoDB round-trip instead of two.
+    """
+    now = now or datetime.now(timezone.utc)
     db = get_db()
-    doc = db["ai_summaries"].find_one(
-        {"locationSlug": slug, "expiresAt": {"$gt": datetime.now(timezone.utc)}},
-    )
+    summary_filter = {"locationSlug": slug, "expiresAt": {"$gt": now}}
+
+    entry = _loc_tags_cache.get(slug)
+    if entry and (_time.time() - entry[0]) < _LOOKUP_CACHE_TTL:
+        doc = db["ai_summaries"].find_one(summary_filter)
+    else:
+        pipeline = [
+            {"$match": {"slug": slug}},
+            {"$project": {"_id": 0, "tags": 1}},
+            {"$unionWith": {
+                "coll": "ai_summaries",
+                "pipeline": [
+                    {"$match": summary_filter},
+                    {"$limit": 1},
+                    {"$project": {
+                        "_id": 0, "insight": 1, "generatedAt": 1,
+                        "weatherSnapshot": 1, "_summary": {"$literal": True},
+                    }},
+                ],
+            }},
+        ]
+        doc = None
+        for row in db["locations"].aggregate(pipeline):
+            if row.get("_summary"):
+                doc = row
+            else:
+                _remember_loc_tags(slug, row.get("tags", []), _time.time())
+
     if not doc:
         return None
 
     return {
         "insight": doc.get("insight", ""),
-        "generatedAt": doc.get("generatedAt", datetime.now(timezone.utc)),
+        "generatedAt": doc.get("generatedAt", now),
         "weatherSnapshot": doc.get("weatherSnapshot", {}),
     }
 
 
 def _is_stale(cached: dict, current_temp: float, current_code: int) -> bool:
     """Check if the cached summary is stale (weather changed significantly)."""
-    snapshot = cached.get("weatherSnapshot", {})
-    cached_temp = snapshot.get("temperature", 0)
-    cached_code = snapshot.get("weatherCode", 0)
-
-    # Re-generate if temperature changed > 5 degrees or weather code changed
-    if abs(current_temp - cached_temp) > 5:
+    snapshot = cached.get("weatherSnapshot")
+    if not snapshot:
         return True
-    if current_code != cached_code:
+    cached_temp = snapshot.get("temperature")
+    cached_code = snapshot.get("weatherCode")
+    # Without a complete snapshot there is nothing to compare against
+    if cached_temp is None or cached_code is None:
         return True
-    return False
+
+    # Re-generate if temperature changed > 5 degrees or weather code changed
+    return math.fabs(current_temp - cached_temp) > 5 or current_code != cached_code
 
 
 def _set_cached_summary(
@@ -400,23 +524,27 @@ def _set_cached_summary(
     insight: str,
     weather_snapshot: dict,
     tags: list[str],
+    now: datetime | None = None,
 ):
-    db = get_db()
+    """Upsert the summary. Runs as a background task after the response is sent."""
     ttl = _get_ttl(slug, tags)
-    now = datetime.now(timezone.utc)
+    now = now or datetime.now(timezone.utc)
 
-    db["ai_summaries"].update_one(
-        {"locationSlug": slug},
-        {
-            "$set": {
-                "insight": insight,
-                "generatedAt": now,
-                "weatherSnapshot": weather_snapshot,
-                "expiresAt": now + timedelta(seconds=ttl),
+    try:
+        get_db()["ai_summaries"].update_one(
+            {"locationSlug": slug},
+            {
+                "$set": {
+                    "insight": insight,
+                    "generatedAt": now,
+                    "weatherSnapshot": weather_snapshot,
+                    "expiresAt": now + timedelta(seconds=ttl),
+                },
             },
-        },
-        upsert=True,
-    )
+            upsert=True,
+        )
+    except Exception:
+        logger.warning("Failed to cache AI summary for %s", slug, exc_info=True)
 
 
 # ---------------------------------------------------------------------------
@@ -425,7 +553,10 @@ def _set_cached_summary(
 
 
 class LocationInfo(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     name: str
+    slug: str = ""  # canonical location slug; derived from name when omitted or malformed
     elevation: int = 1200
     lat: float = 0.0
     lon: float = 0.0
@@ -433,23 +564,273 @@ class LocationInfo(BaseModel):
 
 
 class AISummaryRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     weatherData: dict
     location: LocationInfo
     activities: list[str] = Field(default_factory=list)
+    stream: bool = False  # opt-in SSE response (text deltas, then a "done" event)
+
+
+# ---------------------------------------------------------------------------
+# Summary generation
+# ---------------------------------------------------------------------------
+
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+# Client-supplied slugs must look like a real one before they key caches
+SLUG_RE = re.compile(r"^[a-z0-9-]{1,80}$")
+
+
+@lru_cache(maxsize=1024)
+def _slugify(name: str) -> str:
+    """Cache-key slug from a location name (same rules as _locations._generate_slug)."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    return _SLUG_RE.sub("-", ascii_name.lower()).strip("-")
+
+
+# Tomorrow.io insight fields included in the prompt, in display order
+_INSIGHT_FIELDS: tuple[tuple[str, str], ...] = (
+    ("heatStressIndex", "Heat stress index"),
+    ("thunderstormProbability", "Thunderstorm probability"),
+    ("uvHealthConcern", "UV health concern"),
+    ("visibility", "Visibility"),
+    ("dewPoint", "Dew point"),
+    ("gdd10To30", "Maize/Soy GDD"),
+    ("evapotranspiration", "Evapotranspiration"),
+    ("moonPhase", "Moon phase"),
+)
+
+
+def _fallback_insight(weather_data: dict, location: LocationInfo, season: dict) -> str:
+    """Template summary used when AI is unavailable or fails."""
+    temp = weather_data.get("current", {}).get("temperature_2m")
+    humidity = weather_data.get("current", {}).get("relative_humidity_2m")
+    return (
+        f"Current conditions in {location.name}: "
+        f"{round(temp) if temp is not None else 'N/A'}\u00B0C with "
+        f"{humidity if humidity is not None else 'N/A'}% humidity. "
+        f"We are in the {season['localName']} season ({season['name']}). "
+        f"{season['description']}. Stay informed and plan your day accordingly."
+    )
+
+
+def _build_summary_request(
+    weather_data: dict,
+    location: LocationInfo,
+    user_activities: list[str],
+    location_tags: list[str],
+    season: dict,
+) -> dict:
+    """Build the messages.create/stream kwargs for a summary."""
+    # Build insights section
+    insights = weather_data.get("daily", {}).get("insights") or weather_data.get("insights")
+    insights_prompt = ""
+    if insights and isinstance(insights, dict):
+        parts = ", ".join(
+            f"{label}: {val}"
+            for field, label in _INSIGHT_FIELDS
+            if (val := insights.get(field)) is not None
+        )
+        if parts:
+            insights_prompt = f"\nWeather insights (from Tomorrow.io): {parts}"
+
+    # Build user prompt — split into a per-location prefix (identical for
+    # every user asking about this location while the weather cache is
+    # fresh, so it is marked as a cache breakpoint) and a per-user suffix.
+    current_data = _stable_json(weather_data.get("current", {}))
+    max_temps = _stable_json(weather_data.get("daily", {}).get("temperature_2m_max", []))
+    min_temps = _stable_json(weather_data.get("daily", {}).get("temperature_2m_min", []))
+    codes = _stable_json(weather_data.get("daily", {}).get("weather_code", []))
+
+    tags_line = f"This area is relevant to: {', '.join(location_tags)}.\n" if location_tags else ""
+    activities_line = f"The user's activities: {', '.join(user_activities[:3])}. Tailor advice to these activities.\n\n" if user_activities else ""
+    activities_tip = (
+        f"One specific tip for the user's activities ({', '.join(user_activities[:3])})"
+        if user_activities
+        else "One industry/context-specific tip relevant to this area (e.g. farming advice for farming areas, safety for mining areas, travel conditions for border/travel areas, outdoor guidance for tourism/national parks)"
+    )
+
+    static_prefix = f"""Generate a weather briefing for {location.name} (elevation: {location.elevation}m).
+{tags_line}
+Current conditions: {current_data}
+3-day forecast summary: max temps {max_temps}, min temps {min_temps}, weather codes {codes}{insights_prompt}
+Season: {season['localName']} ({season['name']})"""
+
+    dynamic_suffix = f"""{activities_line}Provide:
+1. A 2-sentence general summary
+2. {activities_tip}"""
+
+    user_content = [
+        {"type": "text", "text": static_prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": dynamic_suffix},
+    ]
+
+    # Use database-driven prompt (with fallback)
+    system_prompt = _get_system_prompt()
+    prompt_doc = _get_prompt("system:summary")
+
+    # Static system prompt is marked as a cache breakpoint so repeat
+    # calls within the 5-min TTL reuse the cached prefix.
+    return {
+        "model": (prompt_doc or {}).get("model", "claude-haiku-4-5-20251001"),
+        "max_tokens": (prompt_doc or {}).get("maxTokens", 400),
+        "system": [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"},
+        }],
+        "messages": [{"role": "user", "content": user_content}],
+    }
+
+
+async def _generate_uncached_summary(
+    weather_data: dict,
+    location: LocationInfo,
+    user_activities: list[str],
+    location_slug: str,
+    current_temp: float,
+    current_code: int,
+    background: BackgroundTasks,
+    now: datetime,
+) -> dict:
+    """Generate a fresh summary (AI or fallback); the cache write is deferred."""
+    # Get location tags for tiered TTL
+    location_tags = _get_location_tags(location_slug)
+
+    # Get season
+    country = location.country if location.country and len(location.country) == 2 else ""
+    season = _get_season(country, lat=location.lat, lon=location.lon, now=now)
+    snapshot = {"temperature": current_temp, "weatherCode": current_code}
+
+    # Try AI generation
+    client = _get_client()
+    if not client:
+        insight = _fallback_insight(weather_data, location, season)
+        background.add_task(_set_cached_summary, location_slug, insight, snapshot, location_tags, now)
+        return {"insight": insight, "cached": False}
+
+    request_kwargs = _build_summary_request(
+        weather_data, location, user_activities, location_tags, season,
+    )
+
+    if not anthropic_breaker.is_allowed:
+        # Circuit is open — skip AI and use fallback
+        insight = _fallback_insight(weather_data, location, season)
+    else:
+        try:
+            message = await asyncio.to_thread(client.messages.create, **request_kwargs)
+            anthropic_breaker.record_success()
+
+            text_block = next((b for b in message.content if b.type == "text"), None)
+            insight = text_block.text if text_block else "No insight available."
+        except Exception:
+            anthropic_breaker.record_failure()
+            # Fallback on any AI error
+            insight = _fallback_insight(weather_data, location, season)
+
+    # Cache the summary once the response has been sent
+    background.add_task(_set_cached_summary, location_slug, insight, snapshot, location_tags, now)
+
+    return {"insight": insight, "cached": False, "generatedAt": now.isoformat()}
+
+
+def _sse(payload: dict) -> str:
+    """Format one server-sent event."""
+    return f"data: {orjson.dumps(payload, default=str).decode()}\n\n"
+
+
+def _result_stream(result: dict, background: BackgroundTasks | None = None) -> StreamingResponse:
+    """Stream an already-complete result (cache hit / fallback) as SSE."""
+    def _events():
+        yield _sse({"type": "delta", "text": result["insight"]})
+        yield _sse({"type": "done", **result})
+
+    return StreamingResponse(_events(), media_type="text/event-stream", background=background)
+
+
+def _stream_uncached_summary(
+    weather_data: dict,
+    location: LocationInfo,
+    user_activities: list[str],
+    location_slug: str,
+    current_temp: float,
+    current_code: int,
+    background: BackgroundTasks,
+    now: datetime,
+) -> StreamingResponse:
+    """Stream a fresh AI summary as SSE; cache the full text once it ends.
+
+    Each text delta is sent as it arrives; the final "done" event carries
+    the complete insight, which replaces the deltas if the stream failed
+    part-way and fell back to the template summary.
+    """
+    location_tags = _get_location_tags(location_slug)
+    country = location.country if location.country and len(location.country) == 2 else ""
+    season = _get_season(country, lat=location.lat, lon=location.lon, now=now)
+    snapshot = {"temperature": current_temp, "weatherCode": current_code}
+
+    client = _get_client()
+    if not client or not anthropic_breaker.is_allowed:
+        insight = _fallback_insight(weather_data, location, season)
+        background.add_task(_set_cached_summary, location_slug, insight, snapshot, location_tags, now)
+        return _result_stream({
+            "insight": insight,
+            "cached": False,
+            "generatedAt": now.isoformat(),
+        }, background)
+
+    request_kwargs = _build_summary_request(
+        weather_data, location, user_activities, location_tags, season,
+    )
+    chunks: list[str] = []
+
+    # Sync generator — Starlette iterates it in a worker thread
+    def _events():
+        try:
+            with client.messages.stream(**request_kwargs) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield _sse({"type": "delta", "text": text})
+            anthropic_breaker.record_success()
+        except Exception:
+            anthropic_breaker.record_failure()
+            chunks[:] = [_fallback_insight(weather_data, location, season)]
+        if not chunks:
+            chunks.append("No insight available.")
+        yield _sse({
+            "type": "done",
+            "insight": "".join(chunks),
+            "cached": False,
+            "generatedAt": now.isoformat(),
+        })
+
+    def _cache_streamed() -> None:
+        _set_cached_summary(location_slug, "".join(chunks), snapshot, location_tags, now)
+
+    background.add_task(_cache_streamed)
+    return StreamingResponse(_events(), media_type="text/event-stream", background=background)
 
 
 # ---------------------------------------------------------------------------
 # Endpoint
 # ---------------------------------------------------------------------------
 
+# In-flight summary generations keyed by (slug, rounded temp, weather code)
+_inflight: dict[tuple[str, int, int], asyncio.Future] = {}
+
+
+class _LeaderCancelled(Exception):
+    """Set on an in-flight future when the request generating it is cancelled."""
+
 
 @router.post("/api/py/ai")
-async def generate_summary(body: AISummaryRequest):
+async def generate_summary(body: AISummaryRequest, background: BackgroundTasks):
     """
     POST /api/py/ai
 
     Generate an AI weather briefing for a location.
     Cached in MongoDB with tiered TTL (30/60/120 min).
+    With "stream": true the response is an SSE stream instead of JSON.
     """
     weather_data = body.weatherData
     location = body.location
@@ -458,151 +839,244 @@ async def generate_summary(body: AISummaryRequest):
     if not weather_data or not location:
         raise HTTPException(status_code=400, detail="Missing weather data or location")
 
+    if not _indexes_ensured:
+        await asyncio.to_thread(_ensure_indexes)
+
+    # One timestamp per request so cache reads, writes and the response agree
+    now = datetime.now(timezone.utc)
     current_temp = weather_data.get("current", {}).get("temperature_2m", 0) or 0
     current_code = weather_data.get("current", {}).get("weather_code", 0) or 0
-    location_slug = location.name.lower().replace(" ", "-")
-
-    # Get location tags for tiered TTL
-    try:
-        db = get_db()
-        loc_doc = db["locations"].find_one({"slug": location_slug}, {"tags": 1, "_id": 0})
-        location_tags = loc_doc.get("tags", []) if loc_doc else []
-    except Exception:
-        location_tags = []
+    location_slug = location.slug if SLUG_RE.fullmatch(location.slug) else _slugify(location.name)
 
-    # Check cache
-    cached = _get_cached_summary(location_slug)
+    # Check cache (also warms the location tag cache on a cold slug)
+    cached = _get_cached_summary(location_slug, now)
     if cached and not _is_stale(cached, current_temp, current_code):
         generated_at = cached["generatedAt"]
         if isinstance(generated_at, datetime):
             generated_at = generated_at.isoformat()
-        return {
+        result = {
             "insight": cached["insight"],
             "cached": True,
             "generatedAt": generated_at,
         }
-
-    # Get season
-    country = location.country if location.country and len(location.country) == 2 else ""
-    season = _get_season(country, lat=location.lat, lon=location.lon)
-
-    # Try AI generation
-    client = _get_client()
-    if not client:
-        # Fallback summary
-        temp = weather_data.get("current", {}).get("temperature_2m")
-        humidity = weather_data.get("current", {}).get("relative_humidity_2m")
-        insight = (
-            f"Current conditions in {location.name}: "
-            f"{round(temp) if temp is not None else 'N/A'}\u00B0C with "
-            f"{humidity if humidity is not None else 'N/A'}% humidity. "
-            f"We are in the {season['localName']} season ({season['name']}). "
-            f"{season['description']}. Stay informed and plan your day accordingly."
+        return _result_stream(result) if body.stream else result
+
+    # Coalesce concurrent cache misses: the first request for a given
+    # location + weather generates the summary, the rest await its result.
+    # The get/insert below has no await in between, so it is atomic on the
+    # event loop and needs no lock. If the leader is cancelled (its client
+    # disconnected) the waiters are still connected, so they loop round and
+    # the first of them becomes the new leader.
+    inflight_key = (location_slug, round(current_temp), current_code)
+    while (pending := _inflight.get(inflight_key)) is not None:
+        try:
+            result = dict(await asyncio.shield(pending))
+        except _LeaderCancelled:
+            continue
+        return _result_stream(result) if body.stream else result
+
+    if body.stream:
+        # A live stream can't be shared, so streaming misses generate directly
+        return _stream_uncached_summary(
+            weather_data, location, user_activities,
+            location_slug, current_temp, current_code, background, now,
         )
 
-        _set_cached_summary(
-            location_slug, insight,
-            {"temperature": current_temp, "weatherCode": current_code},
-            location_tags,
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    _inflight[inflight_key] = future
+    try:
+        result = await _generate_uncached_summary(
+            weather_data, location, user_activities,
+            location_slug, current_temp, current_code, background, now,
         )
-        return {"insight": insight, "cached": False}
+    except asyncio.CancelledError:
+        future.set_exception(_LeaderCancelled())
+        future.exception()  # mark retrieved — there may be no waiters
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        future.exception()  # mark retrieved — waiters re-raise it themselves
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _inflight.pop(inflight_key, None)
 
-    # Build insights section
-    insights = weather_data.get("daily", {}).get("insights") or weather_data.get("insights")
-    insights_prompt = ""
-    if insights and isinstance(insights, dict):
-        parts = []
-        field_map = {
-            "heatStressIndex": "Heat stress index",
-            "thunderstormProbability": "Thunderstorm probability",
-            "uvHealthConcern": "UV health concern",
-            "visibility": "Visibility",
-            "dewPoint": "Dew point",
-            "gdd10To30": "Maize/Soy GDD",
-            "evapotranspiration": "Evapotranspiration",
-            "moonPhase": "Moon phase",
-        }
-        for field, label in field_map.items():
-            val = insights.get(field)
-            if val is not None:
-                parts.append(f"{label}: {val}")
-        if parts:
-            insights_prompt = f"\nWeather insights (from Tomorrow.io): {', '.join(parts)}"
 
-    # Build user prompt
-    import json
-    current_data = json.dumps(weather_data.get("current", {}), default=str)
-    max_temps = json.dumps(weather_data.get("daily", {}).get("temperature_2m_max", []), default=str)
-    min_temps = json.dumps(weather_data.get("daily", {}).get("temperature_2m_min", []), default=str)
-    codes = json.dumps(weather_data.get("daily", {}).get("weather_code", []), default=str)
+def warm_caches() -> None:
+    """Populate the prompt and city tag caches before the first request.
 
-    tags_line = f"This area is relevant to: {', '.join(location_tags)}." if location_tags else ""
-    activities_line = f"The user's activities: {', '.join(user_activities[:3])}. Tailor advice to these activities." if user_activities else ""
-    activities_tip = (
-        f"One specific tip for the user's activities ({', '.join(user_activities[:3])})"
-        if user_activities
-        else "One industry/context-specific tip relevant to this area (e.g. farming advice for farming areas, safety for mining areas, travel conditions for border/travel areas, outdoor guidance for tourism/national parks)"
-    )
+    Called from the app lifespan so a cold instance doesn't make its first
+    summary request pay for these lookups (or for the ai_summaries index
+    check). Failures are ignored — the caches fill lazily on demand as before.
+    """
+    try:
+        prompt_cache.load()
+    except Exception:
+        logger.debug("Prompt cache warm-up failed — will load on first request")
 
-    user_content = f"""Generate a weather briefing for {location.name} (elevation: {location.elevation}m).
-{tags_line}
-{activities_line}
+    _ensure_indexes()
 
-Current conditions: {current_data}
-3-day forecast summary: max temps {max_temps}, min temps {min_temps}, weather codes {codes}{insights_prompt}
-Season: {season['localName']} ({season['name']})
+    try:
+        now = _time.time()
+        for doc in get_db()["locations"].find({"tags": "city"}, {"_id": 0, "slug": 1, "tags": 1}):
+            _remember_loc_tags(doc["slug"], doc.get("tags", []), now)
+    except Exception:
+        logger.debug("Location tag cache warm-up failed — will load on first request")
 
-Provide:
-1. A 2-sentence general summary
-2. {activities_tip}"""
 
-    # Use database-driven prompt (with fallback)
-    system_prompt = _get_system_prompt()
-    prompt_doc = _get_prompt("system:summary")
-    model = (prompt_doc or {}).get("model", "claude-haiku-4-5-20251001")
-    max_tokens = (prompt_doc or {}).get("maxTokens", 400)
+# ---------------------------------------------------------------------------
+# Batch pre-warm (Message Batches API)
+# ---------------------------------------------------------------------------
 
-    if not anthropic_breaker.is_allowed:
-        # Circuit is open — skip AI and use fallback
-        temp = weather_data.get("current", {}).get("temperature_2m")
-        humidity = weather_data.get("current", {}).get("relative_humidity_2m")
-        insight = (
-            f"Current conditions in {location.name}: "
-            f"{round(temp) if temp is not None else 'N/A'}\u00B0C with "
-            f"{humidity if humidity is not None else 'N/A'}% humidity. "
-            f"We are in the {season['localName']} season ({season['name']}). "
-            f"{season['description']}. Stay informed and plan your day accordingly."
+_PREWARM_KIND = "summary-prewarm"
+# A claim with no batchId after this long was left by a call that died mid-submit
+_PREWARM_CLAIM_TTL_S = 600
+
+
+def _build_prewarm_requests() -> tuple[list[dict], dict[str, dict]]:
+    """Build batch requests for every city-tagged location with fresh weather.
+
+    Returns (requests, snapshots) where snapshots maps slug → the weather
+    snapshot and tags needed to cache the result once the batch ends.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    locations = list(db["locations"].find(
+        {"tags": "city"},
+        {"_id": 0, "slug": 1, "name": 1, "elevation": 1, "country": 1, "lat": 1, "lon": 1, "tags": 1},
+    ))
+    if not locations:
+        return [], {}
+
+    weather_by_slug = {
+        doc["locationSlug"]: doc["data"]
+        for doc in db["weather_cache"].find(
+            {
+                "locationSlug": {"$in": [loc["slug"] for loc in locations]},
+                "expiresAt": {"$gt": now},
+            },
+            {"_id": 0, "locationSlug": 1, "data": 1},
         )
-    else:
-        try:
-            message = client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_content}],
-            )
-            anthropic_breaker.record_success()
+    }
 
-            text_block = next((b for b in message.content if b.type == "text"), None)
-            insight = text_block.text if text_block else "No insight available."
-        except Exception:
-            anthropic_breaker.record_failure()
-            # Fallback on any AI error
-            temp = weather_data.get("current", {}).get("temperature_2m")
-            humidity = weather_data.get("current", {}).get("relative_humidity_2m")
-            insight = (
-                f"Current conditions in {location.name}: "
-                f"{round(temp) if temp is not None else 'N/A'}\u00B0C with "
-                f"{humidity if humidity is not None else 'N/A'}% humidity. "
-                f"We are in the {season['localName']} season ({season['name']}). "
-                f"{season['description']}. Stay informed and plan your day accordingly."
-            )
+    requests: list[dict] = []
+    snapshots: dict[str, dict] = {}
+    for loc in locations:
+        weather_data = weather_by_slug.get(loc["slug"])
+        if not weather_data:
+            continue
+        location = LocationInfo(
+            name=loc["name"],
+            elevation=loc.get("elevation") or 1200,
+            lat=loc.get("lat", 0.0),
+            lon=loc.get("lon", 0.0),
+            country=loc.get("country", ""),
+        )
+        country = location.country if len(location.country) == 2 else ""
+        season = _get_season(country, lat=location.lat, lon=location.lon, now=now)
+        tags = loc.get("tags", [])
+        requests.append({
+            "custom_id": loc["slug"],
+            "params": _build_summary_request(weather_data, location, [], tags, season),
+        })
+        current = weather_data.get("current", {})
+        snapshots[loc["slug"]] = {
+            "snapshot": {
+                "temperature": current.get("temperature_2m", 0) or 0,
+                "weatherCode": current.get("weather_code", 0) or 0,
+            },
+            "tags": tags,
+        }
+    return requests, snapshots
+
+
+def _regenerate_tier1_batch(client: anthropic.Anthropic) -> dict:
+    """Submit or collect the Tier-1 summary pre-warm batch.
 
-    # Cache the summary
-    _set_cached_summary(
-        location_slug, insight,
-        {"temperature": current_temp, "weatherCode": current_code},
-        location_tags,
+    Batches can take minutes to hours, so this runs in two phases across
+    calls: with no pending batch it submits one and records its id; on a
+    later call it writes the results to ai_summaries once the batch ends.
+    """
+    batches = get_db()["ai_batches"]
+    now = datetime.now(timezone.utc)
+    # Claim the slot before submitting: the upsert on a fixed _id is atomic,
+    # so of two overlapping calls only one sees no prior doc and submits.
+    pending = batches.find_one_and_update(
+        {"_id": _PREWARM_KIND},
+        {"$setOnInsert": {"kind": _PREWARM_KIND, "claimedAt": now}},
+        upsert=True,
     )
+    claimed = pending is None
+    if not claimed and "batchId" not in pending:
+        # Another call is submitting; take over only a claim left by a crash
+        claimed = batches.find_one_and_update(
+            {
+                "_id": _PREWARM_KIND,
+                "batchId": {"$exists": False},
+                "claimedAt": {"$lt": now - timedelta(seconds=_PREWARM_CLAIM_TTL_S)},
+            },
+            {"$set": {"claimedAt": now}},
+        ) is not None
+        if not claimed:
+            return {"status": "submitting"}
+
+    if claimed:
+        try:
+            requests, snapshots = _build_prewarm_requests()
+            if not requests:
+                batches.delete_one({"_id": _PREWARM_KIND})
+                return {"status": "idle", "submitted": 0}
+            batch = client.messages.batches.create(requests=requests)
+        except Exception:
+            batches.delete_one({"_id": _PREWARM_KIND})
+            raise
+        batches.update_one(
+            {"_id": _PREWARM_KIND},
+            {"$set": {"batchId": batch.id, "snapshots": snapshots, "createdAt": now}},
+        )
+        return {"status": "submitted", "batchId": batch.id, "submitted": len(requests)}
+
+    batch_id = pending["batchId"]
+    batch = client.messages.batches.retrieve(batch_id)
+    if batch.processing_status != "ended":
+        return {"status": "processing", "batchId": batch_id}
+
+    snapshots = pending.get("snapshots", {})
+    written = 0
+    for entry in client.messages.batches.results(batch_id):
+        meta = snapshots.get(entry.custom_id)
+        if meta is None or entry.result.type != "succeeded":
+            continue
+        text_block = next((b for b in entry.result.message.content if b.type == "text"), None)
+        if text_block is None:
+            continue
+        _set_cached_summary(entry.custom_id, text_block.text, meta["snapshot"], meta["tags"])
+        written += 1
+
+    batches.delete_one({"_id": pending["_id"]})
+    return {"status": "collected", "batchId": batch_id, "written": written}
+
+
+@router.post("/api/py/ai/prewarm")
+async def prewarm_summaries(request: Request):
+    """
+    POST /api/py/ai/prewarm
+
+    Pre-generate summaries for city-tagged locations via the Message
+    Batches API (half the cost of interactive calls). Call periodically,
+    e.g. from a scheduled job: each call either submits a new batch or
+    collects the pending one. Protected by the x-init-secret header.
+    """
+    secret = os.environ.get("DB_INIT_SECRET")
+    # Bytes, since compare_digest rejects non-ASCII str and headers are latin-1
+    supplied = request.headers.get("x-init-secret", "").encode()
+    if not secret or not secrets.compare_digest(supplied, secret.encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    client = _get_client()
+    if not client:
+        raise HTTPException(status_code=503, detail="AI service unavailable")
 
-    return {"insight": insight, "cached": False, "generatedAt": datetime.now(timezone.utc).isoformat()}
+    return await asyncio.to_thread(_regenerate_tier1_batch, client)
@@ -10,21 +10,26 @@ System prompt and model config are fetched from the database.
 
 from __future__ import annotations
 
+import asyncio
 import os
-import time
+import re
 from typing import Optional
 
 import anthropic
+import orjson
 from fastapi import APIRouter, HTTPException, Request
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
 
 from ._db import (
-    check_rate_limit,
+    api_key_digest,
+    same_api_key,
+    check_rate_limit_local,
     get_client_ip,
     get_api_key,
-    ai_prompts_collection,
 )
 from ._circuit_breaker import anthropic_breaker, CircuitOpenError
+from ._ai_prompts_cache import prompt_cache
 
 router = APIRouter()
 
@@ -38,17 +43,15 @@ MAX_MESSAGES_PER_CONVERSATION = 5
 RATE_LIMIT_MAX = 30
 RATE_LIMIT_WINDOW = 3600  # 1 hour
 
+# Template placeholders — substituted in a single pass
+_FOLLOWUP_VARS_RE = re.compile(r"\{(locationName|locationSlug|weatherSummary|activities|season)\}")
+
 # ---------------------------------------------------------------------------
 # Module-level singleton client
 # ---------------------------------------------------------------------------
 
 _client: Optional[anthropic.Anthropic] = None
-_client_key_last: Optional[str] = None
-
-# Prompt cache (5-min TTL)
-_prompt_cache: dict[str, dict] = {}
-_prompt_cache_at: float = 0
-_PROMPT_CACHE_TTL = 300
+_client_key_digest: Optional[bytes] = None
 
 # Hardcoded fallback
 _FALLBACK_SYSTEM_PROMPT = """You are Shamwari Weather, a weather assistant for mukoko weather. You are having a follow-up conversation about weather in {locationName}.
@@ -73,7 +76,7 @@ DATA GUARDRAILS:
 
 
 def _get_client() -> anthropic.Anthropic:
-    global _client, _client_key_last
+    global _client, _client_key_digest
 
     key = os.environ.get("ANTHROPIC_API_KEY")
     if not key:
@@ -81,31 +84,16 @@ def _get_client() -> anthropic.Anthropic:
     if not key:
         raise HTTPException(status_code=503, detail="AI service unavailable")
 
-    if _client is None or _client_key_last != key:
+    if _client is None or not same_api_key(_client_key_digest, key):
         _client = anthropic.Anthropic(api_key=key)
-        _client_key_last = key
+        _client_key_digest = api_key_digest(key)
 
     return _client
 
 
 def _get_followup_prompt() -> dict | None:
-    """Fetch the follow-up system prompt from MongoDB."""
-    global _prompt_cache, _prompt_cache_at
-
-    now = time.time()
-    if _prompt_cache and (now - _prompt_cache_at) < _PROMPT_CACHE_TTL:
-        return _prompt_cache.get("system:followup")
-
-    try:
-        docs = list(
-            ai_prompts_collection()
-            .find({"active": True}, {"_id": 0, "updatedAt": 0})
-        )
-        _prompt_cache = {d["promptKey"]: d for d in docs}
-        _prompt_cache_at = now
-        return _prompt_cache.get("system:followup")
-    except Exception:
-        return _prompt_cache.get("system:followup")
+    """Fetch the follow-up system prompt from the shared prompt cache."""
+    return prompt_cache.get("system:followup")
 
 
 def _build_followup_system_prompt(
@@ -123,14 +111,14 @@ def _build_followup_system_prompt(
         else _FALLBACK_SYSTEM_PROMPT
     )
 
-    return (
-        template
-        .replace("{locationName}", location_name)
-        .replace("{locationSlug}", location_slug)
-        .replace("{weatherSummary}", weather_summary[:500])
-        .replace("{activities}", ", ".join(activities[:5]) if activities else "none selected")
-        .replace("{season}", season or "unknown")
-    )
+    subs = {
+        "locationName": location_name,
+        "locationSlug": location_slug,
+        "weatherSummary": weather_summary[:500],
+        "activities": ", ".join(activities[:5]) if activities else "none selected",
+        "season": season or "unknown",
+    }
+    return _FOLLOWUP_VARS_RE.sub(lambda m: subs[m.group(1)], template)
 
 
 # ---------------------------------------------------------------------------
@@ -139,11 +127,15 @@ def _build_followup_system_prompt(
 
 
 class FollowupMessage(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     role: str
     content: str
 
 
 class FollowupRequest(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     message: str
     locationName: str
     locationSlug: str
@@ -151,6 +143,45 @@ class FollowupRequest(BaseModel):
     activities: list[str] = Field(default_factory=list)
     season: str = ""
     history: list[FollowupMessage] = Field(default_factory=list)
+    stream: bool = False  # opt-in SSE response (text deltas, then a "done" event)
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+_UNAVAILABLE_REPLY = "AI follow-up is temporarily unavailable while the service recovers. The weather data above is still available."
+_CONNECTION_REPLY = "I'm having trouble connecting right now. The weather data above is still available."
+
+
+def _sse(payload: dict) -> str:
+    """Format one server-sent event."""
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+def _stream_followup(client: anthropic.Anthropic, request_kwargs: dict) -> StreamingResponse:
+    """Stream a follow-up reply as SSE text deltas plus a final "done" event.
+
+    Errors after the stream has started can't change the status code, so
+    they are reported in the "done" event with the same fallback text the
+    JSON endpoint returns.
+    """
+    def _events():
+        chunks: list[str] = []
+        try:
+            with client.messages.stream(**request_kwargs) as stream:
+                for text in stream.text_stream:
+                    chunks.append(text)
+                    yield _sse({"type": "delta", "text": text})
+            anthropic_breaker.record_success()
+        except anthropic.APIError:
+            anthropic_breaker.record_failure()
+            yield _sse({"type": "done", "response": _CONNECTION_REPLY, "error": True})
+            return
+        reply = "".join(chunks) or "I wasn't able to generate a response."
+        yield _sse({"type": "done", "response": reply})
+
+    return StreamingResponse(_events(), media_type="text/event-stream")
 
 
 # ---------------------------------------------------------------------------
@@ -165,6 +196,7 @@ async def followup_chat(body: FollowupRequest, request: Request):
 
     Lightweight follow-up chat for location pages.
     Context is pre-seeded with the AI weather summary.
+    With "stream": true the response is an SSE stream instead of JSON.
     """
     message = body.message.strip()
     if not message:
@@ -177,7 +209,7 @@ async def followup_chat(body: FollowupRequest, request: Request):
     if not ip:
         raise HTTPException(status_code=400, detail="Could not determine IP")
 
-    rate = check_rate_limit(ip, "followup", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
+    rate = await asyncio.to_thread(check_rate_limit_local, ip, "followup", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
     if not rate["allowed"]:
         raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.")
 
@@ -213,17 +245,26 @@ async def followup_chat(body: FollowupRequest, request: Request):
 
     if not anthropic_breaker.is_allowed:
         return {
-            "response": "AI follow-up is temporarily unavailable while the service recovers. The weather data above is still available.",
+            "response": _UNAVAILABLE_REPLY,
             "error": True,
         }
 
+    request_kwargs = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "system": [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"},
+        }],
+        "messages": messages,
+    }
+
+    if body.stream:
+        return _stream_followup(client, request_kwargs)
+
     try:
-        response = client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            system=system_prompt,
-            messages=messages,
-        )
+        response = client.messages.create(**request_kwargs)
         anthropic_breaker.record_success()
 
         text_block = next((b for b in response.content if b.type == "text"), None)
@@ -237,6 +278,6 @@ async def followup_chat(body: FollowupRequest, request: Request):
     except anthropic.APIError:
         anthropic_breaker.record_failure()
         return {
-            "response": "I'm having trouble connecting right now. The weather data above is still available.",
+            "response": _CONNECTION_REPLY,
             "error": True,
         }
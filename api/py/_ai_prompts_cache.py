@@ -0,0 +1,95 @@
+"""
+Shared runtime cache for database-driven AI prompt templates.
+
+The summary, follow-up and explore search endpoints all read from the
+ai_prompts collection. They share one PromptCache so a warm instance
+loads all active prompts with a single MongoDB query per TTL window,
+instead of each endpoint keeping (and refreshing) its own copy.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from ._db import ai_prompts_collection
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_TTL = 300  # 5 minutes
+
+
+def _normalize_template(doc: dict) -> dict:
+    """Normalize line endings and trailing whitespace in a prompt template.
+
+    Anthropic prompt caching matches on an exact byte prefix, so a stray
+    CRLF or trailing newline in a DB edit would silently break cache hits.
+    """
+    template = doc.get("template")
+    if isinstance(template, str):
+        doc["template"] = template.replace("\r\n", "\n").rstrip()
+    return doc
+
+
+class PromptCache:
+    """All active prompts keyed by promptKey, served stale-while-revalidate.
+
+    The first lookup loads synchronously. After that an expired cache is
+    returned immediately and reloaded in a background thread, so no request
+    blocks on the MongoDB fetch.
+    """
+
+    def __init__(self, ttl: float = PROMPT_CACHE_TTL) -> None:
+        self.ttl = ttl
+        self._cache: dict[str, dict] = {}
+        self._cache_at: float = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self) -> None:
+        """Reload all active prompt templates in one query."""
+        docs = list(
+            ai_prompts_collection()
+            .find({"active": True}, {"_id": 0, "updatedAt": 0})
+        )
+        self._cache = {d["promptKey"]: _normalize_template(d) for d in docs}
+        self._cache_at = time.time()
+
+    def clear(self) -> None:
+        self._cache = {}
+        self._cache_at = 0
+
+    def _refresh_in_background(self) -> None:
+        """Fire-and-forget reload; no-op if a refresh is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run() -> None:
+            try:
+                self.load()
+            except Exception:
+                logger.debug("Background prompt refresh failed — serving stale prompts")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=_run, daemon=True).start()
+
+    def get(self, prompt_key: str) -> dict | None:
+        if self._cache:
+            if (time.time() - self._cache_at) >= self.ttl:
+                self._refresh_in_background()
+            return self._cache.get(prompt_key)
+
+        try:
+            self.load()
+        except Exception:
+            pass
+        return self._cache.get(prompt_key)
+
+
+# Module-level instance — shared by every endpoint in a warm process
+prompt_cache = PromptCache()
@@ -0,0 +1,67 @@
+"""
+Shared async Anthropic client for the chat and explore search endpoints.
+
+One connection pool per warm instance, used by a single client that is
+recreated only when the API key rotates. Keeping both here (rather than in
+either router) means app shutdown can release everything that holds the
+pool, so no endpoint is left with a client bound to a closed connection.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+import anthropic
+import httpx
+from fastapi import HTTPException
+
+from ._db import api_key_digest, get_api_key, same_api_key
+
+# The pool outlives key rotation, so a recreated client keeps its warm TLS
+# connections.
+_POOL_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60)
+
+_http: Optional[httpx.AsyncClient] = None
+_client: Optional[anthropic.AsyncAnthropic] = None
+_client_key_digest: Optional[bytes] = None
+
+
+def _get_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        # The SDK's default client keeps its timeouts and redirect settings
+        _http = anthropic.DefaultAsyncHttpxClient(limits=_POOL_LIMITS)
+    return _http
+
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """Get or create the async Anthropic client. Recreates if key changes.
+
+    Sync because the key may come from MongoDB; callers run it via
+    asyncio.to_thread. Raises 503 when no key is configured.
+    """
+    global _client, _client_key_digest
+
+    key = os.environ.get("ANTHROPIC_API_KEY")
+    if not key:
+        key = get_api_key("anthropic")
+    if not key:
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+
+    if _client is None or not same_api_key(_client_key_digest, key):
+        _client = anthropic.AsyncAnthropic(api_key=key, http_client=_get_http())
+        _client_key_digest = api_key_digest(key)
+
+    return _client
+
+
+async def close_async_client() -> None:
+    """Close the pooled Anthropic connections and drop the client (app shutdown)."""
+    global _http, _client, _client_key_digest
+    _client = None
+    _client_key_digest = None
+    if _http is None:
+        return
+    http, _http = _http, None
+    await http.aclose()
@@ -16,16 +16,33 @@ This is an in-memory implementation optimised for serverless (Vercel).
 State persists across warm function starts (~5-15 minutes on Vercel),
 enough to prevent retry storms within a request and across the warm
 reuse window.
+
+Opens are also shared through MongoDB so one instance's outage detection
+protects the others: an instance that opens a circuit records when the
+cooldown ends, and one poller thread per instance (start_shared_sync, run
+from the app lifespan) checks for that every few seconds. A reset or a
+recovered provider clears the record. Requests never wait on the shared store.
 """
 
 from __future__ import annotations
 
 import asyncio
 import logging
+import sys
+import threading
 import time
+from collections import deque
 from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from typing import Callable, TypeVar
 
+from ._db import circuit_breakers_collection
+
+if sys.version_info >= (3, 11):
+    from asyncio import timeout as _timeout
+else:  # pragma: no cover
+    from async_timeout import timeout as _timeout
+
 logger = logging.getLogger("mukoko.circuit_breaker")
 
 T = TypeVar("T")
@@ -68,7 +85,8 @@ PROVIDER_CONFIGS: dict[str, CircuitBreakerConfig] = {
 @dataclass
 class _CircuitState:
     state: str = "closed"  # "closed" | "open" | "half_open"
-    failures: list[float] = field(default_factory=list)
+    # Timestamps are time.monotonic() so NTP steps can't skew the windows
+    failures: deque[float] = field(default_factory=deque)  # oldest first
     last_opened_at: float | None = None
 
 
@@ -77,9 +95,106 @@ _circuit_states: dict[str, _CircuitState] = {}
 
 
 def _get_state(provider: str) -> _CircuitState:
-    if provider not in _circuit_states:
-        _circuit_states[provider] = _CircuitState()
-    return _circuit_states[provider]
+    # Single lookup on the hot path — every is_allowed check lands here
+    s = _circuit_states.get(provider)
+    if s is None:
+        s = _circuit_states[provider] = _CircuitState()
+    return s
+
+
+# ---------------------------------------------------------------------------
+# Shared state (MongoDB) — best effort, never on the request path
+# ---------------------------------------------------------------------------
+
+SHARED_SYNC_INTERVAL_S = 15  # how often the poller looks for remote opens
+
+# Every breaker created in this process, by provider, for the poller
+_breakers: dict[str, "CircuitBreaker"] = {}
+_sync_stop = threading.Event()
+_sync_thread: threading.Thread | None = None
+
+
+def _in_background(fn: Callable[..., None], *args) -> None:
+    threading.Thread(target=fn, args=args, daemon=True).start()
+
+
+def _publish_open(provider: str, cooldown_s: float) -> None:
+    """Record that provider's circuit is open until now + cooldown_s."""
+    try:
+        circuit_breakers_collection().update_one(
+            {"provider": provider},
+            {"$set": {"openUntil": datetime.now(timezone.utc) + timedelta(seconds=cooldown_s)}},
+            upsert=True,
+        )
+    except Exception:
+        logger.debug("Could not publish open circuit for %s", provider)
+
+
+def _publish_closed(provider: str) -> None:
+    """Clear provider's shared open so other instances stop adopting it."""
+    try:
+        circuit_breakers_collection().update_one(
+            {"provider": provider}, {"$unset": {"openUntil": ""}},
+        )
+    except Exception:
+        logger.debug("Could not publish closed circuit for %s", provider)
+
+
+def _read_open_remaining(providers: list[str]) -> dict[str, float]:
+    """Seconds left on circuits other instances opened, by provider (open only)."""
+    now = datetime.now(timezone.utc)
+    remaining: dict[str, float] = {}
+    for doc in circuit_breakers_collection().find(
+        {"provider": {"$in": providers}, "openUntil": {"$gt": now}},
+        {"_id": 0, "provider": 1, "openUntil": 1},
+    ):
+        until = doc["openUntil"]
+        if until.tzinfo is None:  # PyMongo returns naive UTC datetimes
+            until = until.replace(tzinfo=timezone.utc)
+        left = (until - now).total_seconds()
+        if left > 0:
+            remaining[doc["provider"]] = left
+    return remaining
+
+
+def sync_shared() -> None:
+    """Open any closed local circuit that another instance has open.
+
+    One MongoDB query covers every provider. Blocking; the poller thread
+    calls it, never a request.
+    """
+    closed = [p for p, b in _breakers.items() if _get_state(p).state == "closed"]
+    if not closed:
+        return
+    try:
+        remaining = _read_open_remaining(closed)
+    except Exception:
+        logger.debug("Shared circuit state unavailable")
+        return
+    for provider, left in remaining.items():
+        _breakers[provider]._adopt_shared_open(left)
+
+
+def _sync_loop() -> None:
+    while True:
+        sync_shared()
+        if _sync_stop.wait(SHARED_SYNC_INTERVAL_S):
+            return
+
+
+def start_shared_sync() -> None:
+    """Start the shared-state poller (app startup). Idempotent."""
+    global _sync_thread
+    if _sync_thread is not None and _sync_thread.is_alive():
+        return
+    _sync_stop.clear()
+    _sync_thread = threading.Thread(target=_sync_loop, name="circuit-breaker-sync", daemon=True)
+    _sync_thread.start()
+
+
+def stop_shared_sync() -> None:
+    """Stop the shared-state poller (app shutdown)."""
+    _sync_stop.set()
 
 
 # ---------------------------------------------------------------------------
@@ -110,17 +225,22 @@ class CircuitBreaker:
         self.config = config or PROVIDER_CONFIGS.get(
             provider, CircuitBreakerConfig()
         )
+        _breakers[provider] = self
 
     @property
     def state(self) -> str:
         s = _get_state(self.provider)
-        if s.state == "open" and self._cooldown_elapsed(s):
+        st = s.state
+        if st != "open":
+            return st
+        if self._cooldown_elapsed(s, time.monotonic()):
             s.state = "half_open"
-        return s.state
+            return "half_open"
+        return "open"
 
     @property
     def is_allowed(self) -> bool:
-        return self.state in ("closed", "half_open")
+        return self.state != "open"
 
     async def execute(self, fn: Callable[[], T]) -> T:
         """
@@ -133,13 +253,12 @@ class CircuitBreaker:
         if not self.is_allowed:
             raise CircuitOpenError(self.provider)
 
+        # A timeout context cancels fn() in place instead of wrapping it in
+        # a separate Task the way asyncio.wait_for does.
         try:
-            result = await asyncio.wait_for(
-                fn(), timeout=self.config.timeout_s,
-            )
-            self.record_success()
-            return result
-        except asyncio.TimeoutError:
+            async with _timeout(self.config.timeout_s):
+                result = await fn()
+        except (TimeoutError, asyncio.TimeoutError):
             self.record_failure()
             raise TimeoutError(
                 f"{self.provider} request timed out after {self.config.timeout_s}s"
@@ -149,6 +268,8 @@ class CircuitBreaker:
         except Exception:
             self.record_failure()
             raise
+        self.record_success()
+        return result
 
     def record_success(self) -> None:
         """Record a successful call — closes half-open circuits."""
@@ -161,15 +282,18 @@ class CircuitBreaker:
                 "Circuit breaker closed for %s — provider recovered",
                 self.provider,
             )
+            _in_background(_publish_closed, self.provider)
 
     def record_failure(self) -> None:
         """Record a failed call — may open the circuit."""
         s = _get_state(self.provider)
-        now = time.time()
+        now = time.monotonic()
 
-        # Add failure timestamp and prune old ones outside the window
+        # Add failure timestamp and drop expired ones from the old end
         s.failures.append(now)
-        s.failures = [t for t in s.failures if now - t < self.config.window_s]
+        window = self.config.window_s
+        while s.failures and now - s.failures[0] >= window:
+            s.failures.popleft()
 
         if s.state == "half_open":
             # Probe failed — reopen
@@ -179,6 +303,7 @@ class CircuitBreaker:
                 "Circuit breaker re-opened for %s — probe failed",
                 self.provider,
             )
+            _in_background(_publish_open, self.provider, self.config.cooldown_s)
         elif (
             s.state == "closed"
             and len(s.failures) >= self.config.failure_threshold
@@ -189,6 +314,7 @@ class CircuitBreaker:
                 "Circuit breaker opened for %s — %d failures in %ds window",
                 self.provider, len(s.failures), self.config.window_s,
             )
+            _in_background(_publish_open, self.provider, self.config.cooldown_s)
 
     def reset(self) -> None:
         """Reset the circuit to closed (e.g. manual recovery)."""
@@ -196,11 +322,26 @@ class CircuitBreaker:
         s.state = "closed"
         s.failures.clear()
         s.last_opened_at = None
+        # Otherwise the poller would re-adopt the open this reset is undoing
+        _in_background(_publish_closed, self.provider)
+
+    def _adopt_shared_open(self, remaining: float) -> None:
+        """Open this instance's circuit for the remote cooldown's remaining time."""
+        s = _get_state(self.provider)
+        if s.state != "closed":
+            return
+        s.state = "open"
+        # Line the local cooldown up with the remote one
+        s.last_opened_at = time.monotonic() - (self.config.cooldown_s - remaining)
+        logger.warning(
+            "Circuit breaker opened for %s — open on another instance",
+            self.provider,
+        )
 
-    def _cooldown_elapsed(self, s: _CircuitState) -> bool:
+    def _cooldown_elapsed(self, s: _CircuitState, now: float) -> bool:
         if s.last_opened_at is None:
             return False
-        return time.time() - s.last_opened_at >= self.config.cooldown_s
+        return now - s.last_opened_at >= self.config.cooldown_s
 
 
 # ---------------------------------------------------------------------------
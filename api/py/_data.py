@@ -1,13 +1,20 @@
 """
 Data endpoints — migrated from /api/activities, /api/tags, /api/regions.
 
-Serves activities, tags, and regions from MongoDB.
+Serves activities, tags, and regions from MongoDB. PyMongo is synchronous,
+so every query runs in a worker thread to keep the event loop free for
+other requests on the same instance.
 """
 
 from __future__ import annotations
 
+import asyncio
+import time
+from typing import Any, Callable
+
+import orjson
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 
 from ._db import (
     get_db,
@@ -17,6 +24,71 @@ from ._db import (
 
 router = APIRouter()
 
+# Shared query specs — PyMongo only reads these, so one copy serves every request
+_NO_ID = {"_id": 0}
+_LABEL_PROJ = {"id": 1, "label": 1, "_id": 0}
+_TEXT_PROJ = {"_id": 0, "score": {"$meta": "textScore"}}
+_TEXT_SORT = [("score", {"$meta": "textScore"})]
+_CATEGORY_LABEL_SORT = [("category", 1), ("label", 1)]
+
+_REFERENCE_HEADERS = {"Cache-Control": "public, max-age=3600, stale-while-revalidate=86400"}
+
+# Reference data changes only with a reseed, so warm instances serve it from
+# memory as ready-to-send JSON bytes — a cache hit skips jsonable_encoder and
+# serialization entirely. Free-text search, id and label lookups are never
+# cached; category is client-supplied, so the cache is also capped in size.
+_ACTIVITIES_CACHE_TTL = 300  # 5 minutes
+_REFERENCE_CACHE_TTL = 3600  # matches the tags/regions Cache-Control max-age
+_RESPONSE_CACHE_MAX = 128
+_response_cache: dict[tuple, tuple[float, bytes]] = {}
+
+
+async def _cached_json(
+    key: tuple,
+    ttl: float,
+    producer: Callable[[], Any],
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Serve the cached JSON body for key, running producer in a thread on a miss."""
+    now = time.monotonic()
+    hit = _response_cache.get(key)
+    if hit is not None and now - hit[0] < ttl:
+        body = hit[1]
+    else:
+        body = orjson.dumps(await asyncio.to_thread(producer))
+        if len(_response_cache) >= _RESPONSE_CACHE_MAX:
+            _response_cache.clear()
+        _response_cache[key] = (now, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _activities_payload(docs: list[dict]) -> dict:
+    return {"activities": docs, "total": len(docs)}
+
+
+def _search_activities(coll, query_str: str) -> list[dict]:
+    """Text-index search, falling back to a label regex if $text fails."""
+    try:
+        docs = list(
+            coll.find(
+                {"$text": {"$search": query_str}},
+                _TEXT_PROJ,
+            )
+            .sort(_TEXT_SORT)
+            .limit(20)
+        )
+        for d in docs:
+            d.pop("score", None)
+        return docs
+    except Exception:
+        # Fallback: regex search
+        return list(
+            coll.find(
+                {"label": {"$regex": query_str, "$options": "i"}},
+                _NO_ID,
+            ).limit(20)
+        )
+
 
 # ---------------------------------------------------------------------------
 # /api/py/activities
@@ -41,59 +113,51 @@ async def get_activities(
     """
     try:
         coll = activities_collection()
-        db = get_db()
 
         # Categories mode
         if mode == "categories":
-            categories = list(db["activity_categories"].find({}, {"_id": 0}))
-            return {"categories": categories}
+            return await _cached_json(
+                ("activity_categories",), _ACTIVITIES_CACHE_TTL,
+                lambda: {"categories": list(get_db()["activity_categories"].find({}, _NO_ID))},
+            )
 
         # Single by ID
         if id:
-            activity = coll.find_one({"id": id}, {"_id": 0})
+            activity = await asyncio.to_thread(coll.find_one, {"id": id}, _NO_ID)
             if not activity:
                 raise HTTPException(status_code=404, detail="Activity not found")
             return {"activity": activity}
 
         # Label lookup
         if labels:
-            ids = [s.strip() for s in labels.split(",") if s.strip()]
-            docs = list(coll.find({"id": {"$in": ids}}, {"id": 1, "label": 1, "_id": 0}))
-            result = {d["id"]: d["label"] for d in docs}
+            ids = list(dict.fromkeys(s.strip() for s in labels.split(",") if s.strip()))
+            # Build the map straight off the cursor — no intermediate list.
+            # The { id, label } index (db.ts ensureIndexes) makes this a
+            # covered query: _LABEL_PROJ reads only indexed fields.
+            result = await asyncio.to_thread(
+                lambda: {d["id"]: d["label"] for d in coll.find({"id": {"$in": ids}}, _LABEL_PROJ)},
+            )
             return {"labels": result}
 
         # Text search
         if q:
-            query_str = q.strip()[:200]
-            try:
-                docs = list(
-                    coll.find(
-                        {"$text": {"$search": query_str}},
-                        {"_id": 0, "score": {"$meta": "textScore"}},
-                    )
-                    .sort([("score", {"$meta": "textScore"})])
-                    .limit(20)
-                )
-                for d in docs:
-                    d.pop("score", None)
-            except Exception:
-                # Fallback: regex search
-                docs = list(
-                    coll.find(
-                        {"label": {"$regex": query_str, "$options": "i"}},
-                        {"_id": 0},
-                    ).limit(20)
-                )
-            return {"activities": docs, "total": len(docs)}
+            docs = await asyncio.to_thread(_search_activities, coll, q.strip()[:200])
+            return _activities_payload(docs)
 
         # Filter by category
         if category:
-            docs = list(coll.find({"category": category}, {"_id": 0}).sort("label", 1))
-            return {"activities": docs, "total": len(docs)}
+            return await _cached_json(
+                ("activities", category), _ACTIVITIES_CACHE_TTL,
+                lambda: _activities_payload(
+                    list(coll.find({"category": category}, _NO_ID).sort("label", 1))
+                ),
+            )
 
         # All activities
-        docs = list(coll.find({}, {"_id": 0}).sort([("category", 1), ("label", 1)]))
-        return {"activities": docs, "total": len(docs)}
+        return await _cached_json(
+            ("activities", None), _ACTIVITIES_CACHE_TTL,
+            lambda: _activities_payload(list(coll.find({}, _NO_ID).sort(_CATEGORY_LABEL_SORT))),
+        )
     except HTTPException:
         raise
     except Exception:
@@ -117,10 +181,10 @@ async def get_tags(featured: bool = False):
         if featured:
             query["featured"] = True
 
-        tags = list(coll.find(query, {"_id": 0}).sort("slug", 1))
-        return JSONResponse(
-            content={"tags": tags},
-            headers={"Cache-Control": "public, max-age=3600, stale-while-revalidate=86400"},
+        return await _cached_json(
+            ("tags", featured), _REFERENCE_CACHE_TTL,
+            lambda: {"tags": list(coll.find(query, _NO_ID).sort("slug", 1))},
+            _REFERENCE_HEADERS,
         )
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to fetch tags")
@@ -135,11 +199,10 @@ async def get_tags(featured: bool = False):
 async def get_regions():
     """GET /api/py/regions — Active supported regions."""
     try:
-        db = get_db()
-        regions = list(db["regions"].find({"active": True}, {"_id": 0}))
-        return JSONResponse(
-            content={"regions": regions},
-            headers={"Cache-Control": "public, max-age=3600, stale-while-revalidate=86400"},
+        return await _cached_json(
+            ("regions",), _REFERENCE_CACHE_TTL,
+            lambda: {"regions": list(get_db()["regions"].find({"active": True}, _NO_ID))},
+            _REFERENCE_HEADERS,
         )
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to fetch regions")
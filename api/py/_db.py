@@ -7,84 +7,139 @@ Uses the same MONGODB_URI and database as the Next.js app.
 
 from __future__ import annotations
 
+import hashlib
 import os
+import secrets
+import threading
 import time as _time
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
 from fastapi import HTTPException, Request
-from pymongo import MongoClient
+from pymongo import MongoClient, ReadPreference
 from pymongo.database import Database
 
 _client: Optional[MongoClient] = None
+_db: Optional[Database] = None
 
 
 def get_db() -> Database:
-    """Lazy-init MongoDB client. Reuses connection across warm Vercel instances."""
-    global _client
-    if _client is None:
+    """Lazy-init MongoDB client. Reuses connection across warm Vercel instances.
+
+    The pool is bounded so concurrent requests queue briefly instead of
+    opening new Atlas connections, and keeps a couple of sockets open so
+    warm invocations skip the TLS handshake.
+    """
+    global _client, _db
+    if _db is None:
         uri = os.environ.get("MONGODB_URI")
         if not uri:
             raise HTTPException(status_code=503, detail="Database unavailable")
-        _client = MongoClient(uri, appName="mukoko-weather-py", maxIdleTimeMS=5000)
-    return _client["mukoko-weather"]
+        _client = MongoClient(
+            uri,
+            appName="mukoko-weather-py",
+            maxPoolSize=50,
+            minPoolSize=2,
+            maxIdleTimeMS=60000,
+            waitQueueTimeoutMS=1000,
+            serverSelectionTimeoutMS=5000,
+            socketTimeoutMS=10000,
+            retryWrites=True,
+        )
+        _db = _client["mukoko-weather"]
+    return _db
+
+
+def warm_db() -> None:
+    """Open the pool and complete server selection/TLS ahead of the first request."""
+    try:
+        get_db().command("ping")
+    except Exception:
+        pass
 
 
 # ---------------------------------------------------------------------------
 # Collection accessors
 # ---------------------------------------------------------------------------
 
+# Database.__getitem__ builds a fresh Collection (codec/read/write options)
+# on every call. Handles are cached per name and tied to the Database they
+# came from, so a new client (or a patched get_db in tests) starts clean.
+_collections: dict[tuple[str, object], tuple[Database, object]] = {}
+
+
+def _collection(name: str, read_preference=None):
+    db = get_db()
+    key = (name, read_preference)
+    hit = _collections.get(key)
+    if hit is not None and hit[0] is db:
+        return hit[1]
+    coll = db[name]
+    if read_preference is not None:
+        coll = coll.with_options(read_preference=read_preference)
+    _collections[key] = (db, coll)
+    return coll
+
 
 def device_profiles_collection():
-    return get_db()["device_profiles"]
+    return _collection("device_profiles")
 
 
 def locations_collection():
-    return get_db()["locations"]
+    return _collection("locations")
+
+
+def locations_nearest_collection():
+    """Locations for reads that tolerate replica lag (served by the nearest member)."""
+    return _collection("locations", ReadPreference.NEAREST)
 
 
 def weather_cache_collection():
-    return get_db()["weather_cache"]
+    return _collection("weather_cache")
 
 
 def ai_summaries_collection():
-    return get_db()["ai_summaries"]
+    return _collection("ai_summaries")
 
 
 def activities_collection():
-    return get_db()["activities"]
+    return _collection("activities")
 
 
 def suitability_rules_collection():
-    return get_db()["suitability_rules"]
+    return _collection("suitability_rules")
 
 
 def rate_limits_collection():
-    return get_db()["rate_limits"]
+    return _collection("rate_limits")
 
 
 def api_keys_collection():
-    return get_db()["api_keys"]
+    return _collection("api_keys")
 
 
 def tags_collection():
-    return get_db()["tags"]
+    return _collection("tags")
 
 
 def ai_prompts_collection():
-    return get_db()["ai_prompts"]
+    return _collection("ai_prompts")
 
 
 def ai_suggested_rules_collection():
-    return get_db()["ai_suggested_rules"]
+    return _collection("ai_suggested_rules")
 
 
 def weather_reports_collection():
-    return get_db()["weather_reports"]
+    return _collection("weather_reports")
 
 
 def history_analysis_collection():
-    return get_db()["history_analysis"]
+    return _collection("history_analysis")
+
+
+def circuit_breakers_collection():
+    return _collection("circuit_breakers")
 
 
 # ---------------------------------------------------------------------------
@@ -92,8 +147,44 @@ def history_analysis_collection():
 # ---------------------------------------------------------------------------
 
 
+def text_trigrams(text: str) -> list[str]:
+    """Distinct lowercase 3-character substrings of text, sorted."""
+    t = text.lower()
+    return sorted({t[i:i + 3] for i in range(len(t) - 2)})
+
+
+def location_search_fields(name: str, province: str = "") -> dict:
+    """Precomputed fields backing the indexed location search fallback.
+
+    Mirrors locationSearchFields() in src/lib/db.ts — both writers must
+    produce identical values or the fallback misses documents.
+    """
+    return {
+        "name_lower": name.lower(),
+        "province_lower": province.lower(),
+        "trigrams": sorted(set(text_trigrams(name)) | set(text_trigrams(province))),
+    }
+
+
+def api_key_digest(key: str) -> bytes:
+    """Fixed-size fingerprint of an API key.
+
+    Cached SDK clients keep this instead of the raw key to notice rotation.
+    """
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+def same_api_key(digest: Optional[bytes], key: str) -> bool:
+    """Constant-time check that ``key`` matches a stored api_key_digest."""
+    return digest is not None and secrets.compare_digest(digest, api_key_digest(key))
+
+
 def get_api_key(provider: str) -> Optional[str]:
-    """Fetch an API key from MongoDB."""
+    """Fetch an API key from MongoDB.
+
+    Not cached: a key inserted or rotated via db-init / setApiKey must take
+    effect on the next request, and raw keys shouldn't linger in module state.
+    """
     doc = api_keys_collection().find_one({"provider": provider})
     return doc["key"] if doc else None
 
@@ -119,56 +210,133 @@ def get_client_ip(request: Request) -> str | None:
 # Tag cache — shared across chat, explore, etc.
 # ---------------------------------------------------------------------------
 
-_known_tags: Optional[set[str]] = None
-_known_tags_at: float = 0
+_known_tags: Optional[frozenset[str]] = None
+_known_tags_at: float = 0  # time.monotonic() of the last load
+_known_tags_lock = threading.Lock()
 _TAGS_CACHE_TTL = 300  # 5 minutes
 
+# Minimal fallback — matches the seed tags
+_FALLBACK_TAGS: frozenset[str] = frozenset({
+    "city", "farming", "mining", "tourism", "education",
+    "border", "travel", "national-park",
+})
 
-def get_known_tags() -> set[str]:
+
+def get_known_tags() -> frozenset[str]:
     """
     Fetch the set of valid tag slugs from MongoDB (cached 5 min).
     Falls back to a minimal hardcoded set if the database is unavailable.
+
+    One thread reloads an expired set; concurrent callers get the stale
+    set instead of queueing behind it (or wait, on a cold cache).
     """
     global _known_tags, _known_tags_at
 
-    now = _time.time()
-    if _known_tags is not None and (now - _known_tags_at) < _TAGS_CACHE_TTL:
+    if _known_tags is not None and (_time.monotonic() - _known_tags_at) < _TAGS_CACHE_TTL:
         return _known_tags
 
+    if not _known_tags_lock.acquire(blocking=_known_tags is None):
+        return _known_tags
     try:
-        docs = list(tags_collection().find({}, {"slug": 1, "_id": 0}))
-        _known_tags = {d["slug"] for d in docs if d.get("slug")}
-        _known_tags_at = now
+        # Another thread may have reloaded while we waited for the lock
+        if _known_tags is not None and (_time.monotonic() - _known_tags_at) < _TAGS_CACHE_TTL:
+            return _known_tags
+        docs = tags_collection().find({}, {"slug": 1, "_id": 0})
+        _known_tags = frozenset(d["slug"] for d in docs if d.get("slug"))
+        _known_tags_at = _time.monotonic()
         return _known_tags
     except Exception:
         if _known_tags is not None:
             return _known_tags
-        # Minimal fallback — matches the seed tags
-        return {
-            "city", "farming", "mining", "tourism", "education",
-            "border", "travel", "national-park",
-        }
+        return _FALLBACK_TAGS
+    finally:
+        _known_tags_lock.release()
 
 
-def check_rate_limit(ip: str, action: str, max_requests: int, window_seconds: int) -> dict:
-    """
-    MongoDB-backed rate limiter using atomic findOneAndUpdate.
-    Returns { "allowed": bool, "remaining": int }.
-    """
-    key = f"{action}:{ip}"
+def _increment_rate_limit(key: str, by: int, window_seconds: int) -> tuple[int, float]:
+    """Atomically add ``by`` to a rate-limit window; returns (count, window end as epoch seconds)."""
     now = datetime.now(timezone.utc)
     expires = now + timedelta(seconds=window_seconds)
 
     result = rate_limits_collection().find_one_and_update(
         {"key": key},
         {
-            "$inc": {"count": 1},
+            "$inc": {"count": by},
             "$setOnInsert": {"expiresAt": expires},
         },
         upsert=True,
         return_document=True,
     )
 
-    count = result.get("count", 1) if result else 1
+    count = result.get("count", by) if result else by
+    window_end = (result or {}).get("expiresAt") or expires
+    if window_end.tzinfo is None:  # PyMongo returns naive UTC datetimes
+        window_end = window_end.replace(tzinfo=timezone.utc)
+    return count, window_end.timestamp()
+
+
+def check_rate_limit(ip: str, action: str, max_requests: int, window_seconds: int) -> dict:
+    """
+    MongoDB-backed rate limiter using atomic findOneAndUpdate.
+    Returns { "allowed": bool, "remaining": int }.
+    """
+    count, _ = _increment_rate_limit(f"{action}:{ip}", 1, window_seconds)
+    allowed = count <= max_requests
+    return {"allowed": allowed, "remaining": max(0, max_requests - count)}
+
+
+# Per-instance front for check_rate_limit: key → [window end, last synced
+# count, requests allowed locally since that sync]
+_local_rate: dict[str, list] = {}
+_local_rate_lock = threading.Lock()
+_LOCAL_RATE_MAX_KEYS = 10_000
+RATE_LIMIT_SYNC_EVERY = 5
+
+
+def check_rate_limit_local(
+    ip: str,
+    action: str,
+    max_requests: int,
+    window_seconds: int,
+    sync_every: int = RATE_LIMIT_SYNC_EVERY,
+) -> dict:
+    """
+    check_rate_limit with MongoDB written once every ``sync_every`` requests.
+
+    The first request in a window syncs to learn the shared count and window
+    end; after that the instance counts locally and flushes its batch with a
+    single $inc. Requests already over the known count are rejected without
+    a round-trip. Across instances the limit can be overshot by at most
+    ``sync_every - 1`` requests per instance per window.
+    """
+    key = f"{action}:{ip}"
+    now = _time.time()
+    with _local_rate_lock:
+        bucket = _local_rate.get(key)
+        if bucket is not None and now < bucket[0]:
+            used = bucket[1] + bucket[2] + 1
+            if used > max_requests:
+                return {"allowed": False, "remaining": 0}
+            if bucket[2] + 1 < sync_every:
+                bucket[2] += 1
+                return {"allowed": True, "remaining": max_requests - used}
+            # This request flushes the batch, itself included
+            by = bucket[2] + 1
+            bucket[2] = 0
+        else:
+            by = 1
+
+    count, window_end = _increment_rate_limit(key, by, window_seconds)
+
+    with _local_rate_lock:
+        bucket = _local_rate.get(key)
+        if bucket is not None and bucket[0] == window_end:
+            bucket[1] = max(bucket[1], count)
+        else:
+            if len(_local_rate) >= _LOCAL_RATE_MAX_KEYS:
+                for k in [k for k, b in _local_rate.items() if b[0] <= now]:
+                    del _local_rate[k]
+            _local_rate[key] = [window_end, count, 0]
+
     allowed = count <= max_requests
     return {"allowed": allowed, "remaining": max(0, max_requests - count)}
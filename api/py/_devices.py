@@ -2,19 +2,21 @@
 
 from __future__ import annotations
 
+import asyncio
 import re
+import threading
 import uuid
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Annotated, Literal, Optional
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field, StringConstraints
 from pymongo.errors import DuplicateKeyError
 
 from ._db import device_profiles_collection
 
-router = APIRouter()
-
 # ---------------------------------------------------------------------------
 # Models
 # ---------------------------------------------------------------------------
@@ -24,12 +26,18 @@ MAX_ACTIVITIES = 30
 MAX_SAVED_LOCATIONS = 10
 SLUG_RE = re.compile(r"^[a-z0-9-]{1,80}$")
 
+# Constraints live on the models so pydantic-core checks the whole body in
+# one pass while parsing, instead of a chain of Python validators afterwards.
+_Theme = Literal["light", "dark", "system"]
+_Slug = Annotated[str, StringConstraints(pattern=SLUG_RE.pattern)]
+_SlugOrEmpty = Annotated[str, StringConstraints(pattern=r"^[a-z0-9-]{0,80}$")]
+
 
 class Preferences(BaseModel):
-    theme: str = "system"
-    selectedLocation: str = ""
-    savedLocations: list[str] = Field(default_factory=list)
-    selectedActivities: list[str] = Field(default_factory=list)
+    theme: _Theme = "system"
+    selectedLocation: _SlugOrEmpty = ""
+    savedLocations: list[_Slug] = Field(default_factory=list, max_length=MAX_SAVED_LOCATIONS)
+    selectedActivities: list[str] = Field(default_factory=list, max_length=MAX_ACTIVITIES)
     hasOnboarded: bool = False
 
 
@@ -39,13 +47,20 @@ class CreateDeviceRequest(BaseModel):
 
 
 class UpdatePreferencesRequest(BaseModel):
-    theme: Optional[str] = None
-    selectedLocation: Optional[str] = None
-    savedLocations: Optional[list[str]] = None
-    selectedActivities: Optional[list[str]] = None
+    theme: Optional[_Theme] = None
+    selectedLocation: Optional[_SlugOrEmpty] = None
+    savedLocations: Optional[list[_Slug]] = Field(default=None, max_length=MAX_SAVED_LOCATIONS)
+    selectedActivities: Optional[list[str]] = Field(default=None, max_length=MAX_ACTIVITIES)
     hasOnboarded: Optional[bool] = None
 
 
+# Responses never include _id — skip decoding the ObjectId on every read
+_PROFILE_PROJ = {"_id": 0}
+
+# PATCH field → dotted MongoDB path, built once
+_UPDATE_KEYS = {field: f"preferences.{field}" for field in UpdatePreferencesRequest.model_fields}
+
+
 class DeviceProfileResponse(BaseModel):
     deviceId: str
     preferences: Preferences
@@ -54,70 +69,85 @@ class DeviceProfileResponse(BaseModel):
 
 
 # ---------------------------------------------------------------------------
-# Helpers
+# Validation errors
 # ---------------------------------------------------------------------------
 
+_TOO_MANY = {
+    "savedLocations": f"Too many saved locations (max {MAX_SAVED_LOCATIONS})",
+    "selectedActivities": f"Too many activities (max {MAX_ACTIVITIES})",
+}
 
-def _validate_theme(theme: str) -> str:
-    if theme not in VALID_THEMES:
-        raise HTTPException(status_code=400, detail=f"Invalid theme: {theme}")
-    return theme
 
+def _validation_detail(exc: RequestValidationError) -> str:
+    """Describe the first validation error the way the client displays it."""
+    err = exc.errors()[0]
+    field = next((p for p in reversed(err["loc"]) if isinstance(p, str)), "")
+    if err["type"] == "too_long" and field in _TOO_MANY:
+        return _TOO_MANY[field]
+    if field == "theme":
+        return f"Invalid theme: {err.get('input')}"
+    if field in ("selectedLocation", "savedLocations"):
+        return f"Invalid location slug: {err.get('input')}"
+    return err["msg"]
 
-def _validate_slug(slug: str) -> str:
-    if slug and not SLUG_RE.match(slug):
-        raise HTTPException(status_code=400, detail=f"Invalid location slug: {slug}")
-    return slug
 
+class _BadRequestRoute(APIRoute):
+    """Report body validation failures as 400 with a string detail.
 
-def _validate_activities(activities: list[str]) -> list[str]:
-    if len(activities) > MAX_ACTIVITIES:
-        raise HTTPException(status_code=400, detail=f"Too many activities (max {MAX_ACTIVITIES})")
-    return activities
+    The device sync client surfaces ``detail`` as its error message, so keep
+    the plain-string 400s rather than FastAPI's default 422 error list.
+    """
 
+    def get_route_handler(self):
+        handler = super().get_route_handler()
 
-def _validate_saved_locations(locations: list[str]) -> list[str]:
-    """Validate saved locations — format and cap only.
+        async def _handler(request: Request):
+            try:
+                return await handler(request)
+            except RequestValidationError as exc:
+                raise HTTPException(status_code=400, detail=_validation_detail(exc))
 
-    We intentionally skip a DB existence check here because this runs on
-    every preference sync (PATCH, debounced 1.5s). Adding a DB round-trip
-    per sync would be expensive. Invalid slugs are handled gracefully on
-    the client — SavedLocationsList falls back to title-cased slug display
-    when a location isn't found in the DB.
-    """
-    if len(locations) > MAX_SAVED_LOCATIONS:
-        raise HTTPException(status_code=400, detail=f"Too many saved locations (max {MAX_SAVED_LOCATIONS})")
-    for slug in locations:
-        if not SLUG_RE.match(slug):
-            raise HTTPException(status_code=400, detail=f"Invalid location slug: {slug}")
-    return locations
+        return _handler
+
+
+router = APIRouter(route_class=_BadRequestRoute)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
 
 
 def _doc_to_response(doc: dict) -> DeviceProfileResponse:
-    prefs = doc.get("preferences", {})
-    return DeviceProfileResponse(
+    # Stored docs were written from a validated Preferences.model_dump(), so
+    # build the response without a second validation pass. That also keeps a
+    # legacy out-of-range value from turning a read into a 500. Missing fields
+    # take the model defaults; older profiles default to Harare.
+    prefs = doc.get("preferences") or {}
+    created = doc.get("createdAt") or datetime.now(timezone.utc)
+    updated = doc.get("updatedAt") or created
+    return DeviceProfileResponse.model_construct(
         deviceId=doc["deviceId"],
-        preferences=Preferences(
-            theme=prefs.get("theme", "system"),
-            selectedLocation=prefs.get("selectedLocation", "harare"),
-            savedLocations=prefs.get("savedLocations", []),
-            selectedActivities=prefs.get("selectedActivities", []),
-            hasOnboarded=prefs.get("hasOnboarded", False),
-        ),
-        createdAt=doc.get("createdAt", datetime.now(timezone.utc)).isoformat(),
-        updatedAt=doc.get("updatedAt", datetime.now(timezone.utc)).isoformat(),
+        preferences=Preferences.model_construct(**{"selectedLocation": "harare", **prefs}),
+        createdAt=created.isoformat(),
+        updatedAt=updated.isoformat(),
     )
 
 
 _indexes_ensured = False
+_index_lock = threading.Lock()
 
 
 def _ensure_indexes():
     global _indexes_ensured
     if _indexes_ensured:
         return
-    device_profiles_collection().create_index("deviceId", unique=True)
-    _indexes_ensured = True
+    # Concurrent cold-start requests would otherwise each send create_index
+    with _index_lock:
+        if _indexes_ensured:
+            return
+        device_profiles_collection().create_index("deviceId", unique=True, background=True)
+        _indexes_ensured = True
 
 
 # ---------------------------------------------------------------------------
@@ -125,14 +155,25 @@ def _ensure_indexes():
 # ---------------------------------------------------------------------------
 
 
+# PyMongo is synchronous — each handler runs its Mongo round trip in a worker
+# thread so a slow query doesn't stall every other request on the instance.
+
+
+def _insert_profile(doc: dict) -> dict | None:
+    """Insert a new profile; on a duplicate id return the stored one (or None)."""
+    _ensure_indexes()
+    try:
+        device_profiles_collection().insert_one(doc)
+    except DuplicateKeyError:
+        return device_profiles_collection().find_one({"deviceId": doc["deviceId"]}, _PROFILE_PROJ)
+    return doc
+
+
 @router.post("/api/py/devices", status_code=201)
 async def create_device(body: CreateDeviceRequest):
-    _ensure_indexes()
+    # Keep the dashed UUID v4 form: the RxDB replication client validates
+    # deviceId against it before building /devices/{id} URLs
     device_id = body.deviceId or str(uuid.uuid4())
-    _validate_theme(body.preferences.theme)
-    _validate_slug(body.preferences.selectedLocation)
-    _validate_saved_locations(body.preferences.savedLocations)
-    _validate_activities(body.preferences.selectedActivities)
 
     now = datetime.now(timezone.utc)
     doc = {
@@ -142,20 +183,17 @@ async def create_device(body: CreateDeviceRequest):
         "updatedAt": now,
     }
 
-    try:
-        device_profiles_collection().insert_one(doc)
-    except DuplicateKeyError:
-        existing = device_profiles_collection().find_one({"deviceId": device_id})
-        if existing:
-            return _doc_to_response(existing)
+    stored = await asyncio.to_thread(_insert_profile, doc)
+    if not stored:
         raise HTTPException(status_code=409, detail="Device profile already exists")
-
-    return _doc_to_response(doc)
+    return _doc_to_response(stored)
 
 
 @router.get("/api/py/devices/{device_id}")
 async def get_device(device_id: str):
-    doc = device_profiles_collection().find_one({"deviceId": device_id})
+    doc = await asyncio.to_thread(
+        device_profiles_collection().find_one, {"deviceId": device_id}, _PROFILE_PROJ,
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Device profile not found")
     return _doc_to_response(doc)
@@ -167,30 +205,20 @@ async def update_preferences(device_id: str, body: UpdatePreferencesRequest):
     # whichever syncs last determines the server value for fields like
     # selectedActivities (the entire array is replaced, not merged).
     # A CRDT or per-field timestamp merge is a future enhancement.
-    updates: dict = {}
-    if body.theme is not None:
-        _validate_theme(body.theme)
-        updates["preferences.theme"] = body.theme
-    if body.selectedLocation is not None:
-        _validate_slug(body.selectedLocation)
-        updates["preferences.selectedLocation"] = body.selectedLocation
-    if body.savedLocations is not None:
-        _validate_saved_locations(body.savedLocations)
-        updates["preferences.savedLocations"] = body.savedLocations
-    if body.selectedActivities is not None:
-        _validate_activities(body.selectedActivities)
-        updates["preferences.selectedActivities"] = body.selectedActivities
-    if body.hasOnboarded is not None:
-        updates["preferences.hasOnboarded"] = body.hasOnboarded
+    # Explicit nulls are dropped too — they mean "leave as is", not "clear"
+    fields = body.model_dump(exclude_unset=True, exclude_none=True)
+    updates = {_UPDATE_KEYS[field]: value for field, value in fields.items()}
 
     if not updates:
         raise HTTPException(status_code=400, detail="No fields to update")
 
     updates["updatedAt"] = datetime.now(timezone.utc)
 
-    result = device_profiles_collection().find_one_and_update(
+    result = await asyncio.to_thread(
+        device_profiles_collection().find_one_and_update,
         {"deviceId": device_id},
         {"$set": updates},
+        projection=_PROFILE_PROJ,
         return_document=True,
     )
 
@@ -10,25 +10,26 @@ System prompt is fetched from the database (system:explore_search).
 
 from __future__ import annotations
 
-import os
+import asyncio
 import re
 import time
 from datetime import datetime, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
 
 import anthropic
+import orjson
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from ._db import (
-    check_rate_limit,
+    check_rate_limit_local,
     get_client_ip,
-    get_api_key,
     locations_collection,
     weather_cache_collection,
-    ai_prompts_collection,
 )
 from ._circuit_breaker import anthropic_breaker, CircuitOpenError
+from ._anthropic import get_async_client as _get_client
+from ._ai_prompts_cache import prompt_cache
 
 router = APIRouter()
 
@@ -41,59 +42,41 @@ RATE_LIMIT_MAX = 15
 RATE_LIMIT_WINDOW = 3600  # 1 hour
 MAX_QUERY_LEN = 500
 MAX_TOOL_ITERATIONS = 3
+MAX_CONCURRENT_TOOLS = 8  # cap on Mongo reads in flight from one turn
 
 # ---------------------------------------------------------------------------
 # Module-level caches
 # ---------------------------------------------------------------------------
 
-_client: Optional[anthropic.Anthropic] = None
-_client_key_last: Optional[str] = None
-
-# Prompt cache (5-min TTL)
-_prompt_cache: dict[str, dict] = {}
-_prompt_cache_at: float = 0
-_PROMPT_CACHE_TTL = 300
-
 # Location context cache (5-min TTL)
 _location_context: Optional[list[dict]] = None
 _location_context_at: float = 0
 CONTEXT_TTL = 300
 
+# Queries up to this length are answered from the substring index; longer
+# ones (rarer than any location name) fall back to a scan
+_SUBSTRING_MAX = 32
 
-def _get_client() -> anthropic.Anthropic:
-    global _client, _client_key_last
 
-    key = os.environ.get("ANTHROPIC_API_KEY")
-    if not key:
-        key = get_api_key("anthropic")
-    if not key:
-        raise HTTPException(status_code=503, detail="AI service unavailable")
+class _SearchIndex(NamedTuple):
+    rows: list[dict]  # search_locations result rows, catalog order
+    fields: list[tuple[str, str, str]]  # lowercased (name, province, joined tags)
+    place: dict[str, list[int]]  # name/province substring -> row positions
+    tag_text: dict[str, list[int]]  # joined-tags substring -> row positions
+    tags: dict[str, list[int]]  # exact tag -> row positions
 
-    if _client is None or _client_key_last != key:
-        _client = anthropic.Anthropic(api_key=key)
-        _client_key_last = key
 
-    return _client
+# System prompt split around {query}, keyed by (template, context load time)
+_search_prompt_parts: dict[tuple[str, float], tuple[str, ...]] = {}
 
+# Substring index over the current location context (see _get_search_index)
+_search_index_src: Optional[list[dict]] = None
+_search_index: Optional[_SearchIndex] = None
 
-def _get_search_prompt() -> dict | None:
-    """Fetch the explore search system prompt from MongoDB."""
-    global _prompt_cache, _prompt_cache_at
-
-    now = time.time()
-    if _prompt_cache and (now - _prompt_cache_at) < _PROMPT_CACHE_TTL:
-        return _prompt_cache.get("system:explore_search")
 
-    try:
-        docs = list(
-            ai_prompts_collection()
-            .find({"active": True}, {"_id": 0, "updatedAt": 0})
-        )
-        _prompt_cache = {d["promptKey"]: d for d in docs}
-        _prompt_cache_at = now
-        return _prompt_cache.get("system:explore_search")
-    except Exception:
-        return _prompt_cache.get("system:explore_search")
+def _get_search_prompt() -> dict | None:
+    """Fetch the explore search system prompt from the shared prompt cache."""
+    return prompt_cache.get("system:explore_search")
 
 
 _FALLBACK_SYSTEM_PROMPT = """You are Shamwari Weather, helping users find locations based on weather conditions.
@@ -110,15 +93,32 @@ Rules:
 - If no locations match, suggest alternatives"""
 
 
-def _build_search_system_prompt(query: str) -> str:
-    """Build the search system prompt from database template."""
+def _get_search_prompt_parts() -> tuple[str, ...]:
+    """Static prompt chunks around {query}, rebuilt when the template or locations change."""
+    locations = _get_location_context()
     prompt_doc = _get_search_prompt()
     template = (
         prompt_doc["template"]
         if prompt_doc and prompt_doc.get("template")
         else _FALLBACK_SYSTEM_PROMPT
     )
-    return template.replace("{query}", query[:200])
+
+    key = (template, _location_context_at)
+    parts = _search_prompt_parts.get(key)
+    if parts is not None:
+        return parts
+
+    loc_list = ", ".join(f"{l['name']} ({l['slug']})" for l in locations[:50])
+    parts = tuple(f"{template}\n\nAvailable locations include: {loc_list}".split("{query}"))
+
+    _search_prompt_parts.clear()
+    _search_prompt_parts[key] = parts
+    return parts
+
+
+def _build_search_system_prompt(query: str) -> str:
+    """Build the search system prompt from database template and location context."""
+    return query[:200].join(_get_search_prompt_parts())
 
 
 def _get_location_context() -> list[dict]:
@@ -180,79 +180,136 @@ TOOLS = [
     },
 ]
 
+# Cache breakpoint on the last tool caches the whole tools prefix across requests
+_CACHED_TOOLS = [*TOOLS[:-1], {**TOOLS[-1], "cache_control": {"type": "ephemeral"}}]
+
 
 # ---------------------------------------------------------------------------
 # Tool execution
 # ---------------------------------------------------------------------------
 
 
+def _substrings(text: str) -> set[str]:
+    """Every substring of text up to _SUBSTRING_MAX characters."""
+    n = len(text)
+    return {text[i:j] for i in range(n) for j in range(i + 1, min(n, i + _SUBSTRING_MAX) + 1)}
+
+
+def _get_search_index() -> _SearchIndex:
+    """Inverted substring index over the location context.
+
+    Rebuilt only when _get_location_context hands back a different list,
+    i.e. once per context refresh rather than once per query. Postings are
+    row positions in catalog order, so a lookup answers the same
+    "q in name" question as a scan without visiting every location.
+    """
+    global _search_index_src, _search_index
+
+    locations = _get_location_context()
+    if _search_index is not None and locations is _search_index_src:
+        return _search_index
+
+    index = _SearchIndex([], [], {}, {}, {})
+    for pos, loc in enumerate(locations):
+        tags = loc.get("tags", [])
+        name = loc.get("name", "").lower()
+        province = loc.get("province", "").lower()
+        tag_text = " ".join(tags).lower()
+
+        index.rows.append({
+            "slug": loc["slug"],
+            "name": loc["name"],
+            "province": loc.get("province", ""),
+            "country": loc.get("country", "ZW"),
+            "tags": tags,
+        })
+        index.fields.append((name, province, tag_text))
+        for sub in _substrings(name) | _substrings(province):
+            index.place.setdefault(sub, []).append(pos)
+        for sub in _substrings(tag_text):
+            index.tag_text.setdefault(sub, []).append(pos)
+        for tag in set(tags):
+            index.tags.setdefault(tag, []).append(pos)
+
+    _search_index, _search_index_src = index, locations
+    return index
+
+
+def _match_place(index: _SearchIndex, q: str) -> list[int]:
+    """Positions whose lowercased name or province contains q."""
+    if len(q) <= _SUBSTRING_MAX:
+        return index.place.get(q, [])
+    return [i for i, (name, province, _) in enumerate(index.fields) if q in name or q in province]
+
+
+def _match_tag_text(index: _SearchIndex, q: str) -> list[int]:
+    """Positions whose space-joined, lowercased tags contain q."""
+    if len(q) <= _SUBSTRING_MAX:
+        return index.tag_text.get(q, [])
+    return [i for i, (_, _, tag_text) in enumerate(index.fields) if q in tag_text]
+
+
 def _exec_search(args: dict) -> str:
     """Execute search_locations tool."""
-    import json
-
     query = args.get("query", "")
     tag = args.get("tag", "")
-    locations = _get_location_context()
 
-    results = []
     q = query.lower().strip()
     t = tag.lower().strip() if tag else ""
+    index = _get_search_index()
 
-    for loc in locations:
-        name = loc.get("name", "").lower()
-        province = loc.get("province", "").lower()
-        tags = loc.get("tags", [])
+    if not q and not t:
+        return orjson.dumps(index.rows[:20]).decode()
+
+    hits = set(_match_place(index, q)) if q else set()
+    if t:
+        hits.update(index.tags.get(t, ()))
+    results = [index.rows[i] for i in sorted(hits)[:20]]
+
+    return orjson.dumps(results).decode()
 
-        match = False
-        if q and (q in name or q in province):
-            match = True
-        if t and t in tags:
-            match = True
-        if not q and not t:
-            match = True
 
-        if match:
-            results.append({
-                "slug": loc["slug"],
-                "name": loc["name"],
-                "province": loc.get("province", ""),
-                "country": loc.get("country", "ZW"),
-                "tags": tags,
-            })
+_WEATHER_PROJ = {"_id": 0, "locationSlug": 1, "data": 1, "provider": 1}
 
-    return json.dumps(results[:20])
+
+def _weather_result(slug: str, cached: dict | None) -> str:
+    """Format one weather_cache document as a get_weather tool result."""
+    if cached and cached.get("data"):
+        current = cached["data"].get("current", {})
+        return orjson.dumps({
+            "slug": slug,
+            "temperature": current.get("temperature_2m"),
+            "humidity": current.get("relative_humidity_2m"),
+            "windSpeed": current.get("wind_speed_10m"),
+            "weatherCode": current.get("weather_code"),
+            "precipitation": current.get("precipitation"),
+            "uvIndex": current.get("uv_index"),
+            "cloudCover": current.get("cloud_cover"),
+            "provider": cached.get("provider", "unknown"),
+        }).decode()
+    return orjson.dumps({"error": f"No weather data for {slug}"}).decode()
 
 
 def _exec_weather(args: dict) -> str:
     """Execute get_weather tool."""
-    import json
-
     slug = args.get("slug", "")
-    if not SLUG_RE.match(slug):
-        return json.dumps({"error": "Invalid location slug"})
+    if not SLUG_RE.fullmatch(slug):
+        return orjson.dumps({"error": "Invalid location slug"}).decode()
 
     try:
-        cached = weather_cache_collection().find_one(
-            {"locationSlug": slug},
-            {"_id": 0, "data": 1, "provider": 1},
-        )
-        if cached and cached.get("data"):
-            data = cached["data"]
-            current = data.get("current", {})
-            return json.dumps({
-                "slug": slug,
-                "temperature": current.get("temperature_2m"),
-                "humidity": current.get("relative_humidity_2m"),
-                "windSpeed": current.get("wind_speed_10m"),
-                "weatherCode": current.get("weather_code"),
-                "precipitation": current.get("precipitation"),
-                "uvIndex": current.get("uv_index"),
-                "cloudCover": current.get("cloud_cover"),
-                "provider": cached.get("provider", "unknown"),
-            })
-        return json.dumps({"error": f"No weather data for {slug}"})
+        cached = weather_cache_collection().find_one({"locationSlug": slug}, _WEATHER_PROJ)
+        return _weather_result(slug, cached)
     except Exception:
-        return json.dumps({"error": "Weather data unavailable"})
+        return orjson.dumps({"error": "Weather data unavailable"}).decode()
+
+
+def _prefetch_weather(slugs: list[str]) -> dict[str, str]:
+    """get_weather results for several slugs from one $in query."""
+    docs = {
+        d["locationSlug"]: d
+        for d in weather_cache_collection().find({"locationSlug": {"$in": slugs}}, _WEATHER_PROJ)
+    }
+    return {slug: _weather_result(slug, docs.get(slug)) for slug in slugs}
 
 
 def _exec_tool(name: str, args: dict) -> str:
@@ -264,6 +321,40 @@ def _exec_tool(name: str, args: dict) -> str:
     return '{"error": "Unknown tool"}'
 
 
+async def _exec_tools(tool_uses: list) -> list[str]:
+    """Run one turn's tool calls concurrently, in order, off the event loop.
+
+    Same-turn get_weather calls are coalesced into one $in query. A failing
+    tool yields an error result instead of discarding its siblings' output.
+    """
+    weather: dict[str, str] = {}
+    slugs = list(dict.fromkeys(
+        slug for t in tool_uses
+        if t.name == "get_weather"
+        and isinstance(slug := t.input.get("slug"), str) and SLUG_RE.fullmatch(slug)
+    ))
+    if len(slugs) > 1:
+        try:
+            weather = await asyncio.to_thread(_prefetch_weather, slugs)
+        except Exception:
+            pass  # each call falls back to its own lookup
+
+    slots = asyncio.Semaphore(MAX_CONCURRENT_TOOLS)
+
+    async def _run(tool_use) -> str:
+        if tool_use.name == "get_weather" and tool_use.input.get("slug") in weather:
+            return weather[tool_use.input["slug"]]
+        async with slots:
+            return await asyncio.to_thread(_exec_tool, tool_use.name, tool_use.input)
+
+    outputs = await asyncio.gather(*(_run(t) for t in tool_uses), return_exceptions=True)
+    return [
+        out if isinstance(out, str)
+        else orjson.dumps({"error": f"Tool {t.name} failed"}).decode()
+        for t, out in zip(tool_uses, outputs)
+    ]
+
+
 # ---------------------------------------------------------------------------
 # Text search fallback (no AI)
 # ---------------------------------------------------------------------------
@@ -271,44 +362,37 @@ def _exec_tool(name: str, args: dict) -> str:
 
 def _text_search_fallback(query: str) -> dict:
     """Simple text search when AI is unavailable."""
-    locations = _get_location_context()
     q = query.lower().strip()
 
-    results = []
-    for loc in locations:
-        name = loc.get("name", "").lower()
-        province = loc.get("province", "").lower()
-        tags = loc.get("tags", [])
-
-        if q in name or q in province or q in " ".join(tags):
-            # Try to get cached weather
-            weather_info = {}
-            try:
-                cached = weather_cache_collection().find_one(
-                    {"locationSlug": loc["slug"]},
-                    {"_id": 0, "data.current.temperature_2m": 1, "data.current.weather_code": 1},
-                )
-                if cached and cached.get("data", {}).get("current"):
-                    curr = cached["data"]["current"]
-                    weather_info = {
+    index = _get_search_index()
+    if q:
+        hits = set(_match_place(index, q)).union(_match_tag_text(index, q))
+        matches = [index.rows[i] for i in sorted(hits)]
+    else:
+        matches = index.rows
+
+    # Cached weather for the returned matches only, in one $in query
+    weather_by_slug: dict[str, dict] = {}
+    if matches:
+        try:
+            for cached in weather_cache_collection().find(
+                {"locationSlug": {"$in": [loc["slug"] for loc in matches[:10]]}},
+                {"_id": 0, "locationSlug": 1, "data.current.temperature_2m": 1, "data.current.weather_code": 1},
+            ):
+                curr = cached.get("data", {}).get("current")
+                if curr:
+                    weather_by_slug[cached["locationSlug"]] = {
                         "temperature": curr.get("temperature_2m"),
                         "weatherCode": curr.get("weather_code"),
                     }
-            except Exception:
-                pass
-
-            results.append({
-                "slug": loc["slug"],
-                "name": loc["name"],
-                "province": loc.get("province", ""),
-                "country": loc.get("country", "ZW"),
-                "tags": tags,
-                **weather_info,
-            })
+        except Exception:
+            pass
+
+    results = [{**loc, **weather_by_slug.get(loc["slug"], {})} for loc in matches[:10]]
 
     return {
-        "locations": results[:10],
-        "summary": f"Found {len(results)} locations matching \"{query}\"." if results else f"No locations found matching \"{query}\". Try a different search term.",
+        "locations": results,
+        "summary": f"Found {len(matches)} locations matching \"{query}\"." if results else f"No locations found matching \"{query}\". Try a different search term.",
     }
 
 
@@ -343,42 +427,46 @@ async def explore_search(body: ExploreSearchRequest, request: Request):
     if not ip:
         raise HTTPException(status_code=400, detail="Could not determine IP")
 
-    rate = check_rate_limit(ip, "explore_search", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
+    # The local counter still syncs with MongoDB periodically — keep it off the event loop
+    rate = await asyncio.to_thread(check_rate_limit_local, ip, "explore_search", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW)
     if not rate["allowed"]:
         raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.")
 
     # Circuit breaker check — fall back to text search if Anthropic is down
     if not anthropic_breaker.is_allowed:
-        return _text_search_fallback(query)
-
-    # Try AI-powered search
-    try:
-        client = _get_client()
-    except HTTPException:
-        return _text_search_fallback(query)
-
-    # Build location list for system prompt context
-    locations = _get_location_context()
-    loc_list = ", ".join(f"{l['name']} ({l['slug']})" for l in locations[:50])
-
-    system_prompt = _build_search_system_prompt(query)
-    system_prompt += f"\n\nAvailable locations include: {loc_list}"
+        return await asyncio.to_thread(_text_search_fallback, query)
+
+    # Try AI-powered search. Key lookup and prompt/context loads hit MongoDB,
+    # so they run off the event loop alongside each other.
+    client, system_prompt, prompt_doc = await asyncio.gather(
+        asyncio.to_thread(_get_client),
+        asyncio.to_thread(_build_search_system_prompt, query),
+        asyncio.to_thread(_get_search_prompt),
+        return_exceptions=True,
+    )
+    if isinstance(client, BaseException) or isinstance(system_prompt, BaseException):
+        return await asyncio.to_thread(_text_search_fallback, query)
+    if isinstance(prompt_doc, BaseException):
+        prompt_doc = None
 
-    prompt_doc = _get_search_prompt()
     model = (prompt_doc or {}).get("model", "claude-haiku-4-5-20251001")
     max_tokens = (prompt_doc or {}).get("maxTokens", 400)
 
+    # Breakpoint on the system block lets each loop iteration reuse the prefix
+    system_blocks = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
     try:
         messages = [{"role": "user", "content": query}]
-        collected_locations: list[dict] = []
+        # Keyed by slug (insertion-ordered) for O(1) dedup and weather merge
+        collected: dict[str, dict] = {}
 
         # Tool-use loop
         for _ in range(MAX_TOOL_ITERATIONS):
-            response = client.messages.create(
+            response = await client.messages.create(
                 model=model,
                 max_tokens=max_tokens,
-                system=system_prompt,
-                tools=TOOLS,
+                system=system_blocks,
+                tools=_CACHED_TOOLS,
                 messages=messages,
             )
             anthropic_breaker.record_success()
@@ -397,12 +485,12 @@ async def explore_search(body: ExploreSearchRequest, request: Request):
                 # Done — no more tool calls
                 break
 
-            # Execute tools and build results
+            # Tool calls in one turn are independent — run them concurrently
             messages.append({"role": "assistant", "content": response.content})
+            results = await _exec_tools(tool_uses)
             tool_results = []
 
-            for tool_use in tool_uses:
-                result = _exec_tool(tool_use.name, tool_use.input)
+            for tool_use, result in zip(tool_uses, results):
                 tool_results.append({
                     "type": "tool_result",
                     "tool_use_id": tool_use.id,
@@ -411,48 +499,42 @@ async def explore_search(body: ExploreSearchRequest, request: Request):
 
                 # Collect location results for the response
                 if tool_use.name == "search_locations":
-                    import json
                     try:
-                        parsed = json.loads(result)
+                        parsed = orjson.loads(result)
                         if isinstance(parsed, list):
                             for loc in parsed:
-                                if loc.get("slug") and not any(
-                                    cl["slug"] == loc["slug"] for cl in collected_locations
-                                ):
-                                    collected_locations.append(loc)
+                                if loc.get("slug"):
+                                    collected.setdefault(loc["slug"], loc)
                     except Exception:
                         pass
 
                 elif tool_use.name == "get_weather":
-                    import json
                     try:
-                        parsed = json.loads(result)
+                        parsed = orjson.loads(result)
                         slug = parsed.get("slug", "")
-                        if slug and not parsed.get("error"):
+                        cl = collected.get(slug) if not parsed.get("error") else None
+                        if cl is not None:
                             # Merge weather into collected location
-                            for cl in collected_locations:
-                                if cl["slug"] == slug:
-                                    cl["temperature"] = parsed.get("temperature")
-                                    cl["weatherCode"] = parsed.get("weatherCode")
-                                    cl["humidity"] = parsed.get("humidity")
-                                    cl["windSpeed"] = parsed.get("windSpeed")
-                                    break
+                            cl["temperature"] = parsed.get("temperature")
+                            cl["weatherCode"] = parsed.get("weatherCode")
+                            cl["humidity"] = parsed.get("humidity")
+                            cl["windSpeed"] = parsed.get("windSpeed")
                     except Exception:
                         pass
 
             messages.append({"role": "user", "content": tool_results})
 
         return {
-            "locations": collected_locations[:10],
-            "summary": text_content or f"Found {len(collected_locations)} locations matching your search.",
+            "locations": list(collected.values())[:10],
+            "summary": text_content or f"Found {len(collected)} locations matching your search.",
         }
 
     except anthropic.RateLimitError:
         anthropic_breaker.record_failure()
-        return _text_search_fallback(query)
+        return await asyncio.to_thread(_text_search_fallback, query)
     except anthropic.APIError:
         anthropic_breaker.record_failure()
-        return _text_search_fallback(query)
+        return await asyncio.to_thread(_text_search_fallback, query)
     except Exception:
         anthropic_breaker.record_failure()
-        return _text_search_fallback(query)
+        return await asyncio.to_thread(_text_search_fallback, query)
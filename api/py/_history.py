@@ -6,6 +6,7 @@ Returns historical weather recordings for a given location.
 
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timezone, timedelta
 
 from fastapi import APIRouter, HTTPException
@@ -14,14 +15,65 @@ from ._db import get_db, locations_collection
 
 router = APIRouter()
 
+# hourly is the bulk of each record and no history consumer reads it
+_HISTORY_PROJ = {"_id": 0, "hourly": 0}
+
+GRANULARITIES = ("raw", "daily")
+
+
+def _find_history(location: str, cutoff: datetime) -> list[dict]:
+    """Records since cutoff, newest first — served by {locationSlug: 1, recordedAt: -1}.
+
+    recordedAt is ISO-serialized while the cursor is drained, so the
+    records are only walked once.
+    """
+    cursor = (
+        get_db()["weather_history"]
+        .find({"locationSlug": location, "recordedAt": {"$gte": cutoff}}, _HISTORY_PROJ)
+        .sort("recordedAt", -1)
+    )
+    history = []
+    for record in cursor:
+        recorded_at = record.get("recordedAt")
+        if isinstance(recorded_at, datetime):
+            record["recordedAt"] = recorded_at.isoformat()
+        history.append(record)
+    return history
+
+
+def _aggregate_daily_history(location: str, cutoff: datetime) -> list[dict]:
+    """One bucket per UTC day since cutoff, newest first, grouped in MongoDB."""
+    pipeline = [
+        {"$match": {"locationSlug": location, "recordedAt": {"$gte": cutoff}}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$recordedAt", "unit": "day"}},
+            "samples": {"$sum": 1},
+            "avgTemp": {"$avg": "$current.temperature_2m"},
+            "minTemp": {"$min": "$current.temperature_2m"},
+            "maxTemp": {"$max": "$current.temperature_2m"},
+            "avgHumidity": {"$avg": "$current.relative_humidity_2m"},
+            "avgWindSpeed": {"$avg": "$current.wind_speed_10m"},
+            "maxPrecipitation": {"$max": "$current.precipitation"},
+        }},
+        {"$sort": {"_id": -1}},
+    ]
+    buckets = []
+    for bucket in get_db()["weather_history"].aggregate(pipeline):
+        day = bucket.pop("_id")
+        bucket["date"] = day.date().isoformat() if isinstance(day, datetime) else day
+        buckets.append(bucket)
+    return buckets
+
 
 @router.get("/api/py/history")
-async def get_history(location: str, days: int = 30):
+async def get_history(location: str, days: int = 30, granularity: str = "raw"):
     """
-    GET /api/py/history?location=harare&days=30
+    GET /api/py/history?location=harare&days=30[&granularity=daily]
 
     Returns historical weather recordings for a location.
     Data is recorded automatically by the weather endpoint on fresh fetches.
+    With granularity=daily, records are bucketed per day in MongoDB and only
+    the daily aggregates are returned.
     """
     if not location:
         raise HTTPException(status_code=400, detail="Missing location parameter")
@@ -29,9 +81,14 @@ async def get_history(location: str, days: int = 30):
     if days < 1 or days > 365:
         raise HTTPException(status_code=400, detail="days must be between 1 and 365")
 
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail="granularity must be 'raw' or 'daily'")
+
     # Verify location exists
     try:
-        loc = locations_collection().find_one({"slug": location}, {"_id": 0, "slug": 1})
+        loc = await asyncio.to_thread(
+            locations_collection().find_one, {"slug": location}, {"_id": 0, "slug": 1}
+        )
     except Exception:
         raise HTTPException(status_code=503, detail="Location service unavailable")
 
@@ -39,29 +96,14 @@ async def get_history(location: str, days: int = 30):
         raise HTTPException(status_code=404, detail="Unknown location")
 
     try:
-        db = get_db()
         cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-
-        history = list(
-            db["weather_history"]
-            .find(
-                {
-                    "locationSlug": location,
-                    "recordedAt": {"$gte": cutoff},
-                },
-                {"_id": 0},
-            )
-            .sort("recordedAt", -1)
-        )
-
-        # Serialize datetime objects
-        for record in history:
-            if "recordedAt" in record and isinstance(record["recordedAt"], datetime):
-                record["recordedAt"] = record["recordedAt"].isoformat()
+        fetch = _aggregate_daily_history if granularity == "daily" else _find_history
+        history = await asyncio.to_thread(fetch, location, cutoff)
 
         return {
             "location": location,
             "days": days,
+            "granularity": granularity,
             "records": len(history),
             "data": history,
         }
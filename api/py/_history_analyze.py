@@ -11,17 +11,19 @@ System prompt is fetched from the database (system:history_analysis).
 from __future__ import annotations
 
 import hashlib
-import json
 import os
 import time
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 
 import anthropic
+import orjson
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from ._db import (
+    api_key_digest,
+    same_api_key,
     check_rate_limit,
     get_client_ip,
     get_api_key,
@@ -47,7 +49,7 @@ CACHE_TTL = 3600  # 1 hour
 # ---------------------------------------------------------------------------
 
 _client: Optional[anthropic.Anthropic] = None
-_client_key_last: Optional[str] = None
+_client_key_digest: Optional[bytes] = None
 
 # Prompt cache (5-min TTL)
 _prompt_cache: dict[str, dict] = {}
@@ -56,7 +58,7 @@ _PROMPT_CACHE_TTL = 300
 
 
 def _get_client() -> anthropic.Anthropic:
-    global _client, _client_key_last
+    global _client, _client_key_digest
 
     key = os.environ.get("ANTHROPIC_API_KEY")
     if not key:
@@ -64,9 +66,9 @@ def _get_client() -> anthropic.Anthropic:
     if not key:
         raise HTTPException(status_code=503, detail="AI service unavailable")
 
-    if _client is None or _client_key_last != key:
+    if _client is None or not same_api_key(_client_key_digest, key):
         _client = anthropic.Anthropic(api_key=key)
-        _client_key_last = key
+        _client_key_digest = api_key_digest(key)
 
     return _client
 
@@ -345,7 +347,7 @@ async def analyze_history(body: AnalyzeRequest, request: Request):
         db["weather_history"]
         .find(
             {"locationSlug": location_slug, "recordedAt": {"$gte": cutoff}},
-            {"_id": 0},
+            {"_id": 0, "hourly": 0},
         )
         .sort("recordedAt", 1)
     )
@@ -355,10 +357,10 @@ async def analyze_history(body: AnalyzeRequest, request: Request):
 
     # Compute a hash of the data for cache keying
     data_hash = hashlib.md5(
-        json.dumps(
+        orjson.dumps(
             [{"d": r.get("date", ""), "t": r.get("current", {}).get("temperature_2m")} for r in history],
             default=str,
-        ).encode()
+        )
     ).hexdigest()[:12]
 
     # Check cache
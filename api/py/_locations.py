@@ -8,6 +8,8 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
+import unicodedata
 from typing import Optional
 
 import httpx
@@ -20,6 +22,7 @@ from ._db import (
     get_db,
     get_client_ip,
     locations_collection,
+    location_search_fields,
     check_rate_limit,
 )
 
@@ -430,7 +433,6 @@ def _generate_slug(name: str, country: str = "") -> str:
 
     All locations get country-code suffix (e.g., "harare-zw", "nairobi-ke").
     """
-    import unicodedata
     slug = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
     slug = re.sub(r"[^a-z0-9]+", "-", slug.lower()).strip("-")
     if country:
@@ -440,7 +442,6 @@ def _generate_slug(name: str, country: str = "") -> str:
 
 def _generate_province_slug(province: str, country: str) -> str:
     """Generate a slug for a province."""
-    import unicodedata
     slug = unicodedata.normalize("NFKD", province).encode("ascii", "ignore").decode("ascii")
     slug = re.sub(r"[^a-z0-9]+", "-", slug.lower()).strip("-")
     return f"{slug}-{country.lower()}"[:80]
@@ -680,6 +681,7 @@ async def geo_lookup(
                 "provinceSlug": province_slug,
                 "geo": {"type": "Point", "coordinates": [geocoded["lon"], geocoded["lat"]]},
                 "nominatimAddress": geocoded.get("nominatimAddress", {}),
+                **location_search_fields(geocoded["name"], province),
             }
             locations_collection().insert_one(new_loc)
             new_loc.pop("_id", None)
@@ -725,8 +727,6 @@ def _enrich_location_with_ai(country_code: str, lat: float, lon: float) -> None:
     call (~5-15s). If AI is unavailable, season data will be resolved on
     the next weather request via _get_season().
     """
-    import threading
-
     logger.info("Starting AI location enrichment for %s (%.1f, %.1f)", country_code, lat, lon)
 
     def _run() -> None:
@@ -855,6 +855,7 @@ async def add_location(request: Request):
             "provinceSlug": province_slug,
             "geo": {"type": "Point", "coordinates": [geocoded["lon"], geocoded["lat"]]},
             "nominatimAddress": geocoded.get("nominatimAddress", {}),
+            **location_search_fields(geocoded["name"], province),
         }
         locations_collection().insert_one(new_loc)
         new_loc.pop("_id", None)
@@ -23,6 +23,8 @@ from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, Field
 
 from ._db import (
+    api_key_digest,
+    same_api_key,
     check_rate_limit,
     get_client_ip,
     get_api_key,
@@ -61,7 +63,7 @@ SEVERITY_TTL = {
 # ---------------------------------------------------------------------------
 
 _client: Optional[anthropic.Anthropic] = None
-_client_key_last: Optional[str] = None
+_client_key_digest: Optional[bytes] = None
 
 # Prompt cache (5-min TTL)
 _prompt_cache: dict[str, dict] = {}
@@ -70,7 +72,7 @@ _PROMPT_CACHE_TTL = 300
 
 
 def _get_client() -> Optional[anthropic.Anthropic]:
-    global _client, _client_key_last
+    global _client, _client_key_digest
 
     key = os.environ.get("ANTHROPIC_API_KEY")
     if not key:
@@ -78,9 +80,9 @@ def _get_client() -> Optional[anthropic.Anthropic]:
     if not key:
         return None
 
-    if _client is None or _client_key_last != key:
+    if _client is None or not same_api_key(_client_key_digest, key):
         _client = anthropic.Anthropic(api_key=key)
-        _client_key_last = key
+        _client_key_digest = api_key_digest(key)
 
     return _client
 
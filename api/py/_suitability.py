@@ -32,7 +32,7 @@ async def get_suitability(key: str | None = None):
 
     try:
         if key:
-            if not KEY_RE.match(key):
+            if not KEY_RE.fullmatch(key):
                 raise HTTPException(status_code=400, detail="Invalid key format")
 
             rule = suitability_rules_collection().find_one(
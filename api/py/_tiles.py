@@ -70,7 +70,7 @@ async def proxy_map_tile(
     if x < 0 or x > max_tile or y < 0 or y > max_tile:
         raise HTTPException(status_code=400, detail="Tile coordinates out of range")
 
-    if not TIMESTAMP_RE.match(timestamp):
+    if not TIMESTAMP_RE.fullmatch(timestamp):
         raise HTTPException(status_code=400, detail="Invalid timestamp")
 
     try:
@@ -18,6 +18,7 @@ from fastapi.responses import JSONResponse
 
 from ._db import (
     get_api_key,
+    get_db,
     locations_collection,
     weather_cache_collection,
 )
@@ -371,8 +372,6 @@ def _set_cached_weather(slug: str, lat: float, lon: float, data: dict, provider:
 
 def _record_weather_history(slug: str, data: dict):
     """Record weather data point in history collection."""
-    from ._db import get_db
-
     current = data.get("current", {})
     daily = data.get("daily", {})
 
@@ -11,10 +11,11 @@ routed here via vercel.json rewrites.
 from __future__ import annotations
 
 import os
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pymongo.errors import ConnectionFailure
 
 from ._devices import router as devices_router
@@ -22,7 +23,7 @@ from ._chat import router as chat_router
 from ._suitability import router as suitability_router
 from ._embeddings import router as embeddings_router
 from ._weather import router as weather_router
-from ._ai import router as ai_router
+from ._ai import router as ai_router, warm_caches
 from ._locations import router as locations_router
 from ._data import router as data_router
 from ._history import router as history_router
@@ -33,7 +34,9 @@ from ._ai_followup import router as ai_followup_router
 from ._history_analyze import router as history_analyze_router
 from ._explore_search import router as explore_search_router
 from ._reports import router as reports_router
-from ._db import get_db
+from ._anthropic import close_async_client
+from ._circuit_breaker import start_shared_sync, stop_shared_sync
+from ._db import get_api_key, get_db, warm_db
 
 # ---------------------------------------------------------------------------
 # App setup
@@ -47,6 +50,19 @@ _hide_docs = (
     or os.environ.get("HIDE_API_DOCS", "").lower() in ("true", "1", "yes")
 )
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Establish the MongoDB pool and fill the AI lookup caches before the
+    # first request arrives
+    warm_db()
+    warm_caches()
+    start_shared_sync()
+    yield
+    stop_shared_sync()
+    await close_async_client()
+
+
 app = FastAPI(
     title="mukoko weather API",
     version="3.0.0",
@@ -54,6 +70,9 @@ app = FastAPI(
     docs_url=None if _hide_docs else "/api/py/docs",
     redoc_url=None if _hide_docs else "/api/py/redoc",
     openapi_url=None if _hide_docs else "/api/py/openapi.json",
+    lifespan=lifespan,
+    # orjson renders handler return values several times faster than stdlib json
+    default_response_class=ORJSONResponse,
 )
 
 _ALLOWED_ORIGINS = [
@@ -98,8 +117,6 @@ app.include_router(reports_router)
 @app.get("/api/py/health")
 async def health():
     """Health check — verifies MongoDB + Anthropic availability."""
-    import os
-
     mongo_ok = False
     anthropic_ok = False
 
@@ -112,7 +129,6 @@ async def health():
     anthropic_key = os.environ.get("ANTHROPIC_API_KEY")
     if not anthropic_key:
         # Try MongoDB-stored key
-        from ._db import get_api_key
         anthropic_key = get_api_key("anthropic") if mongo_ok else None
 
     anthropic_ok = bool(anthropic_key)
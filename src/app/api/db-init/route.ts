@@ -1,5 +1,5 @@
 import { NextResponse } from "next/server";
-import { ensureIndexes, syncLocations, syncActivities, syncCountries, syncProvinces, syncRegions, syncTags, syncSeasons, syncSuitabilityRules, syncActivityCategories, syncAIPrompts, syncAISuggestedRules, setApiKey } from "@/lib/db";
+import { ensureIndexes, syncLocations, backfillLocationSearchFields, syncActivities, syncCountries, syncProvinces, syncRegions, syncTags, syncSeasons, syncSuitabilityRules, syncActivityCategories, syncAIPrompts, syncAISuggestedRules, setApiKey } from "@/lib/db";
 import { LOCATIONS } from "@/lib/locations";
 import { ACTIVITIES } from "@/lib/activities";
 import { COUNTRIES, PROVINCES } from "@/lib/countries";
@@ -59,6 +59,8 @@ export async function POST(request: Request) {
       syncAIPrompts(AI_PROMPTS),
       syncAISuggestedRules(AI_SUGGESTED_PROMPT_RULES),
     ]);
+    // Seeds get search fields from syncLocations; fill in user-added locations
+    await backfillLocationSearchFields();
 
     // Store any provided API keys
     const storedKeys: string[] = [];
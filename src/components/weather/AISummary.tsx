@@ -93,7 +93,7 @@ export function AISummary({ weather, location, onSummaryLoaded }: Props) {
               },
               insights: weather.insights,
             },
-            location: { name: location.name, lat: location.lat, lon: location.lon, elevation: location.elevation },
+            location: { name: location.name, slug: location.slug, lat: location.lat, lon: location.lon, elevation: location.elevation },
             activities: activityLabels,
           }),
         });
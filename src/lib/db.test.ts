@@ -29,6 +29,8 @@ import {
   getAtlasSearchIndexDefinitions,
   _resetSearchFlags,
   getLocationCount,
+  locationSearchFields,
+  backfillLocationSearchFields,
   VALID_CONDITION_FIELDS,
 } from "./db";
 import { REGIONS } from "./seed-regions";
@@ -576,3 +578,28 @@ describe("VALID_CONDITION_FIELDS", () => {
     }
   });
 });
+
+// ── locationSearchFields ───────────────────────────────────────────────────
+
+describe("locationSearchFields", () => {
+  it("lowercases name and province", () => {
+    const fields = locationSearchFields("Mutare", "Manicaland");
+    expect(fields.name_lower).toBe("mutare");
+    expect(fields.province_lower).toBe("manicaland");
+  });
+
+  it("produces distinct sorted trigrams from name and province", () => {
+    const fields = locationSearchFields("Gweru", "Midlands");
+    expect(fields.trigrams).toContain("gwe");
+    expect(fields.trigrams).toContain("mid");
+    expect(fields.trigrams).toEqual([...new Set(fields.trigrams)].sort());
+  });
+
+  it("has no trigrams for names shorter than three characters", () => {
+    expect(locationSearchFields("Gw").trigrams).toEqual([]);
+  });
+
+  it("exports backfillLocationSearchFields", () => {
+    expect(typeof backfillLocationSearchFields).toBe("function");
+  });
+});
@@ -190,36 +190,54 @@ function aiSuggestedRulesCollection() {
   return getDb().collection<AISuggestedPromptRule & { updatedAt: Date }>("ai_suggested_rules");
 }
 
+/** Open circuit breakers shared between Python API instances (written by _circuit_breaker.py). */
+function circuitBreakersCollection() {
+  return getDb().collection<{ provider: string; openUntil?: Date }>("circuit_breakers");
+}
+
 // ---------------------------------------------------------------------------
 // Indexes — call once on app startup (idempotent)
 // ---------------------------------------------------------------------------
 
 export async function ensureIndexes(): Promise<void> {
   await Promise.all([
-    // Weather cache: one doc per location, auto-expire
+    // Weather cache: one doc per location, unexpired lookup, auto-expire
     weatherCacheCollection().createIndex({ locationSlug: 1 }, { unique: true }),
+    weatherCacheCollection().createIndex({ locationSlug: 1, expiresAt: 1 }),
     weatherCacheCollection().createIndex({ expiresAt: 1 }, { expireAfterSeconds: 0 }),
 
-    // AI summaries: one doc per location, auto-expire
+    // AI summaries: one doc per location, unexpired lookup, auto-expire
     aiSummariesCollection().createIndex({ locationSlug: 1 }, { unique: true }),
+    aiSummariesCollection().createIndex({ locationSlug: 1, expiresAt: 1 }),
     aiSummariesCollection().createIndex({ expiresAt: 1 }, { expireAfterSeconds: 0 }),
 
     // Weather history: one doc per location per day, query by date range
     weatherHistoryCollection().createIndex({ locationSlug: 1, date: -1 }, { unique: true }),
     weatherHistoryCollection().createIndex({ recordedAt: 1 }),
+    // Equality on slug, then range + sort on recordedAt (/api/py/history, history analysis)
+    weatherHistoryCollection().createIndex({ locationSlug: 1, recordedAt: -1 }),
 
     // Locations: by slug (unique), by tags, text search, geospatial
     locationsCollection().createIndex({ slug: 1 }, { unique: true }),
     locationsCollection().createIndex({ tags: 1 }),
+    // Covers the chat list_locations_by_tag query (filter + name sort + projection)
+    locationsCollection().createIndex({ tags: 1, name: 1, slug: 1, province: 1 }),
     locationsCollection().createIndex(
       { name: "text", province: "text", slug: "text" },
       { weights: { name: 10, province: 5, slug: 3 }, name: "location_text_search" },
     ),
     locationsCollection().createIndex({ location: "2dsphere" }),
+    // Search fallback: multikey trigrams narrow candidates, then a substring
+    // check on name_lower/province_lower/slug (see _execute_search_locations)
+    locationsCollection().createIndex({ trigrams: 1 }),
 
     // Activities: by id (unique), by category, text search
     activitiesCollection().createIndex({ id: 1 }, { unique: true }),
     activitiesCollection().createIndex({ category: 1 }),
+    // Index-backed sort for the capped activity list in the chat system prompt
+    activitiesCollection().createIndex({ category: 1, label: 1 }),
+    // Covers the { id: { $in } } label lookup (id + label projection, no doc fetch)
+    activitiesCollection().createIndex({ id: 1, label: 1 }),
     activitiesCollection().createIndex(
       { label: "text", description: "text", category: "text" },
       { weights: { label: 10, description: 5, category: 3 }, name: "activity_text_search" },
@@ -251,6 +269,8 @@ export async function ensureIndexes(): Promise<void> {
     // Tags: by slug (unique), by featured + order for explore page
     tagsCollection().createIndex({ slug: 1 }, { unique: true }),
     tagsCollection().createIndex({ featured: 1, order: 1 }),
+    // Index-ordered /api/py/tags?featured=true (filter on featured, sort by slug)
+    tagsCollection().createIndex({ featured: 1, slug: 1 }),
 
     // Seasons: by countryCode for date lookups, TTL for AI-generated entries
     seasonsCollection().createIndex({ countryCode: 1 }),
@@ -270,6 +290,10 @@ export async function ensureIndexes(): Promise<void> {
     // AI suggested rules: by ruleId (unique), by active + category + order
     aiSuggestedRulesCollection().createIndex({ ruleId: 1 }, { unique: true }),
     aiSuggestedRulesCollection().createIndex({ active: 1, category: 1, order: 1 }),
+
+    // Circuit breakers: one doc per provider, dropped once the cooldown has passed
+    circuitBreakersCollection().createIndex({ provider: 1 }, { unique: true }),
+    circuitBreakersCollection().createIndex({ openUntil: 1 }, { expireAfterSeconds: 0 }),
   ]);
 }
 
@@ -562,6 +586,26 @@ export async function setApiKey(provider: string, key: string): Promise<void> {
 // Location operations (sync static data to MongoDB)
 // ---------------------------------------------------------------------------
 
+function textTrigrams(text: string): string[] {
+  // Iterate code points (not UTF-16 units) to match Python's str slicing
+  const chars = Array.from(text.toLowerCase());
+  const grams = new Set<string>();
+  for (let i = 0; i + 3 <= chars.length; i++) grams.add(chars.slice(i, i + 3).join(""));
+  return [...grams].sort();
+}
+
+/**
+ * Precomputed fields backing the indexed search fallback in api/py/_chat.py.
+ * Must stay in sync with location_search_fields() in api/py/_db.py.
+ */
+export function locationSearchFields(name: string, province: string = "") {
+  return {
+    name_lower: name.toLowerCase(),
+    province_lower: province.toLowerCase(),
+    trigrams: [...new Set([...textTrigrams(name), ...textTrigrams(province)])].sort(),
+  };
+}
+
 export async function syncLocations(
   locations: WeatherLocation[],
 ): Promise<void> {
@@ -581,6 +625,7 @@ export async function syncLocations(
             ...loc,
             country,
             provinceSlug,
+            ...locationSearchFields(loc.name, loc.province),
             // GeoJSON Point for 2dsphere queries (note: GeoJSON uses [lon, lat] order)
             location: { type: "Point", coordinates: [loc.lon, loc.lat] },
             updatedAt: now,
@@ -635,6 +680,25 @@ export async function getLocationCount(): Promise<number> {
   return locationsCollection().estimatedDocumentCount();
 }
 
+/**
+ * Backfill search fields on locations written before they existed
+ * (community and geolocation docs that syncLocations never touches).
+ */
+export async function backfillLocationSearchFields(): Promise<number> {
+  const docs = await locationsCollection()
+    .find({ trigrams: { $exists: false } }, { projection: { slug: 1, name: 1, province: 1 } })
+    .toArray();
+  if (docs.length === 0) return 0;
+  const bulkOps = docs.map((doc) => ({
+    updateOne: {
+      filter: { slug: doc.slug },
+      update: { $set: locationSearchFields(doc.name, doc.province ?? "") },
+    },
+  }));
+  await locationsCollection().bulkWrite(bulkOps);
+  return docs.length;
+}
+
 /** Insert a new community-contributed location */
 export async function createLocation(
   location: WeatherLocation,
@@ -642,6 +706,7 @@ export async function createLocation(
   const now = new Date();
   const doc = {
     ...location,
+    ...locationSearchFields(location.name, location.province),
     location: { type: "Point" as const, coordinates: [location.lon, location.lat] },
     updatedAt: now,
   };
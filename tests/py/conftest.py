@@ -34,6 +34,7 @@ for _key in list(sys.modules.keys()):
 # Build a fake pymongo package with the submodules that _db.py imports
 _mock_pymongo = types.ModuleType("pymongo")
 _mock_pymongo.MongoClient = MagicMock  # type: ignore[attr-defined]
+_mock_pymongo.ReadPreference = MagicMock()  # type: ignore[attr-defined]
 
 _mock_pymongo_database = types.ModuleType("pymongo.database")
 _mock_pymongo_database.Database = MagicMock  # type: ignore[attr-defined]
@@ -61,8 +62,10 @@ sys.modules["pymongo.errors"] = _mock_pymongo_errors
 # Mock anthropic SDK
 _mock_anthropic = types.ModuleType("anthropic")
 _mock_anthropic.Anthropic = MagicMock  # type: ignore[attr-defined]
+_mock_anthropic.AsyncAnthropic = MagicMock  # type: ignore[attr-defined]
 _mock_anthropic.RateLimitError = type("RateLimitError", (Exception,), {})  # type: ignore[attr-defined]
 _mock_anthropic.APIError = type("APIError", (Exception,), {})  # type: ignore[attr-defined]
+_mock_anthropic.APITimeoutError = type("APITimeoutError", (_mock_anthropic.APIError,), {})  # type: ignore[attr-defined]
 sys.modules["anthropic"] = _mock_anthropic
 
 # ---------------------------------------------------------------------------
@@ -98,3 +101,15 @@ def mock_request():
         return req
 
     return _make
+
+
+@pytest.fixture(autouse=True)
+def _no_shared_circuit_sync(monkeypatch):
+    """Keep circuit breakers from reaching MongoDB in background threads.
+
+    Tests that patch get_db would otherwise see stray calls from a
+    concurrent shared-state sync. test_circuit_breaker exercises the sync
+    functions directly.
+    """
+    import py._circuit_breaker as cb_mod
+    monkeypatch.setattr(cb_mod, "_in_background", lambda fn, *args: None)
@@ -2,17 +2,24 @@
 
 from __future__ import annotations
 
+import asyncio
 import os
 import time
+import json
 from datetime import datetime, timezone, timedelta
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 import pytest
+from fastapi import BackgroundTasks
 
 from py._ai import (
     _get_ttl,
     _get_client,
     _get_season,
+    _get_location_tags,
+    _loc_tags_cache,
+    _remember_loc_tags,
+    _season_cache,
     _resolve_seasons_with_ai,
     _trigger_background_season_resolution,
     _resolution_in_progress,
@@ -22,7 +29,14 @@ from py._ai import (
     _is_stale,
     _get_cached_summary,
     _set_cached_summary,
+    _ensure_indexes,
     _get_system_prompt,
+    _stable_json,
+    _build_summary_request,
+    _slugify,
+    _regenerate_tier1_batch,
+    prewarm_summaries,
+    warm_caches,
     generate_summary,
     AISummaryRequest,
     LocationInfo,
@@ -34,6 +48,16 @@ from py._ai import (
 )
 
 
+@pytest.fixture(autouse=True)
+def _reset_lookup_caches():
+    """Clear module-level location tag and season caches between tests."""
+    _loc_tags_cache.clear()
+    _season_cache.clear()
+    yield
+    _loc_tags_cache.clear()
+    _season_cache.clear()
+
+
 # ---------------------------------------------------------------------------
 # _get_ttl — tiered TTL (data-driven via tags)
 # ---------------------------------------------------------------------------
@@ -71,6 +95,7 @@ class TestGetTtl:
     def test_tier_2_tags_set(self):
         """Verify the set of tags that qualify for tier 2."""
         assert TIER_2_TAGS == {"farming", "mining", "education", "border"}
+        assert isinstance(TIER_2_TAGS, frozenset)
 
 
 # ---------------------------------------------------------------------------
@@ -83,7 +108,7 @@ class TestGetClient:
         """Reset module-level client state."""
         import py._ai as ai_mod
         ai_mod._client = None
-        ai_mod._client_key_last = None
+        ai_mod._client_key_digest = None
 
     @patch("py._ai.get_api_key")
     @patch.dict(os.environ, {}, clear=True)
@@ -142,6 +167,44 @@ class TestGetClient:
             mock_anthropic.assert_called_once_with(api_key="db-api-key")
 
 
+# ---------------------------------------------------------------------------
+# _get_location_tags — cached tag lookup
+# ---------------------------------------------------------------------------
+
+
+class TestGetLocationTags:
+    @patch("py._ai.get_db")
+    def test_second_call_served_from_cache(self, mock_db):
+        mock_coll = MagicMock()
+        mock_coll.find_one.return_value = {"tags": ["city"]}
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+
+        assert _get_location_tags("harare") == ["city"]
+        assert _get_location_tags("harare") == ["city"]
+        assert mock_coll.find_one.call_count == 1
+
+    @patch("py._ai.get_db")
+    def test_expired_entry_refetched(self, mock_db):
+        mock_coll = MagicMock()
+        mock_coll.find_one.return_value = {"tags": ["farming"]}
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+        _loc_tags_cache["chinhoyi"] = (time.time() - 600, ["city"])
+
+        assert _get_location_tags("chinhoyi") == ["farming"]
+        assert mock_coll.find_one.call_count == 1
+
+    @patch("py._ai.get_db")
+    def test_db_error_returns_stale_entry(self, mock_db):
+        mock_db.side_effect = Exception("DB down")
+        _loc_tags_cache["harare"] = (time.time() - 600, ["city"])
+        assert _get_location_tags("harare") == ["city"]
+
+    @patch("py._ai.get_db")
+    def test_db_error_without_cache_returns_empty(self, mock_db):
+        mock_db.side_effect = Exception("DB down")
+        assert _get_location_tags("harare") == []
+
+
 # ---------------------------------------------------------------------------
 # _get_season — hemisphere-aware season lookup
 # ---------------------------------------------------------------------------
@@ -163,6 +226,16 @@ class TestGetSeason:
         assert result["localName"] == "Masika"
         assert result["description"] == "Heavy rains"
 
+    @patch("py._ai.get_db")
+    def test_db_hit_cached_per_country_and_month(self, mock_db):
+        mock_coll = MagicMock()
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+        mock_coll.find_one.return_value = {"name": "Wet season", "localName": "Masika"}
+
+        _get_season("ZW")
+        _get_season("zw")
+        assert mock_coll.find_one.call_count == 1
+
     @patch("py._ai.get_db")
     @patch("py._ai.datetime")
     def test_southern_hemisphere_summer(self, mock_dt, mock_db):
@@ -820,9 +893,17 @@ class TestIsStale:
         cached = {"weatherSnapshot": {"temperature": 20, "weatherCode": 0}}
         assert _is_stale(cached, 25.1, 0) is True
 
-    def test_missing_snapshot_defaults_to_zero(self):
+    def test_empty_snapshot_is_stale(self):
+        """No snapshot to compare against — regenerate rather than guess."""
         cached = {"weatherSnapshot": {}}
-        assert _is_stale(cached, 0, 0) is False
+        assert _is_stale(cached, 0, 0) is True
+
+    def test_absent_snapshot_is_stale(self):
+        assert _is_stale({"insight": "Old."}, 0, 0) is True
+
+    def test_partial_snapshot_is_stale(self):
+        cached = {"weatherSnapshot": {"temperature": 20}}
+        assert _is_stale(cached, 20, 0) is True
 
     def test_temp_decrease_also_stale(self):
         cached = {"weatherSnapshot": {"temperature": 30, "weatherCode": 0}}
@@ -837,6 +918,7 @@ class TestIsStale:
 class TestGetCachedSummary:
     @patch("py._ai.get_db")
     def test_returns_cached_doc(self, mock_db):
+        _loc_tags_cache["test-location"] = (time.time(), [])
         mock_coll = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
         now = datetime.now(timezone.utc)
@@ -853,6 +935,7 @@ class TestGetCachedSummary:
 
     @patch("py._ai.get_db")
     def test_returns_none_when_not_cached(self, mock_db):
+        _loc_tags_cache["test-location"] = (time.time(), [])
         mock_coll = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
         mock_coll.find_one.return_value = None
@@ -860,6 +943,115 @@ class TestGetCachedSummary:
         result = _get_cached_summary("test-location")
         assert result is None
 
+    @patch("py._ai.get_db")
+    def test_cold_slug_fetches_tags_and_summary_in_one_query(self, mock_db):
+        mock_coll = MagicMock()
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+        now = datetime.now(timezone.utc)
+        mock_coll.aggregate.return_value = [
+            {"tags": ["city"]},
+            {"insight": "Sunny.", "generatedAt": now, "weatherSnapshot": {}, "_summary": True},
+        ]
+
+        result = _get_cached_summary("harare")
+        assert result["insight"] == "Sunny."
+        mock_coll.find_one.assert_not_called()
+        mock_coll.aggregate.assert_called_once()
+        # Tags are now cached — the tiered-TTL lookup skips MongoDB
+        assert _get_location_tags("harare") == ["city"]
+        mock_coll.find_one.assert_not_called()
+
+    @patch("py._ai.get_db")
+    def test_cold_slug_without_summary_still_caches_tags(self, mock_db):
+        mock_coll = MagicMock()
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+        mock_coll.aggregate.return_value = [{"tags": ["farming"]}]
+
+        assert _get_cached_summary("chinhoyi") is None
+        assert _loc_tags_cache["chinhoyi"][1] == ["farming"]
+
+    @patch("py._ai.get_db")
+    def test_unknown_slug_is_not_cached(self, mock_db):
+        """Client-supplied slugs that match no location must not grow the cache."""
+        mock_coll = MagicMock()
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+        mock_coll.aggregate.return_value = []
+        mock_coll.find_one.return_value = None
+
+        assert _get_cached_summary("no-such-place") is None
+        assert _get_location_tags("no-such-place") == []
+        assert _loc_tags_cache == {}
+
+    def test_tag_cache_is_capped(self):
+        with patch("py._ai._LOC_TAGS_CACHE_MAX", 3):
+            for i in range(5):
+                _remember_loc_tags(f"loc-{i}", ["city"], time.time())
+        assert list(_loc_tags_cache) == ["loc-2", "loc-3", "loc-4"]
+
+
+# ---------------------------------------------------------------------------
+# _ensure_indexes
+# ---------------------------------------------------------------------------
+
+
+class TestEnsureIndexes:
+    @pytest.fixture(autouse=True)
+    def _reset_flag(self):
+        import py._ai as ai_mod
+        ai_mod._indexes_ensured = False
+        ai_mod._indexes_retry_at = 0
+        yield
+        ai_mod._indexes_ensured = False
+        ai_mod._indexes_retry_at = 0
+
+    @patch("py._ai.get_db")
+    def test_creates_compound_and_ttl_indexes_once(self, mock_db):
+        mock_coll = MagicMock()
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+
+        _ensure_indexes()
+        _ensure_indexes()
+
+        assert mock_coll.create_index.call_count == 2
+        calls = mock_coll.create_index.call_args_list
+        assert calls[0][0][0] == [("locationSlug", 1), ("expiresAt", 1)]
+        assert calls[1][0][0] == "expiresAt"
+        assert calls[1][1]["expireAfterSeconds"] == 0
+
+    @patch("py._ai.get_db")
+    def test_failure_backs_off_before_retrying(self, mock_db):
+        import py._ai as ai_mod
+
+        mock_db.side_effect = Exception("DB down")
+        with patch("py._ai._time") as mock_time:
+            mock_time.monotonic.return_value = 1000.0
+            _ensure_indexes()
+            _ensure_indexes()  # within the backoff window — no second attempt
+            assert mock_db.call_count == 1
+            assert ai_mod._indexes_ensured is False
+
+            mock_time.monotonic.return_value = 1000.0 + ai_mod._INDEX_RETRY_S
+            _ensure_indexes()
+            assert mock_db.call_count == 2
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_cached_summary", return_value={"insight": "Cached.", "generatedAt": "2026-01-01T00:00:00"})
+    @patch("py._ai._is_stale", return_value=False)
+    @patch("py._ai._ensure_indexes")
+    async def test_endpoint_runs_it_off_the_event_loop(self, mock_idx, _stale, _cached):
+        import threading
+
+        loop_thread = threading.get_ident()
+        mock_idx.side_effect = lambda: setattr(mock_idx, "thread", threading.get_ident())
+        body = AISummaryRequest(
+            weatherData={"current": {"temperature_2m": 25, "weather_code": 0}},
+            location=LocationInfo(name="Harare"),
+        )
+        await generate_summary(body, BackgroundTasks())
+
+        mock_idx.assert_called_once()
+        assert mock_idx.thread != loop_thread
+
 
 # ---------------------------------------------------------------------------
 # _set_cached_summary
@@ -911,6 +1103,35 @@ class TestSetCachedSummary:
         diff = (update_doc["expiresAt"] - update_doc["generatedAt"]).total_seconds()
         assert diff == TTL_TIER_3
 
+    @patch("py._ai.get_db")
+    def test_write_failure_is_logged_not_raised(self, mock_db):
+        """Runs as a background task — a failed upsert must not raise."""
+        mock_coll = MagicMock()
+        mock_coll.update_one.side_effect = Exception("write failed")
+        mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+
+        _set_cached_summary("harare", "Summary.", {"temperature": 25}, [])
+
+
+# ---------------------------------------------------------------------------
+# _stable_json — byte-stable prompt serialization
+# ---------------------------------------------------------------------------
+
+
+class TestStableJson:
+    def test_key_order_does_not_change_output(self):
+        a = _stable_json({"temperature_2m": 25.0, "weather_code": 1})
+        b = _stable_json({"weather_code": 1, "temperature_2m": 25.0})
+        assert a == b
+
+    def test_floats_rounded_to_one_decimal(self):
+        assert _stable_json({"t": 25.04}) == _stable_json({"t": 24.96})
+        assert _stable_json([18.26, 19.0]) == "[18.3,19.0]"
+
+    def test_non_json_values_stringified(self):
+        now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        assert "2025-01-01" in _stable_json({"time": now})
+
 
 # ---------------------------------------------------------------------------
 # _get_system_prompt
@@ -918,11 +1139,6 @@ class TestSetCachedSummary:
 
 
 class TestGetSystemPrompt:
-    def _reset_prompt_cache(self):
-        import py._ai as ai_mod
-        ai_mod._prompt_cache = {}
-        ai_mod._prompt_cache_at = 0
-
     @patch("py._ai._get_prompt")
     def test_returns_db_template(self, mock_get):
         mock_get.return_value = {"template": "Custom system prompt from DB."}
@@ -986,7 +1202,7 @@ class TestGenerateSummary:
         }
         mock_stale.return_value = False
 
-        result = await generate_summary(self._make_request())
+        result = await generate_summary(self._make_request(), BackgroundTasks())
         assert result["cached"] is True
         assert result["insight"] == "Cached insight."
         mock_set.assert_not_called()
@@ -1009,10 +1225,13 @@ class TestGenerateSummary:
         mock_season.return_value = {"name": "Summer", "localName": "Summer",
                                      "description": "Warm season with possible thunderstorms"}
 
-        result = await generate_summary(self._make_request())
+        background = BackgroundTasks()
+        result = await generate_summary(self._make_request(), background)
         assert "Summer" in result["insight"]
         assert "Nairobi" in result["insight"]
         assert result["cached"] is False
+        mock_set.assert_not_called()  # deferred until after the response
+        await background()
         mock_set.assert_called_once()
 
     @pytest.mark.asyncio
@@ -1036,7 +1255,7 @@ class TestGenerateSummary:
         mock_season.return_value = {"name": "Winter", "localName": "Winter",
                                      "description": "Cool and dry"}
 
-        result = await generate_summary(self._make_request())
+        result = await generate_summary(self._make_request(), BackgroundTasks())
         assert "Winter" in result["insight"]
         assert result["cached"] is False
 
@@ -1073,12 +1292,23 @@ class TestGenerateSummary:
         mock_ai_client.messages.create.return_value = mock_message
         mock_client.return_value = mock_ai_client
 
-        result = await generate_summary(self._make_request())
+        background = BackgroundTasks()
+        result = await generate_summary(self._make_request(), background)
         assert result["insight"] == "AI-generated summary for Nairobi."
         assert result["cached"] is False
         mock_breaker.record_success.assert_called_once()
+        mock_set.assert_not_called()  # deferred until after the response
+        await background()
         mock_set.assert_called_once()
 
+        # System prompt is sent as a cacheable block
+        system = mock_ai_client.messages.create.call_args[1]["system"]
+        assert system == [{
+            "type": "text",
+            "text": "You are Shamwari.",
+            "cache_control": {"type": "ephemeral"},
+        }]
+
     @pytest.mark.asyncio
     @patch("py._ai._set_cached_summary")
     @patch("py._ai._get_prompt")
@@ -1106,7 +1336,7 @@ class TestGenerateSummary:
         mock_ai_client.messages.create.side_effect = Exception("API Error")
         mock_client.return_value = mock_ai_client
 
-        result = await generate_summary(self._make_request())
+        result = await generate_summary(self._make_request(), BackgroundTasks())
         assert "Summer" in result["insight"]
         assert "Nairobi" in result["insight"]
         mock_breaker.record_failure.assert_called_once()
@@ -1145,14 +1375,18 @@ class TestGenerateSummary:
         mock_ai_client.messages.create.return_value = mock_message
         mock_client.return_value = mock_ai_client
 
-        await generate_summary(self._make_request(activities=["running", "farming"]))
+        await generate_summary(self._make_request(activities=["running", "farming"]), BackgroundTasks())
 
         # Verify that activities appear in the user content
         call_args = mock_ai_client.messages.create.call_args
         messages = call_args[1]["messages"]
-        user_content = messages[0]["content"]
-        assert "running" in user_content
-        assert "farming" in user_content
+        prefix_block, suffix_block = messages[0]["content"]
+        assert "running" in suffix_block["text"]
+        assert "farming" in suffix_block["text"]
+        # Per-user activities stay out of the cached per-location prefix
+        assert "running" not in prefix_block["text"]
+        assert prefix_block["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in suffix_block
 
     @pytest.mark.asyncio
     @patch("py._ai._set_cached_summary")
@@ -1180,6 +1414,488 @@ class TestGenerateSummary:
                                          "description": "Warm"}
             mock_client.return_value = None  # No AI client -> fallback
 
-            result = await generate_summary(self._make_request())
+            result = await generate_summary(self._make_request(), BackgroundTasks())
             assert result["insight"] != "Old cached insight."
             assert result["cached"] is False
+
+
+# ---------------------------------------------------------------------------
+# generate_summary — concurrent cache-miss coalescing
+# ---------------------------------------------------------------------------
+
+
+class TestInflightCoalescing:
+    def _make_request(self, temp=25, code=0):
+        return AISummaryRequest(
+            weatherData={"current": {"temperature_2m": temp, "weather_code": code}},
+            location=LocationInfo(name="Harare"),
+        )
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_concurrent_misses_share_one_generation(self, _mock_idx, _mock_cache):
+        async def _slow_generate(*_args):
+            await asyncio.sleep(0.01)
+            return {"insight": "Fresh.", "cached": False}
+
+        with patch("py._ai._generate_uncached_summary", new=AsyncMock(side_effect=_slow_generate)) as mock_gen:
+            results = await asyncio.gather(*[
+                generate_summary(self._make_request(), BackgroundTasks()) for _ in range(5)
+            ])
+
+        assert mock_gen.await_count == 1
+        assert all(r["insight"] == "Fresh." for r in results)
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_different_weather_not_coalesced(self, _mock_idx, _mock_cache):
+        async def _slow_generate(*_args):
+            await asyncio.sleep(0.01)
+            return {"insight": "Fresh.", "cached": False}
+
+        with patch("py._ai._generate_uncached_summary", new=AsyncMock(side_effect=_slow_generate)) as mock_gen:
+            await asyncio.gather(
+                generate_summary(self._make_request(code=0), BackgroundTasks()),
+                generate_summary(self._make_request(code=95), BackgroundTasks()),
+            )
+
+        assert mock_gen.await_count == 2
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_error_propagates_to_waiters_and_clears_entry(self, _mock_idx, _mock_cache):
+        import py._ai as ai_mod
+
+        async def _failing_generate(*_args):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        with patch("py._ai._generate_uncached_summary", new=AsyncMock(side_effect=_failing_generate)):
+            results = await asyncio.gather(
+                generate_summary(self._make_request(), BackgroundTasks()),
+                generate_summary(self._make_request(), BackgroundTasks()),
+                return_exceptions=True,
+            )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert ai_mod._inflight == {}
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_cancelled_leader_hands_off_to_waiters(self, _mock_idx, _mock_cache):
+        """A disconnected leader must not fail the clients coalesced onto it."""
+        import py._ai as ai_mod
+
+        async def _slow_generate(*_args):
+            await asyncio.sleep(0.05)
+            return {"insight": "Fresh.", "cached": False}
+
+        with patch("py._ai._generate_uncached_summary", new=AsyncMock(side_effect=_slow_generate)) as mock_gen:
+            leader = asyncio.create_task(generate_summary(self._make_request(), BackgroundTasks()))
+            await asyncio.sleep(0)
+            waiters = [
+                asyncio.create_task(generate_summary(self._make_request(), BackgroundTasks()))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            results = await asyncio.gather(*waiters)
+
+        assert leader.cancelled()
+        assert all(r["insight"] == "Fresh." for r in results)
+        # One waiter took over; the other coalesced onto it
+        assert mock_gen.await_count == 2
+        assert ai_mod._inflight == {}
+
+
+class TestRequestModels:
+    def test_request_models_are_frozen(self):
+        from pydantic import ValidationError
+        body = AISummaryRequest(weatherData={"current": {}}, location=LocationInfo(name="Harare"))
+        with pytest.raises(ValidationError):
+            body.location.name = "Bulawayo"
+        with pytest.raises(ValidationError):
+            body.stream = True
+
+
+class TestRequestTimestamp:
+    @pytest.mark.asyncio
+    @patch("py._ai.anthropic_breaker")
+    @patch("py._ai._get_location_tags", return_value=[])
+    @patch("py._ai._set_cached_summary")
+    @patch("py._ai._get_season", return_value={"name": "Summer", "localName": "Summer", "description": "Warm"})
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_client")
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_one_timestamp_shared_across_request(
+        self, _mock_idx, mock_cache, mock_client, _mock_prompt, mock_season, mock_set, _mock_tags, mock_breaker,
+    ):
+        mock_breaker.is_allowed = True
+        text_block = MagicMock(type="text", text="Clear skies.")
+        mock_client.return_value.messages.create.return_value = MagicMock(content=[text_block])
+
+        background = BackgroundTasks()
+        body = AISummaryRequest(weatherData={"current": {"temperature_2m": 20}}, location=LocationInfo(name="Harare"))
+        result = await generate_summary(body, background)
+        await background()
+
+        now = mock_cache.call_args[0][1]
+        assert mock_season.call_args.kwargs["now"] is now
+        assert mock_set.call_args[0][4] is now
+        assert result["generatedAt"] == now.isoformat()
+
+
+# ---------------------------------------------------------------------------
+# _slugify — cache-key slug
+# ---------------------------------------------------------------------------
+
+
+class TestSlugify:
+    def test_spaces_become_hyphens(self):
+        assert _slugify("Victoria Falls") == "victoria-falls"
+
+    def test_punctuation_collapsed(self):
+        assert _slugify("St. Peter's") == "st-peter-s"
+
+    def test_accents_stripped(self):
+        assert _slugify("Lubumbashi Étoile ") == "lubumbashi-etoile"
+
+    @pytest.mark.asyncio
+    @patch("py._ai._is_stale", return_value=False)
+    @patch("py._ai._get_cached_summary")
+    @patch("py._ai._ensure_indexes")
+    async def test_request_slug_preferred_over_name(self, _mock_idx, mock_cache, _mock_stale):
+        mock_cache.return_value = {"insight": "Hi.", "generatedAt": "2026-01-01T00:00:00"}
+        body = AISummaryRequest(
+            weatherData={"current": {}},
+            location=LocationInfo(name="Harare", slug="harare-zw"),
+        )
+        await generate_summary(body, BackgroundTasks())
+        assert mock_cache.call_args[0][0] == "harare-zw"
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("slug", ["Harare", "harare/../x", "a" * 81, "harare-zw\n", '{"$ne": 1}'])
+    @patch("py._ai._is_stale", return_value=False)
+    @patch("py._ai._get_cached_summary")
+    @patch("py._ai._ensure_indexes")
+    async def test_malformed_request_slug_falls_back_to_name(self, _mock_idx, mock_cache, _mock_stale, slug):
+        mock_cache.return_value = {"insight": "Hi.", "generatedAt": "2026-01-01T00:00:00"}
+        body = AISummaryRequest(
+            weatherData={"current": {}},
+            location=LocationInfo(name="Harare", slug=slug),
+        )
+        await generate_summary(body, BackgroundTasks())
+        assert mock_cache.call_args[0][0] == "harare"
+
+
+# ---------------------------------------------------------------------------
+# _build_summary_request — insights section
+# ---------------------------------------------------------------------------
+
+
+class TestBuildSummaryRequest:
+    _SEASON = {"name": "Summer", "localName": "Summer", "description": "Warm season"}
+
+    @patch("py._ai._get_prompt", return_value=None)
+    def test_insights_listed_in_field_order_skipping_missing(self, _mock_prompt):
+        weather = {"current": {}, "daily": {"insights": {"moonPhase": 2, "dewPoint": 14.5, "visibility": None}}}
+        kwargs = _build_summary_request(weather, LocationInfo(name="Harare"), [], [], self._SEASON)
+        prefix = kwargs["messages"][0]["content"][0]["text"]
+        assert "Weather insights (from Tomorrow.io): Dew point: 14.5, Moon phase: 2" in prefix
+        assert "Visibility" not in prefix
+
+    @patch("py._ai._get_prompt", return_value=None)
+    def test_no_insights_section_when_empty(self, _mock_prompt):
+        weather = {"current": {}, "insights": {"visibility": None}}
+        kwargs = _build_summary_request(weather, LocationInfo(name="Harare"), [], [], self._SEASON)
+        assert "Weather insights" not in kwargs["messages"][0]["content"][0]["text"]
+
+
+# ---------------------------------------------------------------------------
+# Streaming (stream=True)
+# ---------------------------------------------------------------------------
+
+
+async def _read_events(resp) -> list[dict]:
+    """Drain a StreamingResponse and decode its SSE payloads."""
+    body = ""
+    async for chunk in resp.body_iterator:
+        body += chunk if isinstance(chunk, str) else chunk.decode()
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line]
+
+
+def _stream_ctx(chunks: list[str] | None = None, error: Exception | None = None) -> MagicMock:
+    """Mock for client.messages.stream(...) used as a context manager."""
+    stream = MagicMock()
+    stream.text_stream = iter(chunks or [])
+    ctx = MagicMock()
+    if error:
+        ctx.__enter__ = MagicMock(side_effect=error)
+    else:
+        ctx.__enter__ = MagicMock(return_value=stream)
+    ctx.__exit__ = MagicMock(return_value=False)
+    return ctx
+
+
+class TestGenerateSummaryStreaming:
+    _SEASON = {"name": "Summer", "localName": "Summer", "description": "Warm season"}
+
+    def _make_request(self):
+        return AISummaryRequest(
+            weatherData={"current": {"temperature_2m": 25, "relative_humidity_2m": 60, "weather_code": 0}},
+            location=LocationInfo(name="Harare", country="ZW"),
+            stream=True,
+        )
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_location_tags", return_value=[])
+    @patch("py._ai._set_cached_summary")
+    @patch("py._ai._get_season", return_value=_SEASON)
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_client")
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_streams_deltas_then_caches_full_text(
+        self, _mock_idx, _mock_cache, mock_client, _mock_prompt, _mock_season, mock_set, _mock_tags,
+    ):
+        mock_client.return_value.messages.stream.return_value = _stream_ctx(["Sunny ", "and warm."])
+
+        resp = await generate_summary(self._make_request(), BackgroundTasks())
+        assert resp.media_type == "text/event-stream"
+
+        events = await _read_events(resp)
+        assert [e["text"] for e in events if e["type"] == "delta"] == ["Sunny ", "and warm."]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["insight"] == "Sunny and warm."
+
+        # Cache write happens after the stream, in the background task
+        mock_set.assert_not_called()
+        await resp.background()
+        assert mock_set.call_args[0][:2] == ("harare", "Sunny and warm.")
+
+    @pytest.mark.asyncio
+    @patch("py._ai._get_location_tags", return_value=[])
+    @patch("py._ai._set_cached_summary")
+    @patch("py._ai._get_season", return_value=_SEASON)
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_client")
+    @patch("py._ai._get_cached_summary", return_value=None)
+    @patch("py._ai._ensure_indexes")
+    async def test_stream_error_falls_back(
+        self, _mock_idx, _mock_cache, mock_client, _mock_prompt, _mock_season, mock_set, _mock_tags,
+    ):
+        mock_client.return_value.messages.stream.return_value = _stream_ctx(error=RuntimeError("down"))
+
+        resp = await generate_summary(self._make_request(), BackgroundTasks())
+        events = await _read_events(resp)
+        assert events[-1]["type"] == "done"
+        assert "Current conditions in Harare" in events[-1]["insight"]
+
+        await resp.background()
+        assert "Current conditions in Harare" in mock_set.call_args[0][1]
+
+    @pytest.mark.asyncio
+    @patch("py._ai._is_stale", return_value=False)
+    @patch("py._ai._get_cached_summary")
+    @patch("py._ai._ensure_indexes")
+    async def test_cache_hit_streams_single_event(self, _mock_idx, mock_cache, _mock_stale):
+        mock_cache.return_value = {
+            "insight": "Cached insight.",
+            "generatedAt": datetime.now(timezone.utc),
+        }
+
+        resp = await generate_summary(self._make_request(), BackgroundTasks())
+        events = await _read_events(resp)
+        assert events[0] == {"type": "delta", "text": "Cached insight."}
+        assert events[-1]["type"] == "done"
+        assert events[-1]["cached"] is True
+
+
+# ---------------------------------------------------------------------------
+# Batch pre-warm
+# ---------------------------------------------------------------------------
+
+
+class TestRegenerateTier1Batch:
+    _SEASON = {"name": "Summer", "localName": "Summer", "description": "Warm season"}
+
+    def _mock_db(self, mock_db, pending=None):
+        colls = {
+            "ai_batches": MagicMock(),
+            "locations": MagicMock(),
+            "weather_cache": MagicMock(),
+        }
+        colls["ai_batches"].find_one_and_update.return_value = pending
+        colls["locations"].find.return_value = [
+            {"slug": "harare", "name": "Harare", "country": "ZW", "tags": ["city"]},
+            {"slug": "bulawayo", "name": "Bulawayo", "country": "ZW", "tags": ["city"]},
+        ]
+        colls["weather_cache"].find.return_value = [
+            {"locationSlug": "harare", "data": {"current": {"temperature_2m": 24, "weather_code": 1}}},
+        ]
+        mock_db.return_value.__getitem__ = MagicMock(side_effect=colls.__getitem__)
+        return colls
+
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_season", return_value=_SEASON)
+    @patch("py._ai.get_db")
+    def test_submits_batch_for_locations_with_fresh_weather(self, mock_db, _mock_season, _mock_prompt):
+        colls = self._mock_db(mock_db)
+        client = MagicMock()
+        client.messages.batches.create.return_value = MagicMock(id="msgbatch_1")
+
+        result = _regenerate_tier1_batch(client)
+
+        assert result == {"status": "submitted", "batchId": "msgbatch_1", "submitted": 1}
+        requests = client.messages.batches.create.call_args.kwargs["requests"]
+        assert [r["custom_id"] for r in requests] == ["harare"]
+        claim_filter = colls["ai_batches"].find_one_and_update.call_args[0][0]
+        assert claim_filter == {"_id": "summary-prewarm"}
+        assert colls["ai_batches"].find_one_and_update.call_args.kwargs["upsert"] is True
+        flt, update = colls["ai_batches"].update_one.call_args[0]
+        assert flt == {"_id": "summary-prewarm"}
+        assert update["$set"]["batchId"] == "msgbatch_1"
+        assert update["$set"]["snapshots"]["harare"]["snapshot"] == {"temperature": 24, "weatherCode": 1}
+
+    @patch("py._ai.get_db")
+    def test_overlapping_call_does_not_submit(self, mock_db):
+        """A claim without a batchId means another call is mid-submit."""
+        colls = self._mock_db(mock_db)
+        colls["ai_batches"].find_one_and_update.side_effect = [
+            {"_id": "summary-prewarm", "kind": "summary-prewarm", "claimedAt": datetime.now(timezone.utc)},
+            None,  # claim is fresh, so the takeover matches nothing
+        ]
+        client = MagicMock()
+
+        assert _regenerate_tier1_batch(client) == {"status": "submitting"}
+        client.messages.batches.create.assert_not_called()
+        colls["ai_batches"].delete_one.assert_not_called()
+
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_season", return_value=_SEASON)
+    @patch("py._ai.get_db")
+    def test_stale_claim_is_taken_over(self, mock_db, _mock_season, _mock_prompt):
+        colls = self._mock_db(mock_db)
+        stale = {"_id": "summary-prewarm", "kind": "summary-prewarm", "claimedAt": datetime(2020, 1, 1, tzinfo=timezone.utc)}
+        colls["ai_batches"].find_one_and_update.side_effect = [stale, stale]
+        client = MagicMock()
+        client.messages.batches.create.return_value = MagicMock(id="msgbatch_2")
+
+        assert _regenerate_tier1_batch(client)["status"] == "submitted"
+        takeover_filter = colls["ai_batches"].find_one_and_update.call_args_list[1][0][0]
+        assert takeover_filter["batchId"] == {"$exists": False}
+        assert "$lt" in takeover_filter["claimedAt"]
+
+    @patch("py._ai._get_prompt", return_value=None)
+    @patch("py._ai._get_season", return_value=_SEASON)
+    @patch("py._ai.get_db")
+    def test_failed_submit_releases_claim(self, mock_db, _mock_season, _mock_prompt):
+        colls = self._mock_db(mock_db)
+        client = MagicMock()
+        client.messages.batches.create.side_effect = RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            _regenerate_tier1_batch(client)
+        colls["ai_batches"].delete_one.assert_called_once_with({"_id": "summary-prewarm"})
+        colls["ai_batches"].update_one.assert_not_called()
+
+    @patch("py._ai.get_db")
+    def test_nothing_to_submit_releases_claim(self, mock_db):
+        colls = self._mock_db(mock_db)
+        colls["locations"].find.return_value = []
+
+        assert _regenerate_tier1_batch(MagicMock()) == {"status": "idle", "submitted": 0}
+        colls["ai_batches"].delete_one.assert_called_once_with({"_id": "summary-prewarm"})
+
+    @patch("py._ai.get_db")
+    def test_pending_batch_still_processing(self, mock_db):
+        self._mock_db(mock_db, pending={"_id": 1, "batchId": "msgbatch_1"})
+        client = MagicMock()
+        client.messages.batches.retrieve.return_value = MagicMock(processing_status="in_progress")
+
+        assert _regenerate_tier1_batch(client)["status"] == "processing"
+        client.messages.batches.results.assert_not_called()
+
+    @patch("py._ai._set_cached_summary")
+    @patch("py._ai.get_db")
+    def test_collects_succeeded_results(self, mock_db, mock_set):
+        snapshots = {"harare": {"snapshot": {"temperature": 24, "weatherCode": 1}, "tags": ["city"]}}
+        colls = self._mock_db(mock_db, pending={"_id": 1, "batchId": "msgbatch_1", "snapshots": snapshots})
+        client = MagicMock()
+        client.messages.batches.retrieve.return_value = MagicMock(processing_status="ended")
+
+        text_block = MagicMock(type="text", text="Warm and clear.")
+        ok = MagicMock(custom_id="harare")
+        ok.result.type = "succeeded"
+        ok.result.message.content = [text_block]
+        failed = MagicMock(custom_id="harare")
+        failed.result.type = "errored"
+        client.messages.batches.results.return_value = [ok, failed]
+
+        result = _regenerate_tier1_batch(client)
+
+        assert result["written"] == 1
+        mock_set.assert_called_once_with("harare", "Warm and clear.", {"temperature": 24, "weatherCode": 1}, ["city"])
+        colls["ai_batches"].delete_one.assert_called_once_with({"_id": 1})
+
+
+class TestPrewarmSummaries:
+    @pytest.mark.asyncio
+    @patch.dict(os.environ, {"DB_INIT_SECRET": "s3cret"})
+    async def test_wrong_secret_rejected(self):
+        from fastapi import HTTPException
+        request = MagicMock()
+        request.headers = {"x-init-secret": "nope"}
+        with pytest.raises(HTTPException) as exc:
+            await prewarm_summaries(request)
+        assert exc.value.status_code == 401
+
+    @pytest.mark.asyncio
+    @patch.dict(os.environ, {"DB_INIT_SECRET": "s3cret"})
+    async def test_missing_or_non_ascii_secret_rejected(self):
+        from fastapi import HTTPException
+        for headers in ({}, {"x-init-secret": "s3crét"}):
+            request = MagicMock()
+            request.headers = headers
+            with pytest.raises(HTTPException) as exc:
+                await prewarm_summaries(request)
+            assert exc.value.status_code == 401
+
+    @pytest.mark.asyncio
+    @patch("py._ai._regenerate_tier1_batch", return_value={"status": "idle", "submitted": 0})
+    @patch("py._ai._get_client")
+    @patch.dict(os.environ, {"DB_INIT_SECRET": "s3cret"})
+    async def test_valid_secret_runs_job(self, _mock_client, mock_job):
+        request = MagicMock()
+        request.headers = {"x-init-secret": "s3cret"}
+        assert await prewarm_summaries(request) == {"status": "idle", "submitted": 0}
+        mock_job.assert_called_once()
+
+
+# ---------------------------------------------------------------------------
+# warm_caches — startup warm-up
+# ---------------------------------------------------------------------------
+
+
+class TestWarmCaches:
+    @patch("py._ai.prompt_cache")
+    @patch("py._ai.get_db")
+    def test_loads_prompts_and_city_tags(self, mock_db, mock_prompts):
+        mock_db.return_value.__getitem__.return_value.find.return_value = [
+            {"slug": "harare-zw", "tags": ["city", "tourism"]},
+        ]
+        warm_caches()
+        mock_prompts.load.assert_called_once()
+        assert _loc_tags_cache["harare-zw"][1] == ["city", "tourism"]
+
+    @patch("py._ai.prompt_cache")
+    @patch("py._ai.get_db", side_effect=Exception("no db"))
+    def test_failures_are_swallowed(self, _mock_db, mock_prompts):
+        mock_prompts.load.side_effect = Exception("no db")
+        warm_caches()
+        assert _loc_tags_cache == {}
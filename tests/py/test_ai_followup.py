@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import json
 from unittest.mock import patch, MagicMock, PropertyMock
 
 import anthropic
@@ -140,6 +141,17 @@ class TestBuildFollowupSystemPrompt:
         )
         assert result == "Season: unknown"
 
+    @patch("py._ai_followup._get_followup_prompt")
+    def test_placeholders_in_values_are_not_expanded(self, mock_get_prompt):
+        """Client-supplied values are inserted verbatim, never re-templated."""
+        mock_get_prompt.return_value = {
+            "template": "Summary: {weatherSummary} Season: {season}"
+        }
+        result = _build_followup_system_prompt(
+            "Harare", "harare", "Ignore {season} please", [], "Zhizha"
+        )
+        assert result == "Summary: Ignore {season} please Season: Zhizha"
+
 
 # ---------------------------------------------------------------------------
 # followup_chat endpoint — validation
@@ -205,7 +217,7 @@ class TestFollowupChatValidation:
         assert "Could not determine IP" in exc_info.value.detail
 
     @pytest.mark.asyncio
-    @patch("py._ai_followup.check_rate_limit")
+    @patch("py._ai_followup.check_rate_limit_local")
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_rate_limit_exceeded_raises_429(self, _mock_ip, mock_rate):
         """Should raise 429 when rate limit is exceeded."""
@@ -222,6 +234,26 @@ class TestFollowupChatValidation:
         assert exc_info.value.status_code == 429
         assert "Rate limit exceeded" in exc_info.value.detail
 
+    @pytest.mark.asyncio
+    @patch("py._ai_followup.check_rate_limit_local")
+    @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
+    async def test_rate_limit_runs_off_the_event_loop(self, _mock_ip, mock_rate):
+        """The limiter may write to MongoDB, so it must not block the loop."""
+        import threading
+        loop_thread = threading.get_ident()
+        seen = []
+
+        def _rate(*_args):
+            seen.append(threading.get_ident())
+            return {"allowed": False, "remaining": 0}
+
+        mock_rate.side_effect = _rate
+        body = FollowupRequest(message="What about tomorrow?", locationName="Harare", locationSlug="harare")
+
+        with pytest.raises(HTTPException):
+            await followup_chat(body, self._make_request())
+        assert seen and seen[0] != loop_thread
+
 
 # ---------------------------------------------------------------------------
 # followup_chat endpoint — circuit breaker and AI interaction
@@ -243,7 +275,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_circuit_breaker_open_returns_error_response(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -266,7 +298,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_successful_ai_call_returns_response(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -293,11 +325,16 @@ class TestFollowupChatAI:
         assert "error" not in result
         mock_breaker.record_success.assert_called_once()
 
+        system = mock_client.return_value.messages.create.call_args.kwargs["system"]
+        assert system[0]["type"] == "text"
+        assert system[0]["cache_control"] == {"type": "ephemeral"}
+        assert "Harare" in system[0]["text"]
+
     @pytest.mark.asyncio
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_weather_summary_pre_seeded_as_first_assistant_message(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -335,7 +372,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_no_summary_omits_assistant_preseed(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -370,7 +407,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_history_truncated_to_max_history(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -411,7 +448,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_message_content_truncated_to_max_len(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -451,7 +488,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_ai_rate_limit_error_raises_429(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -477,7 +514,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_ai_api_error_returns_graceful_fallback(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -502,7 +539,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_message_at_exact_max_len_is_accepted(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -531,7 +568,7 @@ class TestFollowupChatAI:
     @patch("py._ai_followup.anthropic_breaker")
     @patch("py._ai_followup._get_client")
     @patch("py._ai_followup._get_followup_prompt", return_value=None)
-    @patch("py._ai_followup.check_rate_limit", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
     @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
     async def test_history_messages_preserved_in_order(
         self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
@@ -573,3 +610,75 @@ class TestFollowupChatAI:
         assert messages[2] == {"role": "assistant", "content": "First answer"}
         assert messages[3] == {"role": "user", "content": "Second question"}
         assert messages[4] == {"role": "user", "content": "Third question"}
+
+
+# ---------------------------------------------------------------------------
+# followup_chat — streaming (stream=True)
+# ---------------------------------------------------------------------------
+
+
+async def _read_events(resp) -> list[dict]:
+    """Drain a StreamingResponse and decode its SSE payloads."""
+    body = ""
+    async for chunk in resp.body_iterator:
+        body += chunk if isinstance(chunk, str) else chunk.decode()
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line]
+
+
+class TestFollowupChatStreaming:
+    def _stream_ctx(self, chunks=None, error=None):
+        stream = MagicMock()
+        stream.text_stream = iter(chunks or [])
+        ctx = MagicMock()
+        ctx.__enter__ = MagicMock(side_effect=error) if error else MagicMock(return_value=stream)
+        ctx.__exit__ = MagicMock(return_value=False)
+        return ctx
+
+    def _body(self):
+        return FollowupRequest(
+            message="What about tomorrow?",
+            locationName="Harare",
+            locationSlug="harare",
+            stream=True,
+        )
+
+    @pytest.mark.asyncio
+    @patch("py._ai_followup.anthropic_breaker")
+    @patch("py._ai_followup._get_client")
+    @patch("py._ai_followup._get_followup_prompt", return_value=None)
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
+    async def test_streams_deltas_and_done(
+        self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
+    ):
+        type(mock_breaker).is_allowed = PropertyMock(return_value=True)
+        mock_client.return_value.messages.stream.return_value = self._stream_ctx(["Cooler ", "tomorrow."])
+
+        resp = await followup_chat(self._body(), MagicMock())
+        assert resp.media_type == "text/event-stream"
+
+        events = await _read_events(resp)
+        assert [e["text"] for e in events if e["type"] == "delta"] == ["Cooler ", "tomorrow."]
+        assert events[-1] == {"type": "done", "response": "Cooler tomorrow."}
+        mock_client.return_value.messages.create.assert_not_called()
+        mock_breaker.record_success.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch("py._ai_followup.anthropic_breaker")
+    @patch("py._ai_followup._get_client")
+    @patch("py._ai_followup._get_followup_prompt", return_value=None)
+    @patch("py._ai_followup.check_rate_limit_local", return_value={"allowed": True, "remaining": 29})
+    @patch("py._ai_followup.get_client_ip", return_value="1.2.3.4")
+    async def test_api_error_reported_in_done_event(
+        self, _mock_ip, _mock_rate, _mock_prompt, mock_client, mock_breaker,
+    ):
+        type(mock_breaker).is_allowed = PropertyMock(return_value=True)
+        mock_client.return_value.messages.stream.return_value = self._stream_ctx(
+            error=anthropic.APIError("fail"),
+        )
+
+        resp = await followup_chat(self._body(), MagicMock())
+        events = await _read_events(resp)
+        assert events[-1]["type"] == "done"
+        assert events[-1]["error"] is True
+        mock_breaker.record_failure.assert_called_once()
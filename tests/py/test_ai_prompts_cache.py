@@ -0,0 +1,83 @@
+"""Tests for _ai_prompts_cache.py — shared stale-while-revalidate prompt cache."""
+
+from __future__ import annotations
+
+import time
+from unittest.mock import patch, MagicMock
+
+from py._ai_prompts_cache import PromptCache, PROMPT_CACHE_TTL
+
+
+def _coll(docs):
+    coll = MagicMock()
+    coll.find.return_value = docs
+    return coll
+
+
+class TestPromptCache:
+    def test_first_lookup_loads_all_prompts_once(self):
+        cache = PromptCache()
+        coll = _coll([
+            {"promptKey": "system:summary", "template": "Summary."},
+            {"promptKey": "system:followup", "template": "Follow-up."},
+        ])
+        with patch("py._ai_prompts_cache.ai_prompts_collection", return_value=coll):
+            assert cache.get("system:summary")["template"] == "Summary."
+            assert cache.get("system:followup")["template"] == "Follow-up."
+        coll.find.assert_called_once()
+
+    def test_template_normalized_at_fetch(self):
+        """CRLF and trailing whitespace are stripped so the cached prefix is stable."""
+        cache = PromptCache()
+        coll = _coll([{"promptKey": "system:summary", "template": "Line one.\r\nLine two.\n\n  "}])
+        with patch("py._ai_prompts_cache.ai_prompts_collection", return_value=coll):
+            assert cache.get("system:summary")["template"] == "Line one.\nLine two."
+
+    def test_load_failure_returns_none(self):
+        cache = PromptCache()
+        with patch("py._ai_prompts_cache.ai_prompts_collection", side_effect=Exception("down")):
+            assert cache.get("system:summary") is None
+
+    def test_expired_cache_served_stale_and_refreshed_in_background(self):
+        cache = PromptCache()
+        cache._cache = {"system:summary": {"template": "Stale prompt."}}
+        cache._cache_at = time.time() - PROMPT_CACHE_TTL - 1
+
+        with patch("py._ai_prompts_cache.threading.Thread") as mock_thread, \
+             patch("py._ai_prompts_cache.ai_prompts_collection") as mock_coll:
+            result = cache.get("system:summary")
+
+        assert result == {"template": "Stale prompt."}
+        mock_coll.assert_not_called()
+        mock_thread.assert_called_once()
+        assert mock_thread.call_args[1]["daemon"] is True
+        mock_thread.return_value.start.assert_called_once()
+
+    def test_only_one_background_refresh_at_a_time(self):
+        cache = PromptCache()
+        cache._cache = {"system:summary": {"template": "Stale prompt."}}
+        cache._cache_at = time.time() - PROMPT_CACHE_TTL - 1
+
+        with patch("py._ai_prompts_cache.threading.Thread") as mock_thread:
+            cache.get("system:summary")
+            cache.get("system:summary")
+
+        assert mock_thread.call_count == 1
+
+    def test_summary_and_followup_share_one_cache(self):
+        from py._ai import _get_prompt
+        from py._ai_followup import _get_followup_prompt
+        from py._ai_prompts_cache import prompt_cache
+
+        prompt_cache.clear()
+        coll = _coll([
+            {"promptKey": "system:summary", "template": "Summary."},
+            {"promptKey": "system:followup", "template": "Follow-up."},
+        ])
+        try:
+            with patch("py._ai_prompts_cache.ai_prompts_collection", return_value=coll):
+                _get_prompt("system:summary")
+                _get_followup_prompt()
+            coll.find.assert_called_once()
+        finally:
+            prompt_cache.clear()
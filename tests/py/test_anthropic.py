@@ -0,0 +1,81 @@
+"""Tests for _anthropic.py — shared async Anthropic client and connection pool."""
+
+from __future__ import annotations
+
+from unittest.mock import patch, MagicMock, AsyncMock
+
+import pytest
+from fastapi import HTTPException
+
+import py._anthropic as anthropic_mod
+from py._anthropic import get_async_client, close_async_client
+
+
+@pytest.fixture(autouse=True)
+def _reset_client():
+    anthropic_mod._client = None
+    anthropic_mod._client_key_digest = None
+    anthropic_mod._http = None
+    yield
+    anthropic_mod._client = None
+    anthropic_mod._client_key_digest = None
+    anthropic_mod._http = None
+
+
+class TestGetAsyncClient:
+    @patch("py._anthropic.anthropic")
+    def test_key_rotation_keeps_connection_pool(self, mock_anthropic, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "key-one")
+        get_async_client()
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "key-two")
+        get_async_client()
+
+        mock_anthropic.DefaultAsyncHttpxClient.assert_called_once()
+        pool = mock_anthropic.DefaultAsyncHttpxClient.return_value
+        calls = mock_anthropic.AsyncAnthropic.call_args_list
+        assert [c.kwargs["api_key"] for c in calls] == ["key-one", "key-two"]
+        assert all(c.kwargs["http_client"] is pool for c in calls)
+
+    @patch("py._anthropic.anthropic")
+    def test_same_key_reuses_client(self, mock_anthropic, monkeypatch):
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "key-one")
+        assert get_async_client() is get_async_client()
+        mock_anthropic.AsyncAnthropic.assert_called_once()
+
+    @patch("py._anthropic.get_api_key", return_value=None)
+    def test_no_key_raises_503(self, _mock_key, monkeypatch):
+        monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+        with pytest.raises(HTTPException) as exc_info:
+            get_async_client()
+        assert exc_info.value.status_code == 503
+
+
+class TestCloseAsyncClient:
+    @pytest.mark.asyncio
+    async def test_close_releases_pool_and_client(self):
+        pool = MagicMock(aclose=AsyncMock())
+        anthropic_mod._http = pool
+        anthropic_mod._client = MagicMock()
+
+        await close_async_client()
+        await close_async_client()  # idempotent
+
+        pool.aclose.assert_awaited_once()
+        assert anthropic_mod._client is None
+        assert anthropic_mod._http is None
+
+    @patch("py._anthropic.anthropic")
+    @pytest.mark.asyncio
+    async def test_client_after_close_uses_a_fresh_pool(self, mock_anthropic, monkeypatch):
+        """Every endpoint shares this client, so a restart never reuses a closed pool."""
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "key-one")
+        first_pool = MagicMock(aclose=AsyncMock())
+        second_pool = MagicMock()
+        mock_anthropic.DefaultAsyncHttpxClient.side_effect = [first_pool, second_pool]
+
+        get_async_client()
+        await close_async_client()
+        get_async_client()
+
+        calls = mock_anthropic.AsyncAnthropic.call_args_list
+        assert [c.kwargs["http_client"] for c in calls] == [first_pool, second_pool]
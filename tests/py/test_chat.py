@@ -3,12 +3,17 @@
 from __future__ import annotations
 
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
 import pytest
+from fastapi import HTTPException
 
 from py._chat import (
     _build_chat_system_prompt,
+    _build_chat_system_blocks,
+    _with_history_breakpoint,
+    _CACHED_TOOLS,
+    TOOLS,
     _execute_search_locations,
     _execute_list_by_tag,
     _execute_get_weather,
@@ -19,10 +24,36 @@ from py._chat import (
     MAX_HISTORY,
     MAX_ACTIVITIES,
     _FALLBACK_CHAT_PROMPT,
+    _shared_prompt_cache,
+    _tool_result_cache,
+    _TOOL_RESULT_CACHE_MAX,
+    _compile_rule,
+    _compiled_rules,
+    _normalize_location_query,
+    _resolved_activities,
+    _collect_references,
+    _resolve_reference_names,
+    _is_simple_message,
+    _UNAVAILABLE_REPLY,
+    Reference,
 )
 from py._db import get_known_tags
 
 
+@pytest.fixture(autouse=True)
+def _reset_rendered_prompts():
+    """Rendered prompts, tool results and compiled rules are memoized — clear between tests."""
+    _shared_prompt_cache.clear()
+    _tool_result_cache.clear()
+    _compiled_rules.clear()
+    _resolved_activities.clear()
+    yield
+    _shared_prompt_cache.clear()
+    _tool_result_cache.clear()
+    _compiled_rules.clear()
+    _resolved_activities.clear()
+
+
 # ---------------------------------------------------------------------------
 # System prompt builder
 # ---------------------------------------------------------------------------
@@ -39,7 +70,7 @@ class TestBuildChatSystemPrompt:
         )
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "Harare (harare)" in prompt
 
     @patch("py._chat._get_chat_prompt_template", return_value=None)
@@ -49,7 +80,7 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = ([], "142")
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "142" in prompt
 
     @patch("py._chat._get_chat_prompt_template", return_value=None)
@@ -59,7 +90,7 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = ([], "10")
         mock_act.return_value = [{"id": "running", "label": "Running", "category": "sports"}]
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "Running (running)" in prompt
 
     @patch("py._chat._get_chat_prompt_template", return_value=None)
@@ -69,10 +100,12 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = ([], "10")
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt(["running", "drone-flying"])
-        assert "running" in prompt
-        assert "drone-flying" in prompt
-        assert "interests" in prompt.lower()
+        blocks = _build_chat_system_blocks(["running", "drone-flying"])
+        section = blocks[-1]["text"]
+        assert "running" in section
+        assert "drone-flying" in section
+        assert "interests" in section.lower()
+        assert "running" not in blocks[0]["text"]
 
     @patch("py._chat._get_chat_prompt_template", return_value=None)
     @patch("py._chat._get_activities_list")
@@ -81,7 +114,7 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = ([], "10")
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "interests" not in prompt.lower()
 
     @patch("py._chat._get_chat_prompt_template", return_value=None)
@@ -91,7 +124,7 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = ([], "many")
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "Shamwari Weather" in prompt
         assert "LOCATION DISCOVERY" in prompt
 
@@ -106,7 +139,7 @@ class TestBuildChatSystemPrompt:
             "py._chat._get_chat_prompt_template",
             return_value={"template": db_template},
         ):
-            prompt = _build_chat_system_prompt([])
+            prompt = _build_chat_system_prompt()
         assert prompt.startswith("Custom prompt.")
         assert "50" in prompt
 
@@ -119,11 +152,107 @@ class TestBuildChatSystemPrompt:
         mock_ctx.return_value = (locs, "50")
         mock_act.return_value = []
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "Loc19 (loc19)" in prompt
         assert "Loc20 (loc20)" not in prompt
 
 
+class TestRenderedPromptMemo:
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    def test_second_render_served_from_memo(self, _mock_ctx, _mock_act, _mock_tmpl):
+        first = _build_chat_system_prompt()
+        with patch("py._chat._CHAT_VARS_RE") as mock_re:
+            second = _build_chat_system_prompt()
+        mock_re.sub.assert_not_called()
+        assert first is second
+
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    def test_user_section_placeholder_renders_empty(self, _mock_ctx, _mock_act):
+        template = "A {userActivitySection} B {locationCount} C{userActivitySection}"
+        with patch("py._chat._get_chat_prompt_template", return_value={"template": template}):
+            assert _build_chat_system_prompt() == "A  B 10 C"
+
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context")
+    def test_epoch_bump_rerenders(self, mock_ctx, _mock_act, _mock_tmpl):
+        import py._chat as chat_mod
+        mock_ctx.return_value = ([{"name": "Harare", "slug": "harare"}], "10")
+        assert "Harare (harare)" in _build_chat_system_prompt()
+
+        mock_ctx.return_value = ([{"name": "Gweru", "slug": "gweru"}], "10")
+        chat_mod._context_epoch += 1
+        assert "Gweru (gweru)" in _build_chat_system_prompt()
+
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    def test_unknown_braces_left_intact(self, _mock_ctx, _mock_act):
+        template = 'Count: {locationCount}. Example JSON: {"slug": "harare"}'
+        with patch("py._chat._get_chat_prompt_template", return_value={"template": template}):
+            prompt = _build_chat_system_prompt()
+        assert prompt == 'Count: 10. Example JSON: {"slug": "harare"}'
+
+
+# ---------------------------------------------------------------------------
+# Prompt caching — system blocks, tools, history breakpoint
+# ---------------------------------------------------------------------------
+
+
+class TestPromptCaching:
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    def test_shared_block_cached_user_section_separate(self, _mock_ctx, _mock_act, _mock_tmpl):
+        blocks = _build_chat_system_blocks(["running"])
+        assert blocks[0]["cache_control"] == {"type": "ephemeral"}
+        assert "running" not in blocks[0]["text"]
+        assert "cache_control" not in blocks[1]
+        assert "running" in blocks[1]["text"]
+
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    def test_shared_block_identical_across_users(self, _mock_ctx, _mock_act, _mock_tmpl):
+        a = _build_chat_system_blocks(["running"])[0]
+        b = _build_chat_system_blocks(["farming"])[0]
+        assert a == b
+        assert len(_build_chat_system_blocks([])) == 1
+
+    def test_fallback_user_section_is_last(self):
+        assert _FALLBACK_CHAT_PROMPT.rstrip().endswith("{userActivitySection}")
+
+    def test_last_tool_marked_without_mutating_tools(self):
+        assert _CACHED_TOOLS[-1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in TOOLS[-1]
+        assert [t["name"] for t in _CACHED_TOOLS] == [t["name"] for t in TOOLS]
+
+    def test_tool_definitions_are_immutable_containers(self):
+        """Shared by reference across every request — no append/extend."""
+        assert isinstance(TOOLS, tuple)
+        assert isinstance(_CACHED_TOOLS, tuple)
+
+    def test_history_breakpoint_on_string_content(self):
+        messages = [{"role": "user", "content": "Hi"}]
+        marked = _with_history_breakpoint(messages)
+        assert marked[-1]["content"] == [
+            {"type": "text", "text": "Hi", "cache_control": {"type": "ephemeral"}},
+        ]
+        assert messages[-1]["content"] == "Hi"  # original untouched
+
+    def test_history_breakpoint_on_tool_results(self):
+        results = [
+            {"type": "tool_result", "tool_use_id": "a", "content": "{}"},
+            {"type": "tool_result", "tool_use_id": "b", "content": "{}"},
+        ]
+        marked = _with_history_breakpoint([{"role": "user", "content": results}])
+        assert "cache_control" not in marked[-1]["content"][0]
+        assert marked[-1]["content"][1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in results[1]
+
+
 # ---------------------------------------------------------------------------
 # Constants / regex
 # ---------------------------------------------------------------------------
@@ -147,6 +276,7 @@ class TestConstants:
         assert "farming" in tags
         assert "mining" in tags
         assert "invalid" not in tags
+        assert isinstance(tags, frozenset)
 
 
 # ---------------------------------------------------------------------------
@@ -155,15 +285,15 @@ class TestConstants:
 
 
 class TestListByTag:
-    @patch("py._chat.locations_collection")
+    @patch("py._chat.locations_nearest_collection")
     def test_rejects_unknown_tag(self, _mock_coll):
         result = _execute_list_by_tag("not-a-tag")
         assert "error" in result
         assert "Unknown tag" in result["error"]
 
-    @patch("py._chat.locations_collection")
+    @patch("py._chat.locations_nearest_collection")
     def test_valid_tag_returns_results(self, mock_coll):
-        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value = [
+        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value.batch_size.return_value = [
             {"slug": "chinhoyi", "name": "Chinhoyi", "province": "Mashonaland West"}
         ]
 
@@ -171,6 +301,7 @@ class TestListByTag:
         assert result["tag"] == "farming"
         assert len(result["locations"]) == 1
         assert result["locations"][0]["slug"] == "chinhoyi"
+        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value.batch_size.assert_called_once_with(20)
 
 
 # ---------------------------------------------------------------------------
@@ -188,6 +319,69 @@ class TestSearchLocations:
         result = _execute_search_locations("   ")
         assert result["total"] == 0
 
+    @patch("py._chat.locations_collection")
+    def test_atlas_search_projects_after_limit_without_score(self, mock_coll):
+        mock_coll.return_value.aggregate.return_value = [
+            {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["city"]},
+        ]
+        result = _execute_search_locations("Harare")
+
+        assert result["total"] == 1
+        pipeline = mock_coll.return_value.aggregate.call_args[0][0]
+        assert [next(iter(stage)) for stage in pipeline] == ["$search", "$limit", "$project"]
+        assert "score" not in pipeline[-1]["$project"]
+        assert mock_coll.return_value.aggregate.call_args.kwargs["batchSize"] == 10
+
+    @patch("py._chat.locations_collection")
+    def test_text_fallback_does_not_project_score(self, mock_coll):
+        mock_coll.return_value.aggregate.return_value = []
+        cursor = mock_coll.return_value.find.return_value
+        cursor.sort.return_value.limit.return_value.batch_size.return_value = [{"slug": "gweru", "name": "Gweru"}]
+
+        result = _execute_search_locations("Gweru")
+
+        assert result["locations"][0]["slug"] == "gweru"
+        projection = mock_coll.return_value.find.call_args[0][1]
+        assert "score" not in projection
+
+    @patch("py._chat.locations_collection")
+    def test_last_resort_queries_indexed_search_fields(self, mock_coll):
+        coll = mock_coll.return_value
+        coll.aggregate.return_value = []
+        coll.find.return_value.sort.return_value.limit.return_value.batch_size.return_value = []
+        coll.find.return_value.limit.return_value.batch_size.return_value.max_time_ms.return_value = [
+            {"slug": "victoria-falls", "name": "Victoria Falls"},
+        ]
+
+        result = _execute_search_locations("Falls")
+
+        assert result["locations"][0]["slug"] == "victoria-falls"
+        candidates, substring = coll.find.call_args[0][0]["$and"]
+        assert {"trigrams": {"$all": ["all", "fal", "lls"]}} in candidates["$or"]
+        # Trigram hits are re-checked as real substrings of one field
+        assert substring == {"$or": [
+            {"name_lower": {"$regex": "falls"}},
+            {"province_lower": {"$regex": "falls"}},
+            {"slug": {"$regex": "falls"}},
+        ]}
+        # Case-insensitive regexes can't use the lowercase fields' indexes
+        assert all("$options" not in next(iter(c.values())) for c in candidates["$or"])
+
+    @patch("py._chat.locations_collection")
+    def test_last_resort_short_query_matches_any_substring(self, mock_coll):
+        coll = mock_coll.return_value
+        coll.aggregate.return_value = []
+        coll.find.return_value.sort.return_value.limit.return_value.batch_size.return_value = []
+        coll.find.return_value.limit.return_value.batch_size.return_value.max_time_ms.return_value = []
+
+        _execute_search_locations("Gw")
+
+        assert coll.find.call_args[0][0] == {"$or": [
+            {"name_lower": {"$regex": "gw"}},
+            {"province_lower": {"$regex": "gw"}},
+            {"slug": {"$regex": "gw"}},
+        ]}
+
 
 # ---------------------------------------------------------------------------
 # Tool: get_weather (slug validation)
@@ -200,12 +394,81 @@ class TestGetWeather:
         assert "error" in result
         assert "Invalid slug" in result["error"]
 
+    def test_trailing_newline_slug_rejected(self):
+        # "$" alone would accept "harare\n"; validation uses fullmatch
+        result = _execute_get_weather("harare\n", {"harare\n": {"location": "x"}})
+        assert "Invalid slug" in result["error"]
+
     def test_uses_request_cache(self):
         """Cached weather should be returned without hitting MongoDB."""
         cache = {"harare": {"location": "harare", "current": {"temperature": 25}}}
         result = _execute_get_weather("harare", cache)
         assert result["current"]["temperature"] == 25
 
+    @patch("py._chat.locations_collection")
+    @patch("py._chat.weather_cache_collection")
+    def test_prefetch_fills_request_cache_in_one_query(self, mock_weather_coll, mock_loc_coll):
+        from py._chat import _prefetch_weather
+        mock_weather_coll.return_value.find.return_value.batch_size.return_value = [
+            {"locationSlug": "harare", "data": {"current": {"temperature_2m": 25}}},
+            {"locationSlug": "bulawayo", "data": {"current": {"temperature_2m": 22}}},
+        ]
+        cache: dict = {}
+
+        _prefetch_weather(["bulawayo", "harare"], cache)
+        result = _execute_get_weather("harare", cache)
+
+        assert result["current"]["temperature"] == 25
+        assert set(cache) == {"harare", "bulawayo"}
+        query = mock_weather_coll.return_value.find.call_args[0][0]
+        assert query["locationSlug"] == {"$in": ["bulawayo", "harare"]}
+        mock_weather_coll.return_value.find_one.assert_not_called()
+
+    @patch("py._chat.weather_cache_collection")
+    def test_uses_supplied_request_timestamp(self, mock_weather_coll):
+        from datetime import datetime, timezone
+        now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+        mock_weather_coll.return_value.find_one.return_value = None
+
+        _execute_get_weather("harare", {}, now)
+
+        query = mock_weather_coll.return_value.find_one.call_args[0][0]
+        assert query["expiresAt"] == {"$gt": now}
+
+    @patch("py._chat.locations_collection")
+    @patch("py._chat.weather_cache_collection")
+    def test_location_name_never_looked_up_per_call(self, mock_weather_coll, mock_loc_coll):
+        mock_weather_coll.return_value.find_one.return_value = {"data": {}}
+
+        known = _execute_get_weather("harare", {}, None, {"harare": "Harare"})
+        unknown = _execute_get_weather("gweru", {}, None, {})
+
+        assert known["location_name"] == "Harare"
+        assert unknown["location_name"] == "gweru"
+        mock_loc_coll.return_value.find_one.assert_not_called()
+
+    @patch("py._chat.locations_collection")
+    @patch("py._chat.weather_cache_collection")
+    def test_projects_only_consumed_fields(self, mock_weather_coll, mock_loc_coll):
+        mock_weather_coll.return_value.find_one.return_value = {
+            "data": {
+                "current": {"temperature_2m": 24},
+                "daily": {"temperature_2m_max": [30, 31, 29]},
+                "insights": {"heatStressIndex": 22},
+            },
+        }
+        mock_loc_coll.return_value.find_one.return_value = {"name": "Harare"}
+
+        result = _execute_get_weather("harare", {})
+
+        assert result["current"]["temperature"] == 24
+        assert result["insights"] == {"heatStressIndex": 22}
+        projection = mock_weather_coll.return_value.find_one.call_args[0][1]
+        assert projection["_id"] == 0
+        assert projection["data.daily.temperature_2m_max"] == {"$slice": 3}
+        assert "data.hourly" not in projection
+        assert "data" not in projection
+
 
 # ---------------------------------------------------------------------------
 # Tool dispatch
@@ -217,15 +480,201 @@ class TestExecuteTool:
     def test_dispatches_search(self, mock_search):
         mock_search.return_value = {"locations": [], "total": 0}
 
-        result = json.loads(_execute_tool("search_locations", {"query": "harare"}, {}, {}))
+        result = json.loads(_execute_tool("search_locations", {"query": "harare"}, {}, {})[0])
         assert result["total"] == 0
         mock_search.assert_called_once_with("harare")
 
     def test_unknown_tool_returns_error(self):
-        result = json.loads(_execute_tool("nonexistent_tool", {}, {}, {}))
+        result = json.loads(_execute_tool("nonexistent_tool", {}, {}, {})[0])
         assert "error" in result
         assert "Unknown tool" in result["error"]
 
+    @patch("py._chat._execute_search_locations")
+    def test_flags_errors_not_leading_with_the_key(self, mock_search):
+        """Search failures serialise "locations" first but are still errors."""
+        mock_search.return_value = {"locations": [], "total": 0, "error": "Search unavailable"}
+        payload, is_error = _execute_tool("search_locations", {"query": "harare"}, {}, {})
+        assert is_error
+        assert not payload.startswith('{"error"')
+
+        mock_search.return_value = {"locations": [{"slug": "harare"}], "total": 1}
+        assert _execute_tool("search_locations", {"query": "bulawayo"}, {}, {})[1] is False
+
+    @patch("py._chat._execute_search_locations")
+    def test_serializes_datetimes_and_unknown_types(self, mock_weather):
+        from datetime import datetime, timezone
+
+        class _ObjectId:
+            def __str__(self):
+                return "abc123"
+
+        mock_weather.return_value = {
+            "fetchedAt": datetime(2026, 1, 1, tzinfo=timezone.utc),
+            "_id": _ObjectId(),
+        }
+        result = json.loads(_execute_tool("search_locations", {"query": "harare"}, {}, {})[0])
+        assert result["fetchedAt"] == "2026-01-01T00:00:00+00:00"
+        assert result["_id"] == "abc123"
+
+
+class TestWeatherSections:
+    _WEATHER = {
+        "location": "harare",
+        "location_name": "Harare",
+        "current": {"temperature": 24.567, "humidity": 40},
+        "forecast": {"maxTemps": [30.04, 31.96, 29.5]},
+        "insights": {"moonPhase": 0.25},
+    }
+
+    @patch("py._chat._execute_get_weather")
+    def test_default_omits_insights_and_rounds(self, mock_weather):
+        mock_weather.return_value = self._WEATHER
+        result = json.loads(_execute_tool("get_weather", {"location_slug": "harare"}, {}, {})[0])
+
+        assert "insights" not in result
+        assert result["current"] == {"temperature": 24.6, "humidity": 40}
+        assert result["forecast"] == {"maxTemps": [30.0, 32.0, 29.5]}
+
+    @patch("py._chat._execute_get_weather")
+    def test_requested_insights_keep_precision(self, mock_weather):
+        mock_weather.return_value = self._WEATHER
+        result = json.loads(_execute_tool(
+            "get_weather", {"location_slug": "harare", "fields": ["insights", "bogus"]}, {}, {},
+        )[0])
+
+        assert result["insights"] == {"moonPhase": 0.25}
+        assert "current" not in result
+
+    @patch("py._chat.weather_cache_collection")
+    def test_not_cached_across_requests(self, mock_coll):
+        mock_coll.return_value.find_one.return_value = {"data": {"current": {"temperature_2m": 24}}}
+
+        first = json.loads(_execute_tool("get_weather", {"location_slug": "harare"}, {}, {}, None, {})[0])
+        request_cache: dict = {}
+        second = json.loads(_execute_tool(
+            "get_weather", {"location_slug": "harare"}, request_cache, {}, None, {"harare": "Harare"},
+        )[0])
+
+        assert first["location_name"] == "harare"
+        assert second["location_name"] == "Harare"
+        assert "harare" in request_cache  # later tools in the turn reuse it
+        assert mock_coll.return_value.find_one.call_count == 2
+
+    def test_request_cache_keeps_full_result(self):
+        cache = {"harare": dict(self._WEATHER)}
+        _execute_tool("get_weather", {"location_slug": "harare"}, cache, {})
+        assert cache["harare"]["insights"] == {"moonPhase": 0.25}
+
+
+class TestToolResultCache:
+    @patch("py._chat._execute_search_locations")
+    def test_repeat_call_served_from_cache(self, mock_search):
+        mock_search.return_value = {"locations": [{"slug": "harare"}], "total": 1}
+
+        first = _execute_tool("search_locations", {"query": "harare"}, {}, {})
+        second = _execute_tool("search_locations", {"query": "harare"}, {}, {})
+
+        assert first == second
+        mock_search.assert_called_once()
+
+    @patch("py._chat._execute_search_locations")
+    def test_lookalike_queries_share_an_entry(self, mock_search):
+        mock_search.return_value = {"locations": [{"slug": "harare"}], "total": 1}
+
+        for q in ("Harare", "  harare ", "HARARE   weather", "harare forecast"):
+            _execute_tool("search_locations", {"query": q}, {}, {})
+
+        mock_search.assert_called_once_with("harare")
+
+    @patch("py._chat._execute_search_locations")
+    def test_concurrent_misses_share_one_lookup(self, mock_search):
+        import threading
+        from py._chat import _tool_result_inflight
+
+        release = threading.Event()
+
+        def _slow_search(_query):
+            release.wait(5)
+            return {"locations": [{"slug": "harare"}], "total": 1}
+
+        mock_search.side_effect = _slow_search
+        results: list = []
+
+        def _call():
+            results.append(_execute_tool("search_locations", {"query": "harare"}, {}, {}))
+
+        first = threading.Thread(target=_call)
+        first.start()
+        while not _tool_result_inflight:
+            release.wait(0.001)
+        second = threading.Thread(target=_call)
+        second.start()
+        second.join(0.1)
+        assert second.is_alive()  # waiting on the first call, not querying
+
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        assert len(results) == 2 and results[0] == results[1]
+        mock_search.assert_called_once()
+        assert not _tool_result_inflight
+
+    @patch("py._chat._execute_list_by_tag")
+    def test_tag_case_shares_an_entry(self, mock_list):
+        mock_list.return_value = {"tag": "farming", "locations": [{"slug": "chinhoyi"}], "total": 1}
+
+        _execute_tool("list_locations_by_tag", {"tag": "Farming"}, {}, {})
+        _execute_tool("list_locations_by_tag", {"tag": "farming "}, {}, {})
+
+        mock_list.assert_called_once_with("farming")
+
+    @patch("py._chat._execute_search_locations")
+    def test_expired_entry_is_refetched(self, mock_search):
+        mock_search.return_value = {"locations": [{"slug": "harare"}], "total": 1}
+
+        with patch("py._chat.time") as mock_time:
+            mock_time.time.return_value = 1000.0
+            _execute_tool("search_locations", {"query": "harare"}, {}, {})
+            mock_time.time.return_value = 1000.0 + 3601
+            _execute_tool("search_locations", {"query": "harare"}, {}, {})
+
+        assert mock_search.call_count == 2
+
+    @patch("py._chat._execute_search_locations")
+    def test_error_results_not_cached(self, mock_search):
+        mock_search.return_value = {"locations": [], "total": 0, "error": "Search unavailable"}
+
+        _execute_tool("search_locations", {"query": "harare"}, {}, {})
+        _execute_tool("search_locations", {"query": "harare"}, {}, {})
+
+        assert mock_search.call_count == 2
+
+    @patch("py._chat._execute_search_locations")
+    @patch("py._chat._execute_list_by_tag")
+    def test_empty_results_not_cached(self, mock_list, mock_search):
+        """A location added after a miss must be findable on the next call."""
+        mock_search.return_value = {"locations": [], "total": 0}
+        mock_list.return_value = {"tag": "farming", "locations": [], "total": 0}
+
+        for _ in range(2):
+            _execute_tool("search_locations", {"query": "new town"}, {}, {})
+            _execute_tool("list_locations_by_tag", {"tag": "farming"}, {}, {})
+
+        assert mock_search.call_count == 2
+        assert mock_list.call_count == 2
+        assert not _tool_result_cache
+
+    @patch("py._chat._execute_list_by_tag")
+    def test_evicts_least_recently_used(self, mock_list):
+        mock_list.return_value = {"locations": [{"slug": "harare"}], "total": 1}
+
+        for i in range(_TOOL_RESULT_CACHE_MAX + 1):
+            _execute_tool("list_locations_by_tag", {"tag": f"t{i}"}, {}, {})
+
+        assert len(_tool_result_cache) == _TOOL_RESULT_CACHE_MAX
+        assert 'list_locations_by_tag:{"tag":"t0"}' not in _tool_result_cache
+
 
 # ---------------------------------------------------------------------------
 # Tool: get_activity_advice
@@ -243,22 +692,18 @@ class TestGetActivityAdvice:
         result = _execute_get_activity_advice("harare", ["running"], cache, {})
         assert "message" in result or "error" in result
 
-    @patch("py._chat.suitability_rules_collection")
     @patch("py._chat.activities_collection")
-    def test_evaluates_suitability_with_insights(self, mock_act_coll, mock_rules_coll):
+    def test_evaluates_suitability_with_insights(self, mock_act_coll):
         """Activity advice should evaluate rules against weather insights."""
-        mock_act_coll.return_value.find.return_value = [
-            {"id": "running", "label": "Running", "category": "sports"}
-        ]
-        mock_rules_coll.return_value.find.return_value = [
-            {
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": [{
                 "key": "category:sports",
                 "conditions": [
                     {"field": "heatStressIndex", "operator": "gt", "value": 40,
                      "level": "poor", "label": "Dangerous heat", "detail": "Too hot"},
                 ],
                 "fallback": {"level": "good", "label": "Good conditions", "detail": ""},
-            }
+            }]}
         ]
         cache = {
             "harare": {
@@ -273,22 +718,18 @@ class TestGetActivityAdvice:
         assert result["ratings"][0]["level"] == "poor"
         assert result["ratings"][0]["label"] == "Dangerous heat"
 
-    @patch("py._chat.suitability_rules_collection")
     @patch("py._chat.activities_collection")
-    def test_fallback_when_no_conditions_match(self, mock_act_coll, mock_rules_coll):
+    def test_fallback_when_no_conditions_match(self, mock_act_coll):
         """Should return fallback rating when no conditions match."""
-        mock_act_coll.return_value.find.return_value = [
-            {"id": "running", "label": "Running", "category": "sports"}
-        ]
-        mock_rules_coll.return_value.find.return_value = [
-            {
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": [{
                 "key": "category:sports",
                 "conditions": [
                     {"field": "heatStressIndex", "operator": "gt", "value": 40,
                      "level": "poor", "label": "Dangerous", "detail": "Too hot"},
                 ],
                 "fallback": {"level": "good", "label": "Good conditions", "detail": "All clear"},
-            }
+            }]}
         ]
         cache = {
             "harare": {
@@ -312,11 +753,149 @@ class TestGetActivityAdvice:
         }
         # Mock activities_collection to return nothing
         with patch("py._chat.activities_collection") as mock_act:
-            mock_act.return_value.find.return_value = []
+            mock_act.return_value.aggregate.return_value = []
             result = _execute_get_activity_advice("harare", ["nonexistent"], cache, {})
         assert "ratings" in result
         assert result["ratings"][0]["error"] == "Unknown activity"
 
+    @patch("py._chat.activities_collection")
+    def test_activity_rule_preferred_over_category_rule(self, mock_act_coll):
+        """The joined rules may arrive in any order; activity:{id} still wins."""
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": [
+                {"key": "category:sports", "conditions": [],
+                 "fallback": {"level": "fair", "label": "Category rule", "detail": ""}},
+                {"key": "activity:running", "conditions": [],
+                 "fallback": {"level": "good", "label": "Activity rule", "detail": ""}},
+            ]}
+        ]
+        cache = {"harare": {"location": "harare", "insights": {"heatStressIndex": 20}}}
+        result = _execute_get_activity_advice("harare", ["running"], cache, {})
+        assert result["ratings"][0]["label"] == "Activity rule"
+
+    @patch("py._chat.activities_collection")
+    def test_resolved_activities_shared_across_requests(self, mock_act_coll):
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": []}
+        ]
+        cache = {"harare": {"location": "harare", "insights": {"heatStressIndex": 20}}}
+
+        # Fresh per-request rules_cache each time, as in two separate chats
+        _execute_get_activity_advice("harare", ["running"], cache, {})
+        result = _execute_get_activity_advice("harare", ["running"], cache, {})
+
+        mock_act_coll.return_value.aggregate.assert_called_once()
+        assert result["ratings"][0]["activity"] == "Running"
+
+    @patch("py._chat.activities_collection")
+    def test_resolved_activity_expires_with_context_ttl(self, mock_act_coll):
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": []}
+        ]
+        cache = {"harare": {"location": "harare", "insights": {"heatStressIndex": 20}}}
+
+        with patch("py._chat.time") as mock_time:
+            mock_time.time.return_value = 1000.0
+            _execute_get_activity_advice("harare", ["running"], cache, {})
+            mock_time.time.return_value = 1000.0 + 301
+            _execute_get_activity_advice("harare", ["running"], cache, {})
+
+        assert mock_act_coll.return_value.aggregate.call_count == 2
+
+    @patch("py._chat.activities_collection")
+    def test_duplicate_ids_batched_once(self, mock_act_coll):
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": []}
+        ]
+        cache = {"harare": {"location": "harare", "insights": {"heatStressIndex": 20}}}
+
+        result = _execute_get_activity_advice("harare", ["running", "running"], cache, {})
+
+        pipeline = mock_act_coll.return_value.aggregate.call_args[0][0]
+        assert pipeline[0]["$match"] == {"id": {"$in": ["running"]}}
+        assert len(result["ratings"]) == 1
+
+    @patch("py._chat.activities_collection")
+    def test_single_aggregation_cached_per_request(self, mock_act_coll):
+        """Activities and rules come from one $lookup, reused on repeat calls."""
+        mock_act_coll.return_value.aggregate.return_value = [
+            {"id": "running", "label": "Running", "category": "sports", "rules": []}
+        ]
+        cache = {"harare": {"location": "harare", "insights": {"heatStressIndex": 20}}}
+        rules_cache: dict = {}
+
+        _execute_get_activity_advice("harare", ["running"], cache, rules_cache)
+        result = _execute_get_activity_advice("harare", ["running"], cache, rules_cache)
+
+        mock_act_coll.return_value.aggregate.assert_called_once()
+        pipeline = mock_act_coll.return_value.aggregate.call_args[0][0]
+        assert pipeline[-1]["$lookup"]["from"] == "suitability_rules"
+        assert result["ratings"][0]["label"] == "Generally suitable"
+
+
+class TestNormalizeLocationQuery:
+    def test_lowercases_and_collapses_whitespace(self):
+        assert _normalize_location_query("  Victoria   Falls ") == "victoria falls"
+
+    def test_strips_weather_suffixes(self):
+        assert _normalize_location_query("Mutare weather forecast") == "mutare"
+
+    def test_keeps_bare_suffix_word(self):
+        assert _normalize_location_query("Weather") == "weather"
+
+
+class TestActivitiesList:
+    @pytest.fixture(autouse=True)
+    def _reset_activities_cache(self):
+        import py._chat as chat_mod
+        chat_mod._activities_cache = None
+        chat_mod._activities_cache_at = 0
+        yield
+        chat_mod._activities_cache = None
+        chat_mod._activities_cache_at = 0
+
+    @patch("py._chat.activities_collection")
+    def test_query_capped_at_prompt_limit(self, mock_coll):
+        from py._chat import _get_activities_list, MAX_ACTIVITIES_IN_PROMPT
+        cursor = mock_coll.return_value.find.return_value.sort.return_value
+        cursor.limit.return_value.batch_size.return_value = [{"id": "running", "label": "Running"}]
+
+        assert _get_activities_list() == [{"id": "running", "label": "Running"}]
+        cursor.limit.assert_called_once_with(MAX_ACTIVITIES_IN_PROMPT)
+
+
+class TestCompileRule:
+    RULE = {
+        "key": "category:sports",
+        "updatedAt": "2026-01-01",
+        "conditions": [
+            {"field": "heatStressIndex", "operator": "gte", "value": 40,
+             "level": "poor", "label": "Dangerous heat", "detail": "Too hot",
+             "metricTemplate": "Heat stress {value}"},
+            {"field": "windSpeed", "operator": "bogus", "value": 0, "level": "fair"},
+            {"field": "windSpeed", "operator": "lt", "value": 5,
+             "level": "fair", "label": "Calm", "detail": ""},
+        ],
+    }
+
+    def test_first_matching_condition_wins_with_metric(self):
+        preds = _compile_rule(self.RULE)
+        matches = [p({"heatStressIndex": 40.04, "windSpeed": 2}) for p in preds]
+        assert matches[0] == {"level": "poor", "label": "Dangerous heat", "detail": "Too hot", "metric": "Heat stress 40.0"}
+        assert matches[1]["level"] == "fair"
+
+    def test_unknown_operator_dropped(self):
+        assert len(_compile_rule(self.RULE)) == 2
+
+    def test_missing_field_does_not_match(self):
+        preds = _compile_rule(self.RULE)
+        assert preds[0]({"windSpeed": 2}) is None
+
+    def test_compiled_once_per_rule_version(self):
+        first = _compile_rule(self.RULE)
+        assert _compile_rule(dict(self.RULE)) is first
+        assert _compile_rule({**self.RULE, "updatedAt": "2026-02-01"}) is not first
+
 
 # ---------------------------------------------------------------------------
 # Tool: list_locations_by_tag (cap test)
@@ -324,11 +903,11 @@ class TestGetActivityAdvice:
 
 
 class TestListByTagCap:
-    @patch("py._chat.locations_collection")
+    @patch("py._chat.locations_nearest_collection")
     def test_caps_results_at_20(self, mock_coll):
         """list_locations_by_tag should return at most 20 results."""
         locs = [{"slug": f"loc{i}", "name": f"Loc{i}", "province": "P"} for i in range(20)]
-        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value = locs
+        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value.batch_size.return_value = locs
 
         result = _execute_list_by_tag("farming")
         assert result["total"] == 20
@@ -352,8 +931,530 @@ class TestLocationCountFallback:
         chat_mod._location_context = None
         chat_mod._location_context_at = 0
 
-        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value = []
+        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value.batch_size.return_value = []
         mock_coll.return_value.estimated_document_count.side_effect = Exception("DB error")
 
-        prompt = _build_chat_system_prompt([])
+        prompt = _build_chat_system_prompt()
         assert "many" in prompt
+
+
+# ---------------------------------------------------------------------------
+# chat() — tool-use loop
+# ---------------------------------------------------------------------------
+
+
+def _tool_block(block_id: str, slug: str) -> MagicMock:
+    block = MagicMock(type="tool_use", id=block_id, input={"location_slug": slug})
+    block.name = "get_weather"
+    return block
+
+
+class TestResolveReferenceNames:
+    @pytest.mark.asyncio
+    @patch("py._chat.locations_collection")
+    async def test_unresolved_names_fetched_in_one_query(self, mock_coll):
+        mock_coll.return_value.find.return_value.batch_size.return_value = [
+            {"slug": "gweru", "name": "Gweru"},
+            {"slug": "mutare", "name": "Mutare"},
+        ]
+        refs = [
+            Reference(slug="harare", name="Harare", type="location"),
+            Reference(slug="gweru", name="gweru", type="weather"),
+            Reference(slug="mutare", name="mutare", type="weather"),
+        ]
+
+        result = await _resolve_reference_names(refs)
+
+        assert [r.name for r in result] == ["Harare", "Gweru", "Mutare"]
+        mock_coll.return_value.find.assert_called_once()
+        query = mock_coll.return_value.find.call_args[0][0]
+        assert query == {"slug": {"$in": ["gweru", "mutare"]}}
+
+    @pytest.mark.asyncio
+    @patch("py._chat.locations_collection")
+    async def test_all_named_skips_db(self, mock_coll):
+        refs = [Reference(slug="harare", name="Harare")]
+        assert await _resolve_reference_names(refs) == refs
+        mock_coll.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("py._chat.locations_collection", side_effect=Exception("down"))
+    async def test_lookup_failure_keeps_slugs(self, _mock_coll):
+        refs = [Reference(slug="gweru", name="gweru", type="weather")]
+        result = await _resolve_reference_names(refs)
+        assert result[0].name == "gweru"
+
+
+class TestToolExecutor:
+    def test_named_bounded_pool(self):
+        from py._chat import _tool_executor, _TOOL_WORKERS
+        assert _tool_executor._max_workers == _TOOL_WORKERS
+        assert _tool_executor._thread_name_prefix == "chat-tool"
+
+
+class TestCollectReferences:
+    def test_search_results_record_location_names(self):
+        block = MagicMock()
+        block.name = "search_locations"
+        references: dict = {}
+        names: dict = {}
+        tool_result = json.dumps({"locations": [{"slug": "gweru", "name": "Gweru"}]})
+
+        _collect_references(block, tool_result, references, names)
+
+        assert names == {"gweru": "Gweru"}
+        assert references["gweru"].type == "location"
+
+    def test_location_reference_replaces_weather_in_place(self):
+        weather = MagicMock(input={"location_slug": "gweru"})
+        weather.name = "get_weather"
+        other = MagicMock(input={"location_slug": "harare"})
+        other.name = "get_weather"
+        search = MagicMock()
+        search.name = "search_locations"
+        references: dict = {}
+
+        _collect_references(weather, json.dumps({"location_name": "gweru"}), references)
+        _collect_references(other, json.dumps({"error": "No cached weather"}), references)
+        _collect_references(search, json.dumps({"locations": [{"slug": "gweru", "name": "Gweru"}]}), references)
+
+        assert list(references) == ["gweru", "harare"]
+        assert references["gweru"].type == "location"
+        assert references["gweru"].name == "Gweru"
+        assert references["harare"].type == "weather"
+
+
+class TestRepeatedToolErrors:
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_second_identical_failure_forces_text_answer(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        retry_turn = MagicMock(stop_reason="tool_use", content=[_tool_block("t1", "gokwe")])
+        text_block = MagicMock(type="text", text="No data for Gokwe yet.")
+        final_turn = MagicMock(stop_reason="end_turn", content=[text_block])
+        create = AsyncMock(side_effect=[retry_turn, retry_turn, final_turn])
+        mock_client.return_value.messages.create = create
+
+        error = (json.dumps({"error": "No cached weather for gokwe."}), True)
+        with patch("py._chat._execute_tool", return_value=error):
+            result = await chat(ChatRequest(message="Weather in Gokwe?"), MagicMock())
+
+        assert result.response == "No data for Gokwe yet."
+        calls = create.call_args_list
+        assert "tool_choice" not in calls[0].kwargs
+        assert "tool_choice" not in calls[1].kwargs
+        assert calls[2].kwargs["tool_choice"] == {"type": "none"}
+
+
+class TestIsSimpleMessage:
+    @pytest.mark.parametrize("message", ["hi", "Hello!", "thanks", "Thank you so much", "hey there", "ok."])
+    def test_greetings_are_simple(self, message):
+        assert _is_simple_message(message, [])
+
+    @pytest.mark.parametrize("message", ["hi, weather in Harare?", "hello what should I plant", "okay but will it rain"])
+    def test_questions_are_not_simple(self, message):
+        assert not _is_simple_message(message, [])
+
+    def test_existing_conversation_is_not_simple(self):
+        assert not _is_simple_message("thanks", [MagicMock()])
+
+
+class TestChatToolLoop:
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._build_chat_system_blocks")
+    @patch("py._chat._get_location_context")
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_greeting_skips_tools_and_context(
+        self, _mock_ip, mock_rate, mock_client, mock_context, mock_blocks, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        text_block = MagicMock(type="text", text="Hello! How can I help?")
+        mock_client.return_value.messages.create = AsyncMock(
+            return_value=MagicMock(stop_reason="end_turn", content=[text_block]),
+        )
+
+        result = await chat(ChatRequest(message="hi"), MagicMock())
+
+        assert result.response == "Hello! How can I help?"
+        assert result.references == []
+        mock_rate.assert_called_once()
+        mock_context.assert_not_called()
+        mock_blocks.assert_not_called()
+        kwargs = mock_client.return_value.messages.create.call_args.kwargs
+        assert "tools" not in kwargs
+        assert kwargs["messages"] == [{"role": "user", "content": "hi"}]
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value={"model": "claude-sonnet-x"})
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_greeting_uses_configured_model(
+        self, _mock_ip, _mock_rate, mock_client, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        text_block = MagicMock(type="text", text="Hi!")
+        mock_client.return_value.messages.create = AsyncMock(
+            return_value=MagicMock(stop_reason="end_turn", content=[text_block]),
+        )
+
+        await chat(ChatRequest(message="hi"), MagicMock())
+
+        assert mock_client.return_value.messages.create.call_args.kwargs["model"] == "claude-sonnet-x"
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_streamed_greeting_reports_open_breaker_over_sse(
+        self, _mock_ip, _mock_rate, mock_client, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = False
+
+        resp = await chat(ChatRequest(message="hi", stream=True), MagicMock())
+
+        assert resp.media_type == "text/event-stream"
+        events = await _read_events(resp)
+        assert events == [{"type": "done", "response": _UNAVAILABLE_REPLY, "error": True}]
+        mock_client.return_value.messages.stream.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_tool_calls_in_one_turn_run_concurrently(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        import threading
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        tool_turn = MagicMock(stop_reason="tool_use", content=[
+            _tool_block("t1", "harare"),
+            _tool_block("t2", "bulawayo"),
+        ])
+        text_block = MagicMock(type="text", text="Harare is warmer.")
+        final_turn = MagicMock(stop_reason="end_turn", content=[text_block])
+        mock_client.return_value.messages.create = AsyncMock(side_effect=[tool_turn, final_turn])
+
+        # Both tools must be inside _execute_tool at the same time to pass
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _fake_tool(name, input_data, weather_cache, rules_cache, now, location_names):
+            assert now is not None
+            barrier.wait()
+            slug = input_data["location_slug"]
+            return json.dumps({"location": slug, "location_name": slug.title()}), False
+
+        with patch("py._chat._execute_tool", side_effect=_fake_tool), \
+                patch("py._chat._prefetch_weather") as mock_prefetch:
+            result = await chat(ChatRequest(message="Harare vs Bulawayo?"), MagicMock())
+
+        assert result.response == "Harare is warmer."
+        assert [r.slug for r in result.references] == ["harare", "bulawayo"]
+        # Both cities' weather is prefetched in one batch before the tools run
+        mock_prefetch.assert_called_once()
+        assert mock_prefetch.call_args[0][0] == ["bulawayo", "harare"]
+
+        second_call = mock_client.return_value.messages.create.call_args_list[1]
+        tool_results = second_call.kwargs["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2"]
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_duplicate_calls_run_once_and_failures_isolated(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        tool_turn = MagicMock(stop_reason="tool_use", content=[
+            _tool_block("t1", "harare"),
+            _tool_block("t2", "harare"),
+            _tool_block("t3", "gweru"),
+        ])
+        final_turn = MagicMock(stop_reason="end_turn", content=[MagicMock(type="text", text="Done.")])
+        mock_client.return_value.messages.create = AsyncMock(side_effect=[tool_turn, final_turn])
+        calls = []
+
+        def _fake_tool(name, input_data, *_args):
+            calls.append(input_data["location_slug"])
+            if input_data["location_slug"] == "gweru":
+                raise RuntimeError("boom")
+            return json.dumps({"location": "harare", "location_name": "Harare"}), False
+
+        with patch("py._chat._execute_tool", side_effect=_fake_tool), \
+                patch("py._chat._prefetch_weather"):
+            result = await chat(ChatRequest(message="Harare twice?"), MagicMock())
+
+        assert result.response == "Done."
+        assert sorted(calls) == ["gweru", "harare"]
+        tool_results = mock_client.return_value.messages.create.call_args_list[1].kwargs["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2", "t3"]
+        assert tool_results[0]["content"] == tool_results[1]["content"]
+        assert "error" in json.loads(tool_results[2]["content"])
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_sync_db_reads_run_off_event_loop(
+        self, _mock_ip, mock_client, _mock_tmpl, mock_breaker,
+    ):
+        import threading
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        mock_client.return_value.messages.create = AsyncMock(
+            return_value=MagicMock(stop_reason="end_turn", content=[MagicMock(type="text", text="Sunny.")]),
+        )
+        loop_thread = threading.current_thread()
+        threads = []
+
+        def _record(result):
+            def _fn(*_args):
+                threads.append(threading.current_thread())
+                return result
+            return _fn
+
+        with patch("py._chat.check_rate_limit_local", side_effect=_record({"allowed": True})), \
+                patch("py._chat._build_chat_system_blocks", side_effect=_record([{"type": "text", "text": "sys"}])):
+            await chat(ChatRequest(message="Weather?"), MagicMock())
+
+        assert len(threads) == 2
+        assert all(t is not loop_thread for t in threads)
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_model_call_awaited_without_executor(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        text_block = MagicMock(type="text", text="Sunny.")
+        mock_client.return_value.messages.create = AsyncMock(
+            return_value=MagicMock(stop_reason="end_turn", content=[text_block]),
+        )
+
+        with patch("py._chat._tool_executor") as mock_executor:
+            result = await chat(ChatRequest(message="Weather?"), MagicMock())
+
+        assert result.response == "Sunny."
+        mock_client.return_value.messages.create.assert_awaited_once()
+        mock_executor.submit.assert_not_called()
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_sdk_timeout_reported_as_slow_service(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        import anthropic
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        mock_client.return_value.messages.create = AsyncMock(side_effect=anthropic.APITimeoutError())
+
+        result = await chat(ChatRequest(message="Weather?"), MagicMock())
+
+        assert result.error is True
+        assert "taking too long" in result.response
+        mock_breaker.record_failure.assert_called_once()
+
+
+class TestEnsureIndexes:
+    @pytest.fixture(autouse=True)
+    def _reset_flag(self):
+        import py._chat as chat_mod
+        chat_mod._indexes_ensured = False
+        yield
+        chat_mod._indexes_ensured = False
+
+    @patch("py._chat.weather_cache_collection")
+    def test_creates_compound_index_once(self, mock_coll):
+        from py._chat import _ensure_indexes
+
+        _ensure_indexes()
+        _ensure_indexes()
+
+        mock_coll.return_value.create_index.assert_called_once_with([("locationSlug", 1), ("expiresAt", 1)])
+
+    @patch("py._chat.weather_cache_collection", side_effect=Exception("DB down"))
+    def test_failure_is_retried_on_next_call(self, _mock_coll):
+        import py._chat as chat_mod
+
+        chat_mod._ensure_indexes()
+        assert chat_mod._indexes_ensured is False
+
+
+class TestLoadChatContext:
+    @pytest.mark.asyncio
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_chat_prompt_template", return_value={"model": "m"})
+    @patch("py._chat._get_activities_list", return_value=[])
+    @patch("py._chat._get_location_context", return_value=([], "10"))
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    async def test_cold_reads_overlap(self, mock_rate, mock_client, _ctx, _act, _tmpl, _blocks):
+        import threading
+
+        # Rate limit and client lookup must be in flight together to pass
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _rate(*_args):
+            barrier.wait()
+            return {"allowed": True, "remaining": 19}
+
+        def _client():
+            barrier.wait()
+            return MagicMock()
+
+        mock_rate.side_effect = _rate
+        mock_client.side_effect = _client
+
+        from py._chat import _load_chat_context
+        _client, blocks, prompt_doc = await _load_chat_context("1.2.3.4", [])
+
+        assert blocks == [{"type": "text", "text": "sys"}]
+        assert prompt_doc == {"model": "m"}
+
+    @pytest.mark.asyncio
+    @patch("py._chat._get_anthropic_client", side_effect=HTTPException(status_code=503, detail="down"))
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": False, "remaining": 0})
+    async def test_rate_limit_reported_first(self, _mock_rate, _mock_client):
+        from py._chat import _load_chat_context
+
+        with pytest.raises(HTTPException) as exc_info:
+            await _load_chat_context("1.2.3.4", [], with_prompt=False)
+        assert exc_info.value.status_code == 429
+
+
+# ---------------------------------------------------------------------------
+# chat — streaming (stream=True)
+# ---------------------------------------------------------------------------
+
+
+async def _read_events(resp) -> list[dict]:
+    """Drain a StreamingResponse and decode its SSE payloads."""
+    body = ""
+    async for chunk in resp.body_iterator:
+        body += chunk if isinstance(chunk, str) else chunk.decode()
+    return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line]
+
+
+def _stream_ctx(chunks: list[str], final=None, error=None) -> MagicMock:
+    async def _text():
+        for chunk in chunks:
+            yield chunk
+
+    stream = MagicMock()
+    stream.text_stream = _text()
+    stream.get_final_message = AsyncMock(return_value=final)
+    ctx = MagicMock()
+    ctx.__aenter__ = AsyncMock(side_effect=error) if error else AsyncMock(return_value=stream)
+    ctx.__aexit__ = AsyncMock(return_value=False)
+    return ctx
+
+
+class TestChatStreaming:
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_streams_tool_loop_then_done_with_references(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        tool_turn = MagicMock(stop_reason="tool_use", content=[_tool_block("t1", "harare")])
+        text_block = MagicMock(type="text", text="Harare is sunny.")
+        final_turn = MagicMock(stop_reason="end_turn", content=[text_block])
+        mock_client.return_value.messages.stream.side_effect = [
+            _stream_ctx([], final=tool_turn),
+            _stream_ctx(["Harare ", "is sunny."], final=final_turn),
+        ]
+
+        def _fake_tool(name, input_data, weather_cache, rules_cache, now, location_names):
+            return json.dumps({"location": "harare", "location_name": "Harare"}), False
+
+        with patch("py._chat._execute_tool", side_effect=_fake_tool):
+            resp = await chat(ChatRequest(message="Weather in Harare?", stream=True), MagicMock())
+            assert resp.media_type == "text/event-stream"
+            events = await _read_events(resp)
+
+        assert [e["text"] for e in events if e["type"] == "delta"] == ["Harare ", "is sunny."]
+        assert events[-1]["type"] == "done"
+        assert events[-1]["response"] == "Harare is sunny."
+        assert [r["slug"] for r in events[-1]["references"]] == ["harare"]
+        mock_client.return_value.messages.create.assert_not_called()
+        # The second turn sees the tool result
+        second_call = mock_client.return_value.messages.stream.call_args_list[1]
+        assert second_call.kwargs["messages"][-1]["content"][0]["tool_use_id"] == "t1"
+
+    @pytest.mark.asyncio
+    @patch("py._chat.anthropic_breaker")
+    @patch("py._chat._get_chat_prompt_template", return_value=None)
+    @patch("py._chat._build_chat_system_blocks", return_value=[{"type": "text", "text": "sys"}])
+    @patch("py._chat._get_anthropic_client")
+    @patch("py._chat.check_rate_limit_local", return_value={"allowed": True, "remaining": 19})
+    @patch("py._chat.get_client_ip", return_value="1.2.3.4")
+    async def test_api_error_reported_in_done_event(
+        self, _mock_ip, _mock_rate, mock_client, _mock_sys, _mock_tmpl, mock_breaker,
+    ):
+        import anthropic
+        from py._chat import chat, ChatRequest
+
+        mock_breaker.is_allowed = True
+        mock_client.return_value.messages.stream.return_value = _stream_ctx(
+            [], error=anthropic.APIError("fail"),
+        )
+
+        resp = await chat(ChatRequest(message="Weather in Harare?", stream=True), MagicMock())
+        events = await _read_events(resp)
+
+        assert events == [{"type": "done", "response": events[-1]["response"], "error": True}]
+        mock_breaker.record_failure.assert_called_once()
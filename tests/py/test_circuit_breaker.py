@@ -4,6 +4,8 @@ from __future__ import annotations
 
 import asyncio
 import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
 
 import pytest
 
@@ -198,3 +200,114 @@ class TestSingletonBreakers:
         assert tomorrow_breaker.config.timeout_s == 5
         assert anthropic_breaker.config.failure_threshold == 3
         assert anthropic_breaker.config.timeout_s == 15
+
+
+# ---------------------------------------------------------------------------
+# Shared state across instances
+# ---------------------------------------------------------------------------
+
+
+class TestSharedState:
+    @pytest.fixture
+    def run_inline(self, monkeypatch):
+        """Run background sync work synchronously and record what ran."""
+        import py._circuit_breaker as cb_mod
+        ran = []
+
+        def _inline(fn, *args):
+            ran.append(fn)
+            fn(*args)
+
+        monkeypatch.setattr(cb_mod, "_in_background", _inline)
+        return ran
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_opening_publishes_cooldown_end(self, mock_coll, run_inline):
+        cb = _make_breaker(failure_threshold=1, cooldown_s=60)
+        mock_coll.return_value.find_one.return_value = None
+        cb.record_failure()
+        assert cb.state == "open"
+        filt, update = mock_coll.return_value.update_one.call_args[0]
+        assert filt == {"provider": "test-provider"}
+        until = update["$set"]["openUntil"]
+        assert timedelta(seconds=55) < until - datetime.now(timezone.utc) <= timedelta(seconds=60)
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_closed_instance_adopts_remote_open(self, mock_coll, run_inline):
+        import py._circuit_breaker as cb_mod
+        cb = _make_breaker(cooldown_s=60)
+        until = datetime.now(timezone.utc) + timedelta(seconds=30)
+        mock_coll.return_value.find.return_value = [
+            {"provider": "test-provider", "openUntil": until.replace(tzinfo=None)},
+        ]
+
+        assert cb.state == "closed"
+        cb_mod.sync_shared()
+        assert cb.state == "open"
+        assert cb.is_allowed is False
+        # Lined up with the remote cooldown, not a fresh 60s one
+        remaining = 60 - (time.monotonic() - cb_mod._get_state("test-provider").last_opened_at)
+        assert 25 < remaining <= 30
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_state_checks_never_touch_shared_store(self, mock_coll, run_inline):
+        """The is_allowed hot path stays local; only the poller reads MongoDB."""
+        cb = _make_breaker()
+        for _ in range(5):
+            assert cb.is_allowed
+        mock_coll.assert_not_called()
+        assert run_inline == []
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_one_query_covers_every_closed_provider(self, mock_coll, run_inline):
+        import py._circuit_breaker as cb_mod
+        mock_coll.return_value.find.return_value = []
+        _make_breaker()
+        cb_mod.sync_shared()
+        mock_coll.return_value.find.assert_called_once()
+        providers = mock_coll.return_value.find.call_args[0][0]["provider"]["$in"]
+        assert "test-provider" in providers
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_unavailable_shared_state_keeps_circuit_closed(self, mock_coll, run_inline):
+        import py._circuit_breaker as cb_mod
+        cb = _make_breaker()
+        mock_coll.return_value.find.side_effect = Exception("db down")
+        cb_mod.sync_shared()
+        assert cb.state == "closed"
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_reset_clears_shared_open(self, mock_coll, run_inline):
+        """A manual reset must not be undone by the next poll."""
+        import py._circuit_breaker as cb_mod
+        cb = _make_breaker(failure_threshold=1)
+        cb.record_failure()
+        cb.reset()
+        assert run_inline[-1] is cb_mod._publish_closed
+        filt, update = mock_coll.return_value.update_one.call_args[0]
+        assert filt == {"provider": "test-provider"}
+        assert update == {"$unset": {"openUntil": ""}}
+
+    @patch("py._circuit_breaker.circuit_breakers_collection")
+    def test_recovery_clears_shared_open(self, mock_coll, run_inline):
+        import py._circuit_breaker as cb_mod
+        cb = _make_breaker(failure_threshold=1)
+        cb.record_failure()
+        cb_mod._get_state("test-provider").state = "half_open"
+        cb.record_success()
+        assert cb.state == "closed"
+        assert run_inline[-1] is cb_mod._publish_closed
+
+    def test_poller_starts_once_and_stops(self, monkeypatch):
+        import py._circuit_breaker as cb_mod
+        calls = []
+        monkeypatch.setattr(cb_mod, "sync_shared", lambda: calls.append(1))
+        monkeypatch.setattr(cb_mod, "_sync_thread", None)
+        cb_mod.start_shared_sync()
+        thread = cb_mod._sync_thread
+        cb_mod.start_shared_sync()
+        assert cb_mod._sync_thread is thread
+        cb_mod.stop_shared_sync()
+        thread.join(timeout=1)
+        assert not thread.is_alive()
+        assert calls == [1]
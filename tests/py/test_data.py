@@ -9,12 +9,20 @@ import pytest
 from fastapi import HTTPException
 
 from py._data import (
+    _response_cache,
     get_activities,
     get_tags,
     get_regions,
 )
 
 
+@pytest.fixture(autouse=True)
+def _clear_response_cache():
+    _response_cache.clear()
+    yield
+    _response_cache.clear()
+
+
 # ---------------------------------------------------------------------------
 # get_activities endpoint
 # ---------------------------------------------------------------------------
@@ -29,7 +37,7 @@ class TestGetActivities:
             {"id": "running", "label": "Running", "category": "sports"},
             {"id": "cycling", "label": "Cycling", "category": "sports"},
         ]
-        result = await get_activities()
+        result = json.loads((await get_activities()).body)
         assert result["total"] == 2
         assert len(result["activities"]) == 2
 
@@ -62,7 +70,7 @@ class TestGetActivities:
         mock_coll.return_value.find.return_value.sort.return_value = [
             {"id": "running", "label": "Running", "category": "sports"},
         ]
-        result = await get_activities(category="sports")
+        result = json.loads((await get_activities(category="sports")).body)
         assert result["total"] == 1
         assert result["activities"][0]["category"] == "sports"
 
@@ -122,7 +130,7 @@ class TestGetActivities:
             {"id": "farming", "label": "Agriculture & Forestry"},
             {"id": "sports", "label": "Sports & Fitness"},
         ]
-        result = await get_activities(mode="categories")
+        result = json.loads((await get_activities(mode="categories")).body)
         assert "categories" in result
         assert len(result["categories"]) == 2
 
@@ -207,3 +215,64 @@ class TestGetRegions:
         mock_db.return_value.__getitem__.return_value.find.return_value = []
         result = await get_regions()
         assert "max-age=3600" in result.headers.get("cache-control", "")
+
+
+# ---------------------------------------------------------------------------
+# In-memory response cache
+# ---------------------------------------------------------------------------
+
+
+class TestResponseCache:
+    @patch("py._data.get_db")
+    @patch("py._data.activities_collection")
+    @pytest.mark.asyncio
+    async def test_all_activities_served_from_cache(self, mock_coll, mock_db):
+        mock_coll.return_value.find.return_value.sort.return_value = [
+            {"id": "running", "label": "Running", "category": "sports"},
+        ]
+        first = await get_activities()
+        second = await get_activities()
+        # Cache hits reuse the serialized body as-is
+        assert second.body is first.body
+        assert second.media_type == "application/json"
+        mock_coll.return_value.find.assert_called_once()
+
+    @patch("py._data.get_db")
+    @patch("py._data.activities_collection")
+    @pytest.mark.asyncio
+    async def test_categories_cached_separately(self, mock_coll, mock_db):
+        mock_coll.return_value.find.return_value.sort.return_value = []
+        await get_activities(category="farming")
+        await get_activities(category="sports")
+        await get_activities(category="farming")
+        assert mock_coll.return_value.find.call_count == 2
+
+    @patch("py._data.get_db")
+    @patch("py._data.activities_collection")
+    @pytest.mark.asyncio
+    async def test_text_search_not_cached(self, mock_coll, mock_db):
+        mock_coll.return_value.find.return_value.sort.return_value.limit.return_value = []
+        await get_activities(q="run")
+        await get_activities(q="run")
+        assert mock_coll.return_value.find.call_count == 2
+
+    @patch("py._data.tags_collection")
+    @pytest.mark.asyncio
+    async def test_tags_cached_per_featured_flag(self, mock_coll):
+        mock_coll.return_value.find.return_value.sort.return_value = []
+        await get_tags()
+        await get_tags()
+        await get_tags(featured=True)
+        assert mock_coll.return_value.find.call_count == 2
+
+    @patch("py._data.get_db")
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self, mock_db):
+        find = mock_db.return_value.__getitem__.return_value.find
+        find.side_effect = Exception("DB error")
+        with pytest.raises(HTTPException):
+            await get_regions()
+        find.side_effect = None
+        find.return_value = [{"name": "Zimbabwe", "active": True}]
+        result = await get_regions()
+        assert len(json.loads(result.body)["regions"]) == 1
@@ -1,12 +1,22 @@
-"""Tests for _db.py shared helpers — get_client_ip, check_rate_limit."""
+"""Tests for _db.py shared helpers — get_client_ip, check_rate_limit, get_db, get_api_key."""
 
 from __future__ import annotations
 
-from unittest.mock import patch
+import time
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from py._db import get_client_ip, check_rate_limit
+from py._db import (
+    api_key_digest,
+    check_rate_limit,
+    check_rate_limit_local,
+    get_client_ip,
+    get_known_tags,
+    location_search_fields,
+    same_api_key,
+    text_trigrams,
+)
 
 
 # ---------------------------------------------------------------------------
@@ -103,3 +113,221 @@ class TestCheckRateLimit:
         result = check_rate_limit("1.2.3.4", "chat", 20, 3600)
         assert result["allowed"] is True
         assert result["remaining"] == 19
+
+
+class TestCheckRateLimitLocal:
+    @pytest.fixture(autouse=True)
+    def _reset_buckets(self):
+        import py._db as db_mod
+        db_mod._local_rate.clear()
+        yield
+        db_mod._local_rate.clear()
+
+    @staticmethod
+    def _window_end():
+        from datetime import datetime, timedelta, timezone
+        return (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+
+    @patch("py._db.rate_limits_collection")
+    def test_syncs_once_per_batch(self, mock_coll):
+        expires = self._window_end()
+        mock_coll.return_value.find_one_and_update.side_effect = [
+            {"count": 1, "expiresAt": expires},
+            {"count": 6, "expiresAt": expires},
+        ]
+
+        results = [check_rate_limit_local("1.2.3.4", "chat", 20, 3600, sync_every=5) for _ in range(6)]
+
+        assert all(r["allowed"] for r in results)
+        assert [r["remaining"] for r in results] == [19, 18, 17, 16, 15, 14]
+        calls = mock_coll.return_value.find_one_and_update.call_args_list
+        assert [c[0][1]["$inc"]["count"] for c in calls] == [1, 5]
+
+    @patch("py._db.rate_limits_collection")
+    def test_rejects_locally_once_over_known_count(self, mock_coll):
+        mock_coll.return_value.find_one_and_update.return_value = {"count": 20, "expiresAt": self._window_end()}
+
+        first = check_rate_limit_local("1.2.3.4", "chat", 20, 3600)
+        second = check_rate_limit_local("1.2.3.4", "chat", 20, 3600)
+
+        assert first["allowed"] is True
+        assert second == {"allowed": False, "remaining": 0}
+        mock_coll.return_value.find_one_and_update.assert_called_once()
+
+    @patch("py._db.rate_limits_collection")
+    def test_expired_window_resyncs(self, mock_coll):
+        from datetime import datetime, timedelta, timezone
+        past = (datetime.now(timezone.utc) - timedelta(seconds=1)).replace(tzinfo=None)
+        mock_coll.return_value.find_one_and_update.return_value = {"count": 1, "expiresAt": past}
+
+        check_rate_limit_local("1.2.3.4", "chat", 20, 3600)
+        check_rate_limit_local("1.2.3.4", "chat", 20, 3600)
+
+        assert mock_coll.return_value.find_one_and_update.call_count == 2
+
+
+# ---------------------------------------------------------------------------
+# get_db / warm_db — pooled singleton
+# ---------------------------------------------------------------------------
+
+
+class TestGetDb:
+    @pytest.fixture(autouse=True)
+    def _reset_client(self):
+        import py._db as db_mod
+        db_mod._client = None
+        db_mod._db = None
+        yield
+        db_mod._client = None
+        db_mod._db = None
+
+    @patch.dict("os.environ", {"MONGODB_URI": "mongodb://localhost"})
+    @patch("py._db.MongoClient")
+    def test_creates_client_once(self, mock_client):
+        from py._db import get_db
+        first = get_db()
+        second = get_db()
+        assert first is second
+        mock_client.assert_called_once()
+        kwargs = mock_client.call_args.kwargs
+        assert kwargs["maxPoolSize"] == 50
+        assert kwargs["minPoolSize"] >= 2
+
+    @patch("py._db.get_db")
+    def test_nearest_locations_uses_nearest_read_preference(self, mock_db):
+        from py._db import ReadPreference, locations_nearest_collection
+        locations_nearest_collection()
+        mock_db.return_value["locations"].with_options.assert_called_once_with(
+            read_preference=ReadPreference.NEAREST,
+        )
+
+    @patch("py._db.get_db")
+    def test_collection_handles_are_reused_per_database(self, mock_db):
+        from py._db import tags_collection
+        first_db = MagicMock()
+        mock_db.return_value = first_db
+        assert tags_collection() is tags_collection()
+        first_db.__getitem__.assert_called_once_with("tags")
+
+        # A new client (e.g. after a cold reconnect) gets fresh handles
+        mock_db.return_value = MagicMock()
+        assert tags_collection() is not first_db["tags"]
+
+    @patch.dict("os.environ", {}, clear=True)
+    def test_missing_uri_raises_503(self):
+        from fastapi import HTTPException
+        from py._db import get_db
+        with pytest.raises(HTTPException) as exc:
+            get_db()
+        assert exc.value.status_code == 503
+
+    @patch.dict("os.environ", {}, clear=True)
+    def test_warm_db_swallows_errors(self):
+        from py._db import warm_db
+        warm_db()  # no URI — must not raise
+
+
+# ---------------------------------------------------------------------------
+# get_api_key
+# ---------------------------------------------------------------------------
+
+
+class TestGetApiKey:
+    @patch("py._db.api_keys_collection")
+    def test_rotated_key_is_seen_immediately(self, mock_coll):
+        from py._db import get_api_key
+        mock_coll.return_value.find_one.side_effect = [{"key": "sk-old"}, {"key": "sk-new"}]
+
+        assert get_api_key("anthropic") == "sk-old"
+        assert get_api_key("anthropic") == "sk-new"
+
+    @patch("py._db.api_keys_collection")
+    def test_inserted_key_is_seen_after_a_miss(self, mock_coll):
+        from py._db import get_api_key
+        mock_coll.return_value.find_one.side_effect = [None, {"key": "sk-db"}]
+
+        assert get_api_key("tomorrow") is None
+        assert get_api_key("tomorrow") == "sk-db"
+
+    @patch("py._db.api_keys_collection")
+    def test_missing_key_returns_none(self, mock_coll):
+        from py._db import get_api_key
+        mock_coll.return_value.find_one.return_value = None
+        assert get_api_key("tomorrow") is None
+
+
+# ---------------------------------------------------------------------------
+# location_search_fields / text_trigrams
+# ---------------------------------------------------------------------------
+
+
+class TestLocationSearchFields:
+    def test_trigrams_are_lowercase_distinct_and_sorted(self):
+        assert text_trigrams("Aaaa") == ["aaa"]
+        assert text_trigrams("Gweru") == ["eru", "gwe", "wer"]
+
+    def test_short_text_has_no_trigrams(self):
+        assert text_trigrams("Gw") == []
+
+    def test_fields_combine_name_and_province(self):
+        fields = location_search_fields("Mutare", "Manicaland")
+        assert fields["name_lower"] == "mutare"
+        assert fields["province_lower"] == "manicaland"
+        assert "mut" in fields["trigrams"]
+        assert "man" in fields["trigrams"]
+        assert fields["trigrams"] == sorted(set(fields["trigrams"]))
+
+
+# ---------------------------------------------------------------------------
+# api_key_digest / same_api_key
+# ---------------------------------------------------------------------------
+
+
+class TestApiKeyDigest:
+    def test_digest_is_stable_and_fixed_size(self):
+        assert api_key_digest("sk-test") == api_key_digest("sk-test")
+        assert len(api_key_digest("sk-test")) == 16
+
+    def test_same_api_key(self):
+        digest = api_key_digest("sk-test")
+        assert same_api_key(digest, "sk-test")
+        assert not same_api_key(digest, "sk-other")
+        assert not same_api_key(None, "sk-test")
+
+
+# ---------------------------------------------------------------------------
+# get_known_tags
+# ---------------------------------------------------------------------------
+
+
+class TestGetKnownTags:
+    @pytest.fixture(autouse=True)
+    def _reset_tags(self):
+        import py._db as db_mod
+        db_mod._known_tags = None
+        db_mod._known_tags_at = 0
+        yield
+        db_mod._known_tags = None
+        db_mod._known_tags_at = 0
+
+    @patch("py._db.tags_collection")
+    def test_loads_once_within_ttl(self, mock_coll):
+        mock_coll.return_value.find.return_value = [{"slug": "city"}, {"slug": "farming"}]
+        assert get_known_tags() == frozenset({"city", "farming"})
+        assert get_known_tags() is get_known_tags()
+        mock_coll.return_value.find.assert_called_once()
+
+    @patch("py._db.tags_collection")
+    def test_stale_tags_served_while_another_thread_reloads(self, mock_coll):
+        import py._db as db_mod
+        db_mod._known_tags = frozenset({"city"})
+        db_mod._known_tags_at = time.monotonic() - db_mod._TAGS_CACHE_TTL - 1
+
+        with db_mod._known_tags_lock:
+            assert get_known_tags() == frozenset({"city"})
+        mock_coll.return_value.find.assert_not_called()
+
+    @patch("py._db.tags_collection")
+    def test_db_error_falls_back(self, mock_coll):
+        mock_coll.return_value.find.side_effect = Exception("down")
+        assert "city" in get_known_tags()
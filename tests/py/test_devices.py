@@ -6,17 +6,16 @@ from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
 
 import pytest
-from fastapi import HTTPException
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
 
 from py._devices import (
     VALID_THEMES,
     MAX_ACTIVITIES,
     MAX_SAVED_LOCATIONS,
     SLUG_RE,
-    _validate_theme,
-    _validate_slug,
-    _validate_activities,
-    _validate_saved_locations,
+    router,
     _doc_to_response,
     create_device,
     get_device,
@@ -55,96 +54,126 @@ class TestConstants:
 
 
 # ---------------------------------------------------------------------------
-# Validation helpers
+# Model validation
 # ---------------------------------------------------------------------------
 
 
-class TestValidateTheme:
+class TestPreferencesValidation:
+    def test_defaults_are_valid(self):
+        prefs = Preferences()
+        assert prefs.theme == "system"
+        assert prefs.selectedLocation == ""
+
     def test_valid_themes_pass(self):
         for theme in ("light", "dark", "system"):
-            assert _validate_theme(theme) == theme
-
-    def test_invalid_theme_raises_400(self):
-        with pytest.raises(HTTPException) as exc_info:
-            _validate_theme("invalid")
-        assert exc_info.value.status_code == 400
-        assert "Invalid theme" in exc_info.value.detail
-
-    def test_empty_string_raises_400(self):
-        with pytest.raises(HTTPException):
-            _validate_theme("")
+            assert Preferences(theme=theme).theme == theme
 
+    def test_invalid_theme_rejected(self):
+        with pytest.raises(ValidationError):
+            Preferences(theme="invalid")
+        with pytest.raises(ValidationError):
+            Preferences(theme="")
 
-class TestValidateSlug:
     def test_valid_slugs_pass(self):
-        assert _validate_slug("harare") == "harare"
-        assert _validate_slug("victoria-falls") == "victoria-falls"
-        assert _validate_slug("a1b2") == "a1b2"
-
-    def test_invalid_slug_raises_400(self):
-        with pytest.raises(HTTPException) as exc_info:
-            _validate_slug("INVALID")
-        assert exc_info.value.status_code == 400
-        assert "Invalid location slug" in exc_info.value.detail
+        for slug in ("harare", "victoria-falls", "a1b2", "a" * 80):
+            assert Preferences(selectedLocation=slug).selectedLocation == slug
 
-    def test_empty_slug_is_allowed(self):
+    def test_empty_selected_location_is_allowed(self):
         """Empty slug is valid — represents no location selected."""
-        result = _validate_slug("")
-        assert result == ""
-
-    def test_slug_with_spaces_raises_400(self):
-        with pytest.raises(HTTPException):
-            _validate_slug("has space")
+        assert Preferences(selectedLocation="").selectedLocation == ""
 
-    def test_slug_too_long_raises_400(self):
-        with pytest.raises(HTTPException):
-            _validate_slug("a" * 81)
+    def test_invalid_slugs_rejected(self):
+        for slug in ("INVALID", "has space", "a" * 81):
+            with pytest.raises(ValidationError):
+                Preferences(selectedLocation=slug)
 
+    def test_activities_at_max_pass(self):
+        activities = [f"act-{i}" for i in range(MAX_ACTIVITIES)]
+        assert Preferences(selectedActivities=activities).selectedActivities == activities
 
-class TestValidateActivities:
-    def test_under_max_passes(self):
-        activities = ["running", "cycling"]
-        assert _validate_activities(activities) == activities
-
-    def test_empty_list_passes(self):
-        assert _validate_activities([]) == []
+    def test_activities_over_max_rejected(self):
+        with pytest.raises(ValidationError):
+            Preferences(selectedActivities=[f"act-{i}" for i in range(MAX_ACTIVITIES + 1)])
 
-    def test_at_max_passes(self):
-        activities = [f"act-{i}" for i in range(MAX_ACTIVITIES)]
-        assert _validate_activities(activities) == activities
+    def test_saved_locations_at_max_pass(self):
+        locs = [f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS)]
+        assert Preferences(savedLocations=locs).savedLocations == locs
 
-    def test_over_max_raises_400(self):
-        activities = [f"act-{i}" for i in range(MAX_ACTIVITIES + 1)]
-        with pytest.raises(HTTPException) as exc_info:
-            _validate_activities(activities)
-        assert exc_info.value.status_code == 400
-        assert "Too many activities" in exc_info.value.detail
+    def test_saved_locations_over_max_rejected(self):
+        with pytest.raises(ValidationError):
+            Preferences(savedLocations=[f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS + 1)])
 
+    def test_saved_locations_reject_invalid_slug(self):
+        with pytest.raises(ValidationError):
+            Preferences(savedLocations=["harare", "INVALID SLUG"])
 
-class TestValidateSavedLocations:
-    def test_empty_list_passes(self):
-        assert _validate_saved_locations([]) == []
 
-    def test_valid_slugs_pass(self):
-        locs = ["harare", "bulawayo", "singapore-sg"]
-        assert _validate_saved_locations(locs) == locs
+class TestUpdateRequestValidation:
+    def test_all_fields_optional(self):
+        assert UpdatePreferencesRequest().model_dump(exclude_none=True) == {}
 
-    def test_at_max_passes(self):
-        locs = [f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS)]
-        assert _validate_saved_locations(locs) == locs
+    def test_invalid_theme_rejected(self):
+        with pytest.raises(ValidationError):
+            UpdatePreferencesRequest(theme="invalid")
 
-    def test_over_max_raises_400(self):
-        locs = [f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS + 1)]
-        with pytest.raises(HTTPException) as exc_info:
-            _validate_saved_locations(locs)
-        assert exc_info.value.status_code == 400
-        assert "Too many saved locations" in exc_info.value.detail
+    def test_invalid_slug_rejected(self):
+        with pytest.raises(ValidationError):
+            UpdatePreferencesRequest(selectedLocation="INVALID")
 
-    def test_invalid_slug_raises_400(self):
-        with pytest.raises(HTTPException) as exc_info:
-            _validate_saved_locations(["INVALID SLUG"])
-        assert exc_info.value.status_code == 400
-        assert "Invalid location slug" in exc_info.value.detail
+    def test_list_caps_enforced(self):
+        with pytest.raises(ValidationError):
+            UpdatePreferencesRequest(
+                selectedActivities=[f"act-{i}" for i in range(MAX_ACTIVITIES + 1)]
+            )
+        with pytest.raises(ValidationError):
+            UpdatePreferencesRequest(
+                savedLocations=[f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS + 1)]
+            )
+
+
+class TestValidationResponses:
+    """Invalid bodies come back as 400 with the string detail the client shows."""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(router)
+        return TestClient(app)
+
+    def test_invalid_theme_on_create(self, client):
+        resp = client.post("/api/py/devices", json={"preferences": {"theme": "neon"}})
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == "Invalid theme: neon"
+
+    def test_invalid_slug_on_create(self, client):
+        resp = client.post(
+            "/api/py/devices", json={"preferences": {"selectedLocation": "INVALID SLUG"}},
+        )
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == "Invalid location slug: INVALID SLUG"
+
+    def test_too_many_activities_on_create(self, client):
+        resp = client.post(
+            "/api/py/devices",
+            json={"preferences": {
+                "selectedActivities": [f"act-{i}" for i in range(MAX_ACTIVITIES + 1)],
+            }},
+        )
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == f"Too many activities (max {MAX_ACTIVITIES})"
+
+    def test_invalid_saved_location_on_update(self, client):
+        resp = client.patch("/api/py/devices/abc-123", json={"savedLocations": ["ok", "Not Ok"]})
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == "Invalid location slug: Not Ok"
+
+    def test_too_many_saved_locations_on_update(self, client):
+        resp = client.patch(
+            "/api/py/devices/abc-123",
+            json={"savedLocations": [f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS + 1)]},
+        )
+        assert resp.status_code == 400
+        assert resp.json()["detail"] == f"Too many saved locations (max {MAX_SAVED_LOCATIONS})"
 
 
 # ---------------------------------------------------------------------------
@@ -199,6 +228,18 @@ class TestDocToResponse:
         assert "T" in resp.createdAt
         assert "T" in resp.updatedAt
 
+    def test_legacy_values_are_echoed_not_rejected(self):
+        doc = {
+            "deviceId": "old-1",
+            "preferences": {"theme": "sepia", "savedLocations": ["Old Slug"]},
+            "createdAt": datetime.now(timezone.utc),
+        }
+        resp = _doc_to_response(doc)
+        assert resp.preferences.theme == "sepia"
+        assert resp.preferences.savedLocations == ["Old Slug"]
+        assert resp.updatedAt == resp.createdAt
+        assert resp.model_dump()["preferences"]["hasOnboarded"] is False
+
 
 # ---------------------------------------------------------------------------
 # create_device endpoint
@@ -240,40 +281,6 @@ class TestCreateDevice:
         assert result.preferences.theme == "dark"
         assert result.preferences.selectedLocation == "bulawayo"
 
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_validates_theme_on_create(self, mock_coll):
-        mock_coll.return_value.create_index.return_value = None
-        body = CreateDeviceRequest(
-            preferences=Preferences(theme="invalid"),
-        )
-        with pytest.raises(HTTPException) as exc_info:
-            await create_device(body)
-        assert exc_info.value.status_code == 400
-
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_validates_slug_on_create(self, mock_coll):
-        mock_coll.return_value.create_index.return_value = None
-        body = CreateDeviceRequest(
-            preferences=Preferences(selectedLocation="INVALID SLUG"),
-        )
-        with pytest.raises(HTTPException) as exc_info:
-            await create_device(body)
-        assert exc_info.value.status_code == 400
-
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_validates_activities_on_create(self, mock_coll):
-        mock_coll.return_value.create_index.return_value = None
-        body = CreateDeviceRequest(
-            preferences=Preferences(
-                selectedActivities=[f"act-{i}" for i in range(MAX_ACTIVITIES + 1)]
-            ),
-        )
-        with pytest.raises(HTTPException) as exc_info:
-            await create_device(body)
-        assert exc_info.value.status_code == 400
 
     @patch("py._devices.device_profiles_collection")
     @pytest.mark.asyncio
@@ -306,6 +313,17 @@ class TestCreateDevice:
             await create_device(body)
         assert exc_info.value.status_code == 409
 
+    @patch("py._devices.device_profiles_collection")
+    @pytest.mark.asyncio
+    async def test_index_created_once_across_requests(self, mock_coll):
+        mock_coll.return_value.insert_one.return_value = None
+
+        await create_device(CreateDeviceRequest())
+        await create_device(CreateDeviceRequest())
+        mock_coll.return_value.create_index.assert_called_once_with(
+            "deviceId", unique=True, background=True,
+        )
+
 
 # ---------------------------------------------------------------------------
 # get_device endpoint
@@ -370,6 +388,19 @@ class TestUpdatePreferences:
         result = await update_preferences("abc-123", body)
         assert result.preferences.selectedLocation == "bulawayo"
 
+    @patch("py._devices.device_profiles_collection")
+    @pytest.mark.asyncio
+    async def test_sets_only_provided_fields(self, mock_coll):
+        now = datetime.now(timezone.utc)
+        mock_coll.return_value.find_one_and_update.return_value = {
+            "deviceId": "abc-123", "preferences": {}, "createdAt": now, "updatedAt": now,
+        }
+        body = UpdatePreferencesRequest.model_validate({"theme": "light", "savedLocations": None})
+        await update_preferences("abc-123", body)
+        update = mock_coll.return_value.find_one_and_update.call_args[0][1]["$set"]
+        assert set(update) == {"preferences.theme", "updatedAt"}
+        assert update["preferences.theme"] == "light"
+
     @patch("py._devices.device_profiles_collection")
     @pytest.mark.asyncio
     async def test_partial_activities_update(self, mock_coll):
@@ -419,31 +450,6 @@ class TestUpdatePreferences:
             await update_preferences("nonexistent", body)
         assert exc_info.value.status_code == 404
 
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_invalid_theme_raises_400(self, mock_coll):
-        body = UpdatePreferencesRequest(theme="invalid")
-        with pytest.raises(HTTPException) as exc_info:
-            await update_preferences("abc-123", body)
-        assert exc_info.value.status_code == 400
-
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_invalid_slug_raises_400(self, mock_coll):
-        body = UpdatePreferencesRequest(selectedLocation="INVALID")
-        with pytest.raises(HTTPException) as exc_info:
-            await update_preferences("abc-123", body)
-        assert exc_info.value.status_code == 400
-
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_too_many_activities_raises_400(self, mock_coll):
-        body = UpdatePreferencesRequest(
-            selectedActivities=[f"act-{i}" for i in range(MAX_ACTIVITIES + 1)]
-        )
-        with pytest.raises(HTTPException) as exc_info:
-            await update_preferences("abc-123", body)
-        assert exc_info.value.status_code == 400
 
     @patch("py._devices.device_profiles_collection")
     @pytest.mark.asyncio
@@ -463,13 +469,3 @@ class TestUpdatePreferences:
         body = UpdatePreferencesRequest(savedLocations=["bulawayo", "mutare"])
         result = await update_preferences("abc-123", body)
         assert result.preferences.savedLocations == ["bulawayo", "mutare"]
-
-    @patch("py._devices.device_profiles_collection")
-    @pytest.mark.asyncio
-    async def test_too_many_saved_locations_raises_400(self, mock_coll):
-        body = UpdatePreferencesRequest(
-            savedLocations=[f"loc-{i}" for i in range(MAX_SAVED_LOCATIONS + 1)]
-        )
-        with pytest.raises(HTTPException) as exc_info:
-            await update_preferences("abc-123", body)
-        assert exc_info.value.status_code == 400
@@ -8,14 +8,18 @@ from unittest.mock import patch, MagicMock
 import pytest
 from fastapi import HTTPException
 
+from py._ai_prompts_cache import prompt_cache
 from py._explore_search import (
     SLUG_RE,
     _exec_search,
     _exec_weather,
     _exec_tool,
+    _exec_tools,
     _text_search_fallback,
     _build_search_system_prompt,
     _FALLBACK_SYSTEM_PROMPT,
+    _CACHED_TOOLS,
+    TOOLS,
     explore_search,
     ExploreSearchRequest,
 )
@@ -109,6 +113,40 @@ class TestExecSearch:
         result = json.loads(_exec_search({}))
         assert len(result) == 20
 
+    @patch("py._explore_search._get_location_context")
+    def test_index_built_once_per_context(self, mock_ctx):
+        from py._explore_search import _get_search_index
+
+        mock_ctx.return_value = [
+            {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["City"], "country": "ZW"},
+        ]
+        first = _get_search_index()
+        assert _get_search_index() is first
+        assert first.fields == [("harare", "harare", "city")]
+        assert first.place["arar"] == [0]
+        assert first.tags == {"City": [0]}
+
+        mock_ctx.return_value = [dict(mock_ctx.return_value[0], name="Mutare")]
+        assert _get_search_index().fields[0][0] == "mutare"
+
+    @patch("py._explore_search._get_location_context")
+    def test_index_matches_substring_scan(self, mock_ctx):
+        from py._explore_search import _SUBSTRING_MAX
+
+        long_name = "Chimanimani National Park Outpost Station"
+        assert len(long_name) > _SUBSTRING_MAX
+        mock_ctx.return_value = [
+            {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["city"]},
+            {"slug": "chimanimani", "name": long_name, "province": "Manicaland", "tags": ["tourism"]},
+            {"slug": "mutare", "name": "Mutare", "province": "Manicaland", "tags": ["city", "border"]},
+        ]
+        for q in ["ar", "mani", "manicaland", long_name.lower(), "park outpost", "zzz"]:
+            expected = [
+                loc["slug"] for loc in mock_ctx.return_value
+                if q in loc["name"].lower() or q in loc["province"].lower()
+            ]
+            assert [r["slug"] for r in json.loads(_exec_search({"query": q}))] == expected, q
+
 
 # ---------------------------------------------------------------------------
 # _exec_weather — get_weather tool
@@ -183,6 +221,91 @@ class TestExecTool:
         assert "Unknown tool" in result["error"]
 
 
+class TestExecTools:
+    @staticmethod
+    def _tool(name, **args):
+        t = MagicMock(input=args)
+        t.name = name
+        return t
+
+    @patch("py._explore_search._exec_tool")
+    @pytest.mark.asyncio
+    async def test_results_keep_call_order(self, mock_exec):
+        mock_exec.side_effect = lambda name, args: args["slug"]
+        tools = [self._tool("get_weather", slug=s) for s in ("a", "b", "c")]
+        assert await _exec_tools(tools) == ["a", "b", "c"]
+
+    @patch("py._explore_search._exec_tool")
+    @pytest.mark.asyncio
+    async def test_failing_tool_does_not_sink_siblings(self, mock_exec):
+        def _exec(name, args):
+            if args["slug"] == "bad":
+                raise RuntimeError("boom")
+            return "ok"
+
+        mock_exec.side_effect = _exec
+        tools = [self._tool("get_weather", slug="good"), self._tool("get_weather", slug="bad")]
+        out = await _exec_tools(tools)
+        assert out[0] == "ok"
+        assert json.loads(out[1]) == {"error": "Tool get_weather failed"}
+
+    @patch("py._explore_search._exec_tool")
+    @patch("py._explore_search.weather_cache_collection")
+    @pytest.mark.asyncio
+    async def test_same_turn_weather_calls_share_one_query(self, mock_coll, mock_exec):
+        mock_coll.return_value.find.return_value = [
+            {"locationSlug": "harare", "data": {"current": {"temperature_2m": 28}}},
+        ]
+        tools = [
+            self._tool("get_weather", slug="harare"),
+            self._tool("get_weather", slug="mutare"),
+            self._tool("get_weather", slug="harare"),
+        ]
+        out = [json.loads(o) for o in await _exec_tools(tools)]
+
+        mock_coll.return_value.find.assert_called_once()
+        query = mock_coll.return_value.find.call_args[0][0]
+        assert query == {"locationSlug": {"$in": ["harare", "mutare"]}}
+        mock_exec.assert_not_called()
+        assert out[0]["temperature"] == 28
+        assert out[1] == {"error": "No weather data for mutare"}
+        assert out[2] == out[0]
+
+    @patch("py._explore_search._exec_tool")
+    @patch("py._explore_search.weather_cache_collection")
+    @pytest.mark.asyncio
+    async def test_failed_prefetch_falls_back_to_single_lookups(self, mock_coll, mock_exec):
+        mock_coll.return_value.find.side_effect = Exception("DB down")
+        mock_exec.return_value = "ok"
+        tools = [self._tool("get_weather", slug="harare"), self._tool("get_weather", slug="mutare")]
+        assert await _exec_tools(tools) == ["ok", "ok"]
+        assert mock_exec.call_count == 2
+
+    @patch("py._explore_search.MAX_CONCURRENT_TOOLS", 2)
+    @patch("py._explore_search._exec_tool")
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self, mock_exec):
+        import threading
+        import time as _time
+
+        lock = threading.Lock()
+        active = peak = 0
+
+        def _exec(name, args):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            _time.sleep(0.02)
+            with lock:
+                active -= 1
+            return "ok"
+
+        mock_exec.side_effect = _exec
+        await _exec_tools([self._tool("get_weather", slug=str(i)) for i in range(6)])
+        assert peak == 2
+
+
 # ---------------------------------------------------------------------------
 # _text_search_fallback
 # ---------------------------------------------------------------------------
@@ -205,7 +328,7 @@ class TestTextSearchFallback:
             {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["city"], "country": "ZW"},
             {"slug": "bulawayo", "name": "Bulawayo", "province": "Bulawayo", "tags": ["city"], "country": "ZW"},
         ]
-        mock_weather_coll.return_value.find_one.return_value = None
+        mock_weather_coll.return_value.find.return_value = []
 
         result = _text_search_fallback("harare")
         assert len(result["locations"]) == 1
@@ -218,7 +341,7 @@ class TestTextSearchFallback:
         mock_ctx.return_value = [
             {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["city"], "country": "ZW"},
         ]
-        mock_weather_coll.return_value.find_one.return_value = None
+        mock_weather_coll.return_value.find.return_value = []
 
         result = _text_search_fallback("Harare")
         assert len(result["locations"]) >= 1
@@ -229,7 +352,7 @@ class TestTextSearchFallback:
         mock_ctx.return_value = [
             {"slug": "chinhoyi", "name": "Chinhoyi", "province": "Mash West", "tags": ["farming"], "country": "ZW"},
         ]
-        mock_weather_coll.return_value.find_one.return_value = None
+        mock_weather_coll.return_value.find.return_value = []
 
         result = _text_search_fallback("farming")
         assert len(result["locations"]) == 1
@@ -242,10 +365,15 @@ class TestTextSearchFallback:
             {"slug": f"loc-{i}", "name": f"Loc {i}", "province": "test", "tags": ["city"], "country": "ZW"}
             for i in range(20)
         ]
-        mock_weather_coll.return_value.find_one.return_value = None
+        mock_weather_coll.return_value.find.return_value = []
 
         result = _text_search_fallback("loc")
         assert len(result["locations"]) == 10
+        assert "20" in result["summary"]
+        # Weather is fetched once, for the returned locations only
+        mock_weather_coll.return_value.find.assert_called_once()
+        query = mock_weather_coll.return_value.find.call_args[0][0]
+        assert query == {"locationSlug": {"$in": [f"loc-{i}" for i in range(10)]}}
 
     @patch("py._explore_search.weather_cache_collection")
     @patch("py._explore_search._get_location_context")
@@ -253,9 +381,9 @@ class TestTextSearchFallback:
         mock_ctx.return_value = [
             {"slug": "harare", "name": "Harare", "province": "Harare", "tags": ["city"], "country": "ZW"},
         ]
-        mock_weather_coll.return_value.find_one.return_value = {
-            "data": {"current": {"temperature_2m": 28, "weather_code": 0}}
-        }
+        mock_weather_coll.return_value.find.return_value = [
+            {"locationSlug": "harare", "data": {"current": {"temperature_2m": 28, "weather_code": 0}}}
+        ]
 
         result = _text_search_fallback("harare")
         loc = result["locations"][0]
@@ -279,6 +407,32 @@ class TestTextSearchFallback:
 
 
 class TestBuildSearchSystemPrompt:
+    @pytest.fixture(autouse=True)
+    def _location_context(self):
+        import py._explore_search as mod
+        mod._search_prompt_parts.clear()
+        with patch("py._explore_search._get_location_context", return_value=[
+            {"slug": "harare", "name": "Harare"},
+        ]):
+            yield
+        mod._search_prompt_parts.clear()
+
+    @patch("py._explore_search._get_search_prompt")
+    def test_appends_location_list(self, mock_prompt):
+        mock_prompt.return_value = None
+        result = _build_search_system_prompt("farming areas")
+        assert result.endswith("Available locations include: Harare (harare)")
+
+    @patch("py._explore_search._get_search_prompt")
+    def test_static_parts_reused_across_queries(self, mock_prompt):
+        import py._explore_search as mod
+        mock_prompt.return_value = {"template": "A {query} B"}
+        _build_search_system_prompt("one")
+        parts = mod._search_prompt_parts.copy()
+        assert _build_search_system_prompt("two").startswith("A two B")
+        assert mod._search_prompt_parts == parts
+        assert len(parts) == 1
+
     @patch("py._explore_search._get_search_prompt")
     def test_uses_db_template(self, mock_prompt):
         mock_prompt.return_value = {"template": "Custom search for: {query}"}
@@ -308,6 +462,28 @@ class TestBuildSearchSystemPrompt:
         assert "x" * 201 not in result
 
 
+class TestGetSearchPrompt:
+    def test_reads_shared_prompt_cache(self):
+        doc = {"promptKey": "system:explore_search", "template": "Find {query}"}
+        prompt_cache._cache = {"system:explore_search": doc}
+        prompt_cache._cache_at = float("inf")
+        try:
+            from py._explore_search import _get_search_prompt
+            assert _get_search_prompt() is doc
+        finally:
+            prompt_cache.clear()
+
+
+class TestCachedTools:
+    def test_only_last_tool_has_breakpoint(self):
+        assert _CACHED_TOOLS[-1]["cache_control"] == {"type": "ephemeral"}
+        assert all("cache_control" not in t for t in _CACHED_TOOLS[:-1])
+
+    def test_tool_definitions_unchanged(self):
+        assert "cache_control" not in TOOLS[-1]
+        assert [t["name"] for t in _CACHED_TOOLS] == [t["name"] for t in TOOLS]
+
+
 # ---------------------------------------------------------------------------
 # explore_search endpoint
 # ---------------------------------------------------------------------------
@@ -319,8 +495,7 @@ class TestExploreSearchEndpoint:
         import py._explore_search as mod
         mod._location_context = None
         mod._location_context_at = 0
-        mod._prompt_cache = {}
-        mod._prompt_cache_at = 0
+        prompt_cache.clear()
         yield
         mod._location_context = None
         mod._location_context_at = 0
@@ -333,7 +508,7 @@ class TestExploreSearchEndpoint:
             await explore_search(body, mock_request)
         assert exc_info.value.status_code == 400
 
-    @patch("py._explore_search.check_rate_limit")
+    @patch("py._explore_search.check_rate_limit_local")
     @patch("py._explore_search.get_client_ip")
     @pytest.mark.asyncio
     async def test_rate_limiting_returns_429(self, mock_ip, mock_rate):
@@ -348,7 +523,7 @@ class TestExploreSearchEndpoint:
 
     @patch("py._explore_search._text_search_fallback")
     @patch("py._explore_search.anthropic_breaker")
-    @patch("py._explore_search.check_rate_limit")
+    @patch("py._explore_search.check_rate_limit_local")
     @patch("py._explore_search.get_client_ip")
     @pytest.mark.asyncio
     async def test_circuit_breaker_falls_back_to_text_search(
@@ -375,3 +550,86 @@ class TestExploreSearchEndpoint:
         with pytest.raises(HTTPException) as exc_info:
             await explore_search(body, mock_request)
         assert exc_info.value.status_code == 400
+
+    @patch("py._explore_search._exec_tool")
+    @patch("py._explore_search._get_search_prompt", return_value=None)
+    @patch("py._explore_search._build_search_system_prompt", return_value="system")
+    @patch("py._explore_search._get_client")
+    @patch("py._explore_search.anthropic_breaker")
+    @patch("py._explore_search.check_rate_limit_local")
+    @patch("py._explore_search.get_client_ip")
+    @pytest.mark.asyncio
+    async def test_tool_calls_in_one_turn_run_concurrently(
+        self, mock_ip, mock_rate, mock_breaker, mock_client, _build, _prompt, mock_exec
+    ):
+        import threading
+        from unittest.mock import AsyncMock
+
+        mock_ip.return_value = "1.2.3.4"
+        mock_rate.return_value = {"allowed": True, "remaining": 10}
+        mock_breaker.is_allowed = True
+
+        search = MagicMock(type="tool_use", id="t1", input={"query": "harare"})
+        search.name = "search_locations"
+        weather = MagicMock(type="tool_use", id="t2", input={"slug": "harare"})
+        weather.name = "get_weather"
+        done = MagicMock(type="text", text="Harare is warm.")
+        client = MagicMock()
+        client.messages.create = AsyncMock(side_effect=[
+            MagicMock(content=[search, weather]),
+            MagicMock(content=[done]),
+        ])
+        mock_client.return_value = client
+
+        # Both tools must be in flight at once for the barrier to release
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _exec(name, args):
+            barrier.wait()
+            if name == "search_locations":
+                return json.dumps([{"slug": "harare", "name": "Harare"}])
+            return json.dumps({"slug": "harare", "temperature": 28})
+
+        mock_exec.side_effect = _exec
+
+        result = await explore_search(ExploreSearchRequest(query="warm"), MagicMock())
+        assert result["summary"] == "Harare is warm."
+        assert result["locations"][0]["temperature"] == 28
+        tool_results = client.messages.create.call_args.kwargs["messages"][-1]["content"]
+        assert [r["tool_use_id"] for r in tool_results] == ["t1", "t2"]
+
+    @patch("py._explore_search._exec_tool")
+    @patch("py._explore_search._get_search_prompt", return_value=None)
+    @patch("py._explore_search._build_search_system_prompt", return_value="system")
+    @patch("py._explore_search._get_client")
+    @patch("py._explore_search.anthropic_breaker")
+    @patch("py._explore_search.check_rate_limit_local")
+    @patch("py._explore_search.get_client_ip")
+    @pytest.mark.asyncio
+    async def test_repeated_search_results_are_deduplicated(
+        self, mock_ip, mock_rate, mock_breaker, mock_client, _build, _prompt, mock_exec
+    ):
+        from unittest.mock import AsyncMock
+
+        mock_ip.return_value = "1.2.3.4"
+        mock_rate.return_value = {"allowed": True, "remaining": 10}
+        mock_breaker.is_allowed = True
+
+        def _search(query):
+            t = MagicMock(type="tool_use", id=query, input={"query": query})
+            t.name = "search_locations"
+            return t
+
+        client = MagicMock()
+        client.messages.create = AsyncMock(side_effect=[
+            MagicMock(content=[_search("a"), _search("b")]),
+            MagicMock(content=[MagicMock(type="text", text="done")]),
+        ])
+        mock_client.return_value = client
+        mock_exec.side_effect = lambda name, args: json.dumps(
+            [{"slug": "harare", "name": args["query"]}, {"slug": args["query"], "name": args["query"]}]
+        )
+
+        result = await explore_search(ExploreSearchRequest(query="x"), MagicMock())
+        assert [loc["slug"] for loc in result["locations"]] == ["harare", "a", "b"]
+        assert result["locations"][0]["name"] == "a"  # first occurrence wins
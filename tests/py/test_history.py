@@ -131,6 +131,24 @@ class TestGetHistorySuccess:
                 assert result["records"] == 2
                 assert result["data"] == sample_records
 
+    @pytest.mark.asyncio
+    async def test_query_skips_hourly_and_sorts_newest_first(self):
+        """Filter/sort line up with the {locationSlug, recordedAt} index; hourly is projected out."""
+        with patch("py._history.locations_collection") as mock_loc:
+            mock_loc.return_value.find_one.return_value = {"slug": "harare"}
+            with patch("py._history.get_db") as mock_db:
+                mock_coll = MagicMock()
+                mock_coll.find.return_value.sort.return_value = []
+                mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+
+                await get_history(location="harare", days=7)
+
+                query, projection = mock_coll.find.call_args[0]
+                assert query["locationSlug"] == "harare"
+                assert "$gte" in query["recordedAt"]
+                assert projection == {"_id": 0, "hourly": 0}
+                mock_coll.find.return_value.sort.assert_called_once_with("recordedAt", -1)
+
     @pytest.mark.asyncio
     async def test_datetime_serialization(self):
         """datetime objects in recordedAt should be converted to ISO strings."""
@@ -243,3 +261,39 @@ class TestGetHistoryDBErrors:
                 with pytest.raises(HTTPException) as exc_info:
                     await get_history(location="harare", days=30)
                 assert exc_info.value.status_code == 502
+
+
+# ---------------------------------------------------------------------------
+# Daily granularity
+# ---------------------------------------------------------------------------
+
+
+class TestGetHistoryDaily:
+    @pytest.mark.asyncio
+    async def test_invalid_granularity_raises_400(self):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_history(location="harare", days=30, granularity="hourly")
+        assert exc_info.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_daily_buckets_are_grouped_in_mongo(self):
+        with patch("py._history.locations_collection") as mock_loc:
+            mock_loc.return_value.find_one.return_value = {"slug": "harare"}
+            with patch("py._history.get_db") as mock_db:
+                mock_coll = MagicMock()
+                mock_coll.aggregate.return_value = [
+                    {"_id": datetime(2025, 1, 15), "samples": 3, "avgTemp": 27.5},
+                    {"_id": datetime(2025, 1, 14), "samples": 2, "avgTemp": 25.0},
+                ]
+                mock_db.return_value.__getitem__ = MagicMock(return_value=mock_coll)
+
+                result = await get_history(location="harare", days=7, granularity="daily")
+
+                mock_coll.find.assert_not_called()
+                pipeline = mock_coll.aggregate.call_args[0][0]
+                assert pipeline[0]["$match"]["locationSlug"] == "harare"
+                assert pipeline[1]["$group"]["_id"] == {"$dateTrunc": {"date": "$recordedAt", "unit": "day"}}
+                assert pipeline[-1] == {"$sort": {"_id": -1}}
+                assert result["granularity"] == "daily"
+                assert result["records"] == 2
+                assert result["data"][0] == {"date": "2025-01-15", "samples": 3, "avgTemp": 27.5}
@@ -59,7 +59,7 @@ class TestHealthEndpoint:
         assert result["status"] == "degraded"
         assert result["database"] == "unavailable"
 
-    @patch("py._db.get_api_key", return_value=None)
+    @patch("py.index.get_api_key", return_value=None)
     @patch("py.index.get_db")
     @pytest.mark.asyncio
     async def test_anthropic_unavailable(self, mock_db, mock_key):
@@ -84,7 +84,7 @@ class TestHealthEndpoint:
         assert result["database"] == "unavailable"
         assert result["anthropic"] == "unavailable"
 
-    @patch("py._db.get_api_key", return_value="sk-from-db")
+    @patch("py.index.get_api_key", return_value="sk-from-db")
     @patch("py.index.get_db")
     @pytest.mark.asyncio
     async def test_anthropic_from_db_key(self, mock_db, mock_key):
@@ -452,7 +452,7 @@ class TestSetCachedWeather:
 
 
 class TestRecordWeatherHistory:
-    @patch("py._db.get_db")
+    @patch("py._weather.get_db")
     def test_records_current_data(self, mock_db):
         mock_history = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_history)
@@ -467,7 +467,7 @@ class TestRecordWeatherHistory:
         assert record["locationSlug"] == "harare"
         assert record["current"] == data["current"]
 
-    @patch("py._db.get_db")
+    @patch("py._weather.get_db")
     def test_includes_daily_when_present(self, mock_db):
         mock_history = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_history)
@@ -497,7 +497,7 @@ class TestRecordWeatherHistory:
         assert record["daily"]["date"] == "2025-01-01"
         assert record["daily"]["tempMax"] == 30
 
-    @patch("py._db.get_db")
+    @patch("py._weather.get_db")
     def test_includes_insights_when_present(self, mock_db):
         mock_history = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_history)
@@ -511,7 +511,7 @@ class TestRecordWeatherHistory:
         record = mock_history.insert_one.call_args[0][0]
         assert record["insights"] == {"heatStressIndex": 35}
 
-    @patch("py._db.get_db")
+    @patch("py._weather.get_db")
     def test_omits_insights_when_not_present(self, mock_db):
         mock_history = MagicMock()
         mock_db.return_value.__getitem__ = MagicMock(return_value=mock_history)